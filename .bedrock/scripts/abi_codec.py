@@ -0,0 +1,132 @@
+"""
+ABI Codec
+
+Ethereum primitives used by the analyzer's decoding core: keccak256 (from
+pycryptodome, which web3 already depends on), EIP-55 address checksums,
+logsBloom tests and ABI word helpers. Keeping these out of web3 means decoding,
+classification and cached lookups never pay web3's import cost.
+"""
+
+from functools import lru_cache
+
+from Crypto.Hash import keccak
+
+
+def keccak256(data: bytes) -> bytes:
+    """Keccak-256 digest (the pre-standard SHA-3 variant Ethereum uses)."""
+    return keccak.new(digest_bits=256, data=data).digest()
+
+
+# ============================================================================
+# ADDRESSES AND SIGNATURES
+# ============================================================================
+
+
+@lru_cache(maxsize=4096)
+def to_checksum_address(address: str) -> str:
+    """EIP-55 checksum an address; raises ValueError for malformed input."""
+    hex_address = address[2:] if address.startswith(("0x", "0X")) else address
+    hex_address = hex_address.lower()
+    if len(hex_address) != 40:
+        raise ValueError(f"Invalid address: {address}")
+    int(hex_address, 16)  # validates hex digits
+    digest = keccak256(hex_address.encode("ascii")).hex()
+    return "0x" + "".join(
+        char.upper() if char.isalpha() and int(digest[i], 16) >= 8 else char
+        for i, char in enumerate(hex_address)
+    )
+
+
+def event_topic(signature: str) -> str:
+    """topic0 for a canonical event signature, e.g. 'Transfer(address,address,uint256)'."""
+    return "0x" + keccak256(signature.encode("ascii")).hex()
+
+
+def function_selector(signature: str) -> str:
+    """4-byte selector for a canonical function signature."""
+    return "0x" + keccak256(signature.encode("ascii"))[:4].hex()
+
+
+# ============================================================================
+# LOGS BLOOM
+# ============================================================================
+
+
+def bloom_mask(item: bytes) -> int:
+    """
+    The three bits an item (log address or topic bytes) sets in a 2048-bit
+    logsBloom, as an int mask over the bloom read big-endian.
+    """
+    digest = keccak256(item)
+    mask = 0
+    for i in (0, 2, 4):
+        mask |= 1 << (((digest[i] << 8) | digest[i + 1]) & 2047)
+    return mask
+
+
+def bloom_contains(bloom: int, mask: int) -> bool:
+    """True when the bloom may contain the item (false positives possible, false negatives not)."""
+    return bloom & mask == mask
+
+
+# ============================================================================
+# ABI WORDS AND CALLS
+# ============================================================================
+
+_WORD = 32
+
+
+def encode_uint(value: int) -> bytes:
+    return value.to_bytes(_WORD, "big")
+
+
+def encode_address(address: str) -> bytes:
+    return bytes.fromhex(address[2:] if address.startswith(("0x", "0X")) else address).rjust(_WORD, b"\x00")
+
+
+def decode_uint(data: bytes, offset: int = 0) -> int:
+    return int.from_bytes(data[offset:offset + _WORD], "big")
+
+
+def decode_int(data: bytes, offset: int = 0) -> int:
+    return int.from_bytes(data[offset:offset + _WORD], "big", signed=True)
+
+
+def _encode_bytes(data: bytes) -> bytes:
+    return encode_uint(len(data)) + data + b"\x00" * (-len(data) % _WORD)
+
+
+def encode_call(signature: str, *args) -> bytes:
+    """Calldata for a function with static arguments (addresses as 0x strings, ints)."""
+    words = [encode_address(arg) if isinstance(arg, str) else encode_uint(int(arg)) for arg in args]
+    return bytes.fromhex(function_selector(signature)[2:]) + b"".join(words)
+
+
+AGGREGATE3_SIGNATURE = "aggregate3((address,bool,bytes)[])"
+
+
+def encode_aggregate3(calls: list[tuple[str, bool, bytes]]) -> bytes:
+    """Multicall3 aggregate3 calldata for (target, allowFailure, callData) calls."""
+    tails = [encode_address(target) + encode_uint(int(allow_failure)) + encode_uint(3 * _WORD) + _encode_bytes(data)
+             for target, allow_failure, data in calls]
+    offsets, position = [], len(calls) * _WORD
+    for tail in tails:
+        offsets.append(encode_uint(position))
+        position += len(tail)
+    array = encode_uint(len(calls)) + b"".join(offsets) + b"".join(tails)
+    return bytes.fromhex(function_selector(AGGREGATE3_SIGNATURE)[2:]) + encode_uint(_WORD) + array
+
+
+def decode_aggregate3(data: bytes) -> list[tuple[bool, bytes]]:
+    """Decode aggregate3's (bool success, bytes returnData)[] result."""
+    array = decode_uint(data)
+    count = decode_uint(data, array)
+    base = array + _WORD
+    results = []
+    for i in range(count):
+        start = base + decode_uint(data, base + i * _WORD)
+        success = bool(decode_uint(data, start))
+        data_start = start + decode_uint(data, start + _WORD)
+        length = decode_uint(data, data_start)
+        results.append((success, data[data_start + _WORD:data_start + _WORD + length]))
+    return results
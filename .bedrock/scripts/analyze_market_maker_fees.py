@@ -12,22 +12,66 @@ Usage:
 
 Requirements:
     pip install requests web3 python-dateutil python-dotenv
+
+requests and web3 are imported lazily by the API clients, so --help, cached
+lookups and archive re-analysis start without loading them.
+
+Library usage (no CSV files, records are yielded lazily):
+    from analyze_market_maker_fees import MarketMakerAnalyzer, aggregate
+
+    analyzer = MarketMakerAnalyzer(arbiscan_api_key, alchemy_url, market_maker_wallet=wallet)
+    for analysis in analyzer.iter_analyses(start_date, end_date):
+        ...
+    report = aggregate(analyzer.iter_analyses(start_date, end_date), start_date, end_date)
+    report.totals.gas_usd, report.hourly(), report.methods["multicall"]
+
+    # Trailing 1h / 24h / 7d windows, updated per record without rescans
+    windows = RollingMetrics()
+    for analysis in analyzer.iter_analyses(start_date, end_date):
+        windows.add(analysis)
+        windows.snapshot()["24h"]["gas_usd"]
 """
 
 import argparse
 import csv
+import importlib.util
+import json
 import os
+import re
+import struct
 import sys
+import threading
 import time
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, Union
 
-import requests
 from dotenv import load_dotenv
-from web3 import Web3
-from web3.exceptions import TransactionNotFound
+
+import event_archive
+from abi_codec import (
+    bloom_contains,
+    bloom_mask,
+    decode_aggregate3,
+    decode_int,
+    decode_uint,
+    encode_aggregate3,
+    encode_call,
+    to_checksum_address,
+)
+from event_archive import EventArchive
+from event_registry import EventRegistry, abi_paths, load_function_names, load_registry
+
+# Feature modules are imported by the code paths that use them, so startup only
+# pays for what a run needs (see bench_startup.py)
+if TYPE_CHECKING:
+    from metrics_sink import MetricPoint
+    from response_cache import ResponseCache
+    from run_journal import RunJournal
+    from sketches import HyperLogLog, TDigest
 
 # Load .env file from script directory
 SCRIPT_DIR = Path(__file__).parent
@@ -44,27 +88,88 @@ else:
 
 # Default configuration (can be overridden via CLI args or env vars)
 DEFAULT_CONFIG = {
-    "ARBISCAN_API_KEY": os.environ.get("ARBISCAN_API_KEY", ""),
+    # One key, or a comma-separated pool (ARBISCAN_API_KEYS); KEY@RATE sets a key's calls per second
+    "ARBISCAN_API_KEY": os.environ.get("ARBISCAN_API_KEYS") or os.environ.get("ARBISCAN_API_KEY", ""),
     "ALCHEMY_URL": os.environ.get("ALCHEMY_URL", ""),
     "FUTURES_CONTRACT": os.environ.get("FUTURES_CONTRACT", "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"),
     "MARKET_MAKER_WALLET": os.environ.get("MARKET_MAKER_WALLET", "0xc1e187E4a677Da017ecfAc011C9d381c3E7baeE4"),
+    "EVENT_ARCHIVE_DIR": os.environ.get("EVENT_ARCHIVE_DIR", ""),
+    "ANALYZER_CACHE_DIR": os.environ.get("ANALYZER_CACHE_DIR", ""),
+    "FUTURES_ABI_DIR": os.environ.get("FUTURES_ABI_DIR", ""),
+    "SUBGRAPH_URL": os.environ.get("SUBGRAPH_URL", ""),
+    "METRICS_NAMESPACE": os.environ.get("METRICS_NAMESPACE", "FuturesMarketplace/analyzer"),
+    # Node with the debug API for --trace-gas (defaults to ALCHEMY_URL)
+    "TRACE_RPC_URL": os.environ.get("TRACE_RPC_URL", ""),
 }
 
+# How long a cached ETH price stays valid (seconds)
+ETH_PRICE_CACHE_TTL = 900
+
+# Arbiscan key pool: how long a key that hit its rate limit / was rejected is left out of rotation
+# (seconds; rate-limit parks double per consecutive hit, up to the max)
+ARBISCAN_RATE_LIMIT_PARK = 1.0
+ARBISCAN_RATE_LIMIT_PARK_MAX = 60.0
+ARBISCAN_INVALID_KEY_PARK = 600.0
+# Longest a request waits for a parked key when every key in the pool is parked (seconds)
+ARBISCAN_MAX_PARK_WAIT = 5.0
+
+# Arbiscan txlist page size (max 10000 - Arbiscan can return less than requested)
+TXLIST_PAGE_SIZE = 10000
+# Arbiscan tokentx page size (page * offset may not exceed 10000, so pages slide by block instead)
+TOKENTX_PAGE_SIZE = 10000
+
+# Entities per subgraph page (graph-node's maximum `first`)
+SUBGRAPH_PAGE_SIZE = 1000
+
+# Calls per JSON-RPC batch request
+RPC_BATCH_SIZE = 100
+# debug_traceTransaction calls per batch (a call trace is far heavier than a receipt)
+TRACE_BATCH_SIZE = 20
+# callTracer with each frame's logs, so subcalls that created positions can be told apart
+TRACE_CONFIG = {"tracer": "callTracer", "tracerConfig": {"withLog": True}}
+
+# eth_getLogs chunking (blocks per request adapts between MIN and MAX)
+LOGS_INITIAL_CHUNK = 2000
+LOGS_MIN_CHUNK = 1
+LOGS_MAX_CHUNK = 500_000
+LOGS_WORKERS = 4
+LOGS_FAST_SECONDS = 1.0  # chunks faster than this double the chunk size
+LOGS_MAX_RETRIES = 3
+LOGS_THROTTLE_RETRIES = 6  # attempts for a rate-limited chunk (backoff 1, 2, 4, 8, 16 s)
+# Substrings of provider errors that mean "split the range and retry": the block
+# range or the result set of one eth_getLogs request is too large
+LOGS_RANGE_ERROR_HINTS = (
+    "block range",  # "block range too large", "exceed maximum block range", "up to a 10 block range"
+    "blocks range",  # "limited to a 10,000 blocks range"
+    "range is too large",
+    "range too large",
+    "range is too wide",
+    "log response size exceeded",  # Alchemy
+    "response size should not",
+    "query returned more than",  # "query returned more than 10000 results"
+    "query exceeds max results",
+)
+# JSON-RPC / HTTP codes and substrings of throttling errors: back off and retry
+# the same range (some providers share range-error codes with rate limits)
+RPC_THROTTLE_CODES = (429,)
+RPC_THROTTLE_HINTS = (
+    "rate limit",
+    "too many requests",
+    "compute units",  # Alchemy "exceeded its compute units per second capacity"
+    "capacity",
+    "request rate",
+    "request count exceeded",
+)
+
+# logsBloom block scan (--scan bloom): header batches in flight per worker thread
+BLOOM_WORKERS = 4
+BLOOM_BATCHES_PER_WORKER = 2
+
 # wUSDC decimals (standard USDC has 6 decimals)
 USDC_DECIMALS = 6
 
-# Event topic signatures (keccak256 hash of event signature)
-# From Futures.sol contract
-EVENT_TOPICS = {
-    # Transfer(address indexed from, address indexed to, uint256 value)
-    "Transfer": "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef",
-    # OrderCreated(bytes32 indexed orderId, address indexed participant, string destURL, uint256 pricePerDay, uint256 deliveryAt, bool isBuy)
-    "OrderCreated": "0x1f52a6f4a2d2a66b497ba87509c3bf307f623f437d154026f26716ed2d496d3b",
-    # OrderClosed(bytes32 indexed orderId, address indexed participant)
-    "OrderClosed": "0xba23b3f42d60d00e8a99f8faa964276a8b5eb6b1088f9f2d1ea3482c95654fe6",
-    # PositionCreated(bytes32 indexed positionId, address indexed seller, address indexed buyer, ...)
-    "PositionCreated": "0x4258e60eecf21b127496b52cfc5b7b5299721db725ba5620a55e2a7c84d43294",
-}
+# Multicall3 (same address on every chain it is deployed to, including Arbitrum One)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
 
 # Method IDs (first 4 bytes of keccak256 hash of function signature)
 METHOD_IDS = {
@@ -75,6 +180,16 @@ METHOD_IDS = {
     "removeMargin": "0xf11f854f",  # removeMargin(uint256) - WITHDRAWALS
 }
 
+# 4-byte method ID (as int) -> method name
+METHOD_NAMES = {int(mid, 16): name for name, mid in METHOD_IDS.items()}
+
+# Methods whose analysis only depends on token transfers (no order events), so
+# bulk tokentx data can stand in for their receipts
+TRANSFER_ONLY_METHODS = {"addMargin", "removeMargin"}
+
+# Methods whose calldata can say which orders a transaction closes (see _order_calls)
+ORDER_CALL_METHODS = {"multicall", "createOrder", "closeOrder"}
+
 
 # ============================================================================
 # DATA CLASSES
@@ -100,6 +215,747 @@ class TransactionAnalysis:
     orders_closed: int
     buy_orders: int
     sell_orders: int
+    contract: str = ""  # Deployment label (set when several contracts are analyzed together)
+    weight: float = 1.0  # Transactions this one stands for (sampled runs, see StratifiedSample)
+    # (delivery_at, price_per_day, filled, share of the transaction) per OrderCreated / PositionCreated
+    cohorts: list = field(default_factory=list)
+
+    def to_journal(self) -> dict:
+        """JSON-serializable fields (floats round-trip exactly through JSON)."""
+        fields = dict(self.__dict__)
+        fields["timestamp"] = int(self.timestamp.timestamp())
+        return fields
+
+    @classmethod
+    def from_journal(cls, fields: dict) -> "TransactionAnalysis":
+        return cls(**{**fields, "timestamp": datetime.fromtimestamp(fields["timestamp"], tz=timezone.utc)})
+
+
+@dataclass
+class Deployment:
+    """A futures contract deployment to analyze, with an optional wallet of its own."""
+
+    contract: str
+    wallet: Optional[str] = None
+    label: str = ""
+
+    @classmethod
+    def parse(cls, spec: str) -> "Deployment":
+        """Parse '[label=]address[:wallet]'."""
+        label, _, rest = spec.rpartition("=")
+        contract, _, wallet = (part.strip() for part in rest.partition(":"))
+        # Validate early; the analyzer checksums addresses itself
+        to_checksum_address(contract)
+        if wallet:
+            to_checksum_address(wallet)
+        return cls(contract=contract, wallet=wallet or None, label=label.strip() or contract)
+
+
+@dataclass
+class WalletState:
+    """A wallet's margin state at one block (USD; None if the call reverted)."""
+
+    margin_balance: Optional[float]
+    min_margin: Optional[float]
+    collateral_deficit: Optional[float]
+
+
+@dataclass
+class StateSnapshot:
+    """Futures contract state read at one block."""
+
+    block: int
+    market_price: Optional[float]  # USD per day, None if the call reverted
+    wallets: dict[str, WalletState] = field(default_factory=dict)
+
+    def total(self, attribute: str) -> Optional[float]:
+        """Sum of a WalletState attribute over the wallets that returned it."""
+        values = [getattr(state, attribute) for state in self.wallets.values()]
+        values = [value for value in values if value is not None]
+        return sum(values) if values else None
+
+
+@dataclass
+class DecodedEvent:
+    """A receipt log decoded into named arguments."""
+
+    name: str  # Event name (Transfer, OrderCreated, ...)
+    log_index: int
+    address: str  # Emitting contract (lowercase)
+    args: dict  # Addresses lowercase, amounts as raw integers
+
+
+# ============================================================================
+# DECODING HELPERS
+# ============================================================================
+
+
+@lru_cache(maxsize=None)
+def event_registry() -> EventRegistry:
+    """
+    Event decoders generated from contracts/abi (Futures.json, IERC20.json):
+    topic0 -> precompiled decoder for every event the contract emits. Built on
+    first decode, so importing the analyzer never reads the ABIs.
+    """
+    return load_registry(DEFAULT_CONFIG["FUTURES_ABI_DIR"] or None)
+
+
+@lru_cache(maxsize=None)
+def event_topics() -> dict[str, str]:
+    """Event name -> topic0 for the events in event_registry()."""
+    return event_registry().topics()
+
+
+def _to_hex(value) -> str:
+    """Normalize HexBytes / bytes / str into a 0x-prefixed hex string."""
+    if isinstance(value, (bytes, bytearray)) or (hasattr(value, "hex") and not isinstance(value, str)):
+        value = value.hex()
+    value = str(value)
+    return value if value.startswith("0x") else "0x" + value
+
+
+def _to_int(value) -> int:
+    """Normalize ints, hex strings and decimal strings into an int."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        return int(value, 16) if value.startswith("0x") else int(value or 0)
+    return int(value or 0)
+
+
+def _plain(value):
+    """Convert web3 AttributeDicts / HexBytes into JSON-serializable builtins."""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return _to_hex(value)
+    if hasattr(value, "items"):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return str(value)
+
+
+def method_name(method_id) -> str:
+    """Resolve a 4-byte method ID (hex string or int) to a known method name."""
+    if isinstance(method_id, str):
+        try:
+            method_id = int(method_id, 16) if len(method_id) == 10 else 0
+        except ValueError:
+            return "unknown"
+    return METHOD_NAMES.get(method_id, "unknown") if method_id else "unknown"
+
+
+def _method_id(tx_input) -> int:
+    """4-byte method ID of transaction input data as an int (0 if there is none)."""
+    if not isinstance(tx_input, str):
+        tx_input = _to_hex(tx_input)
+    if tx_input.startswith("0x"):
+        tx_input = tx_input[2:]
+    try:
+        return int(tx_input[:8], 16) if len(tx_input) >= 8 else 0
+    except ValueError:
+        return 0
+
+
+def _first_argument(tx_input) -> int:
+    """First 32-byte calldata argument as an int (0 if there is none)."""
+    if not isinstance(tx_input, str):
+        tx_input = _to_hex(tx_input)
+    if tx_input.startswith("0x"):
+        tx_input = tx_input[2:]
+    try:
+        return int(tx_input[8:72], 16) if len(tx_input) >= 72 else 0
+    except ValueError:
+        return 0
+
+
+def _order_calls(tx_input) -> tuple:
+    """
+    Order calls in transaction input, looking inside multicall: the order id
+    (bytes) of each closeOrder and (price per day, delivery date, is buy) of
+    each createOrder. Malformed calldata gives ().
+    """
+    if not isinstance(tx_input, str):
+        tx_input = _to_hex(tx_input)
+    try:
+        data = bytes.fromhex(tx_input[2:] if tx_input.startswith("0x") else tx_input)
+    except ValueError:
+        return ()
+
+    calls = [data]
+    if METHOD_NAMES.get(_method_id(tx_input)) == "multicall":
+        # multicall(bytes[] data): offset to the array, its length, then offsets from the array start
+        args = data[4:]
+        base = decode_uint(args) + 32
+        count = decode_uint(args, base - 32)
+        if base + 32 * count > len(args):
+            return ()
+        calls = []
+        for i in range(count):
+            start = base + decode_uint(args, base + 32 * i)
+            length = decode_uint(args, start)
+            if start + 32 + length > len(args):
+                return ()
+            calls.append(args[start + 32:start + 32 + length])
+
+    found = []
+    for call in calls:
+        name = METHOD_NAMES.get(int.from_bytes(call[:4], "big")) if len(call) >= 4 else None
+        if name == "closeOrder" and len(call) >= 36:
+            found.append(call[4:36])
+        elif name == "createOrder" and len(call) >= 132:
+            found.append((decode_uint(call, 4), decode_uint(call, 36), decode_int(call, 100) > 0))
+    return tuple(found)
+
+
+def txlist_row(tx_hash: str, tx_details: dict, receipt: dict, block: dict) -> dict:
+    """Build an Arbiscan txlist-style row from RPC transaction, receipt and block data."""
+    tx_input = tx_details.get("input", "")
+    status = receipt.get("status")
+    return {
+        "hash": tx_hash,
+        "blockNumber": str(_to_int(tx_details.get("blockNumber"))),
+        "transactionIndex": str(_to_int(receipt.get("transactionIndex", tx_details.get("transactionIndex", 0)))),
+        "timeStamp": str(_to_int(block["timestamp"])),
+        "gasUsed": str(_to_int(receipt.get("gasUsed", 0))),
+        "gasPrice": str(_to_int(tx_details.get("gasPrice", 0))),
+        "input": tx_input if isinstance(tx_input, str) else _to_hex(tx_input),
+        "to": str(tx_details.get("to") or ""),
+        "from": str(tx_details.get("from") or ""),
+        "txreceipt_status": "" if status is None else str(_to_int(status)),
+    }
+
+
+def read_tx_hashes(path: str) -> list[str]:
+    """Read transaction hashes (one per line, '#' comments allowed) from a file or '-' for stdin."""
+    lines = sys.stdin.read().splitlines() if path == "-" else Path(path).read_text().splitlines()
+    hashes = []
+    for line in lines:
+        value = line.split("#", 1)[0].strip()
+        if not value:
+            continue
+        if not value.startswith("0x") or len(value) != 66:
+            print(f"  [Warning] Skipping invalid transaction hash: {value}")
+            continue
+        hashes.append(value)
+    return hashes
+
+
+def read_wallet_set(specs: Iterable[str]) -> dict[str, str]:
+    """
+    Resolve --wallets arguments into {label: lowercase address}.
+
+    Each argument is '[label=]address' or a file with one such entry per line
+    ('#' comments allowed). Labels default to the address and name the
+    per-wallet output files (via wallet_file_labels); repeated addresses keep
+    their first label.
+    """
+    entries = []
+    for spec in specs:
+        if Path(spec).is_file():
+            entries.extend(line.split("#", 1)[0].strip() for line in Path(spec).read_text().splitlines())
+        else:
+            entries.append(spec.strip())
+
+    wallets: dict[str, str] = {}
+    for entry in entries:
+        if not entry:
+            continue
+        label, _, address = entry.rpartition("=")
+        address = to_checksum_address(address.strip()).lower()
+        if address in wallets.values():
+            continue
+        label = label.strip() or address
+        if label in wallets:
+            raise ValueError(f"Duplicate wallet label '{label}'")
+        wallets[label] = address
+    return wallets
+
+
+def wallet_file_labels(wallets: dict[str, str]) -> dict[str, str]:
+    """
+    File-name-safe form of each wallet-set label ({label: slug}).
+
+    Runs of characters other than letters, digits, '.', '_' and '-' become '_';
+    a label that leaves nothing usable, or collides with an earlier label's
+    slug, falls back to the wallet address.
+    """
+    slugs: dict[str, str] = {}
+    for label, address in wallets.items():
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", label).strip("._-")
+        if not slug or slug in slugs.values():
+            slug = address
+        slugs[label] = slug
+    return slugs
+
+
+# ============================================================================
+# EVENT ARCHIVE ENCODING
+# ============================================================================
+
+# Event name -> archive record kind
+ARCHIVE_KINDS = {
+    "Transfer": event_archive.KIND_TRANSFER,
+    "OrderCreated": event_archive.KIND_ORDER_CREATED,
+    "OrderClosed": event_archive.KIND_ORDER_CLOSED,
+    "PositionCreated": event_archive.KIND_POSITION_CREATED,
+    "PositionExited": event_archive.KIND_POSITION_EXITED,
+    "PositionClosed": event_archive.KIND_POSITION_CLOSED,
+    "PositionDeliveryClosed": event_archive.KIND_POSITION_DELIVERY_CLOSED,
+    "PositionPaid": event_archive.KIND_POSITION_PAID,
+    "PositionPaymentReceived": event_archive.KIND_POSITION_PAYMENT_RECEIVED,
+    "OrderFeeUpdated": event_archive.KIND_ORDER_FEE_UPDATED,
+}
+ARCHIVE_KIND_NAMES = {kind: name for name, kind in ARCHIVE_KINDS.items()}
+
+
+def _address_bytes(address: str) -> bytes:
+    return bytes.fromhex(address[2:]) if address else event_archive.ZERO_ADDRESS
+
+
+def _ref_bytes(value: str) -> bytes:
+    if not value:
+        return event_archive.ZERO_REF
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value).rjust(32, b"\x00")[-32:]
+
+
+def encode_archive_records(
+    block: int,
+    timestamp: int,
+    tx_index: int,
+    tx_hash: str,
+    sender: bytes,
+    to: bytes,
+    method_id: int,
+    gas_used: int,
+    gas_price: int,
+    eth_price_usd: float,
+    events: list[DecodedEvent],
+) -> tuple[tuple, list[tuple]]:
+    """Build the archive header record and event records for one transaction."""
+    flags = 0
+    gas_used, overflow = event_archive.clamp_u64(gas_used)
+    flags |= event_archive.FLAG_OVERFLOW if overflow else 0
+    gas_price, overflow = event_archive.clamp_u64(gas_price)
+    flags |= event_archive.FLAG_OVERFLOW if overflow else 0
+    # ETH price is stored as the raw bits of the double so re-analysis is exact
+    price_bits = int.from_bytes(struct.pack("<d", eth_price_usd), "little")
+    header = (
+        block, timestamp, tx_index, event_archive.HEADER_LOG_INDEX,
+        event_archive.KIND_TX, flags, 0,  # event count is stamped by EventArchive.append
+        sender, to,
+        gas_used, gas_price, method_id, price_bits,
+        _ref_bytes(tx_hash),
+    )
+
+    records = []
+    for event in events:
+        kind = ARCHIVE_KINDS.get(event.name)
+        if kind is None:
+            continue
+        args = event.args
+        flags = 0
+        participant = counterparty = event_archive.ZERO_ADDRESS
+        amounts = [0, 0, 0, 0]
+        ref = event_archive.ZERO_REF
+        if event.name == "Transfer":
+            participant = _address_bytes(args["from"])
+            counterparty = _address_bytes(args["to"])
+            amounts[0] = args["value"]
+            ref = _address_bytes(event.address).rjust(32, b"\x00")
+        elif event.name == "OrderCreated":
+            participant = _address_bytes(args["participant"])
+            amounts[0] = args["price_per_day"]
+            amounts[1] = args["delivery_at"]
+            flags |= event_archive.FLAG_IS_BUY if args["is_buy"] else 0
+            ref = _ref_bytes(args["order_id"])
+        elif event.name == "OrderClosed":
+            participant = _address_bytes(args["participant"])
+            ref = _ref_bytes(args["order_id"])
+        elif event.name == "PositionCreated":
+            participant = _address_bytes(args["seller"])
+            counterparty = _address_bytes(args["buyer"])
+            amounts[0] = args["sell_price_per_day"]
+            amounts[1] = args["buy_price_per_day"]
+            amounts[2] = args["delivery_at"]
+            ref = _ref_bytes(args["position_id"])
+        elif event.name == "PositionExited":
+            participant = _address_bytes(args["participant"])
+            amounts[0] = abs(args["pnl"])
+            flags |= event_archive.FLAG_NEGATIVE if args["pnl"] < 0 else 0
+            ref = _ref_bytes(args["position_id"])
+        elif event.name == "PositionDeliveryClosed":
+            participant = _address_bytes(args["closed_by"])
+            ref = _ref_bytes(args["position_id"])
+        elif event.name == "OrderFeeUpdated":
+            amounts[0] = args["order_fee"]
+            ref = _address_bytes(event.address).rjust(32, b"\x00")
+        else:
+            # PositionClosed / PositionPaid / PositionPaymentReceived
+            ref = _ref_bytes(args["position_id"])
+        for i, amount in enumerate(amounts):
+            amounts[i], overflow = event_archive.clamp_u64(amount)
+            flags |= event_archive.FLAG_OVERFLOW if overflow else 0
+        records.append((
+            block, timestamp, tx_index, event.log_index, kind, flags, 0,
+            participant, counterparty, *amounts, ref,
+        ))
+
+    return header, records
+
+
+def decode_archive_header(header: tuple) -> dict:
+    """Unpack an archive header record into transaction fields."""
+    return {
+        "block": header[event_archive.F_BLOCK],
+        "timestamp": header[event_archive.F_TIMESTAMP],
+        "tx_hash": "0x" + header[event_archive.F_REF].hex(),
+        "wallet": "0x" + header[event_archive.F_PARTICIPANT].hex(),
+        "to": "0x" + header[event_archive.F_COUNTERPARTY].hex(),
+        "gas_used": header[event_archive.F_AMOUNT0],
+        "gas_price": header[event_archive.F_AMOUNT1],
+        "method_id": header[event_archive.F_AMOUNT2],
+        "eth_price_usd": struct.unpack("<d", header[event_archive.F_AMOUNT3].to_bytes(8, "little"))[0],
+    }
+
+
+def decode_archive_events(records: list[tuple]) -> list[DecodedEvent]:
+    """Rebuild DecodedEvents from archive event records."""
+    events = []
+    for record in records:
+        name = ARCHIVE_KIND_NAMES.get(record[event_archive.F_KIND])
+        if name is None:
+            continue
+        participant = "0x" + record[event_archive.F_PARTICIPANT].hex()
+        counterparty = "0x" + record[event_archive.F_COUNTERPARTY].hex()
+        ref = "0x" + record[event_archive.F_REF].hex()
+        amount0, amount1, amount2 = record[event_archive.F_AMOUNT0:event_archive.F_AMOUNT3]
+        address = ""
+        if name == "Transfer":
+            address = "0x" + record[event_archive.F_REF][-20:].hex()
+            args = {"from": participant, "to": counterparty, "value": amount0}
+        elif name == "OrderCreated":
+            args = {
+                "order_id": ref,
+                "participant": participant,
+                "is_buy": bool(record[event_archive.F_FLAGS] & event_archive.FLAG_IS_BUY),
+                "price_per_day": amount0,
+                "delivery_at": amount1,
+            }
+        elif name == "OrderClosed":
+            args = {"order_id": ref, "participant": participant}
+        elif name == "PositionCreated":
+            args = {
+                "position_id": ref,
+                "seller": participant,
+                "buyer": counterparty,
+                "sell_price_per_day": amount0,
+                "buy_price_per_day": amount1,
+                "delivery_at": amount2,
+            }
+        elif name == "PositionExited":
+            negative = record[event_archive.F_FLAGS] & event_archive.FLAG_NEGATIVE
+            args = {"position_id": ref, "participant": participant, "pnl": -amount0 if negative else amount0}
+        elif name == "PositionDeliveryClosed":
+            args = {"position_id": ref, "closed_by": participant}
+        elif name == "OrderFeeUpdated":
+            address = "0x" + record[event_archive.F_REF][-20:].hex()
+            args = {"order_fee": amount0}
+        else:
+            args = {"position_id": ref}
+        events.append(DecodedEvent(name, record[event_archive.F_LOG_INDEX], address, args))
+    return events
+
+
+# ============================================================================
+# INGESTION RECORDS
+# ============================================================================
+
+
+class AddressTable:
+    """Interns addresses as 20-byte values, one shared object per distinct address."""
+
+    def __init__(self):
+        self._by_text: dict[str, bytes] = {}
+        self._by_bytes: dict[bytes, bytes] = {}
+
+    def intern(self, address: str) -> bytes:
+        packed = self._by_text.get(address)
+        if packed is None:
+            hex_address = address[2:] if address.startswith(("0x", "0X")) else address
+            try:
+                packed = bytes.fromhex(hex_address) if hex_address else event_archive.ZERO_ADDRESS
+            except ValueError:
+                packed = event_archive.ZERO_ADDRESS
+            packed = self._by_bytes.setdefault(packed, packed)
+            self._by_text[address] = packed
+        return packed
+
+    def __len__(self) -> int:
+        return len(self._by_bytes)
+
+
+class TxRecord:
+    """
+    Compact projection of one txlist row, holding only what the analyzer reads.
+
+    Rows are projected once at ingestion: numbers become ints, the method ID an
+    int selector, and addresses 20-byte values interned in an AddressTable, so
+    100k-row runs keep neither Arbiscan's ~20 string fields per row (including
+    the full calldata) nor re-lowercase addresses in every pass.
+    """
+
+    __slots__ = (
+        "block", "timestamp", "tx_index", "tx_hash", "sender", "to",
+        "method_id", "gas_used", "gas_price", "failed", "amount", "order_calls",
+    )
+
+    def __init__(
+        self,
+        block: int,
+        timestamp: int,
+        tx_index: int,
+        tx_hash: bytes,
+        sender: bytes,
+        to: bytes,
+        method_id: int,
+        gas_used: int,
+        gas_price: int,
+        failed: bool,
+        amount: int = 0,
+        order_calls: tuple = (),
+    ):
+        self.block = block
+        self.timestamp = timestamp
+        self.tx_index = tx_index
+        self.tx_hash = tx_hash
+        self.sender = sender
+        self.to = to
+        self.method_id = method_id
+        self.gas_used = gas_used
+        self.gas_price = gas_price
+        self.failed = failed
+        self.amount = amount  # Margin amount from addMargin/removeMargin calldata (wUSDC units)
+        self.order_calls = order_calls  # See _order_calls (only projected for subgraph runs)
+
+    @property
+    def hash(self) -> str:
+        return "0x" + self.tx_hash.hex()
+
+    @property
+    def wallet(self) -> str:
+        """Sender as a lowercase hex address."""
+        return "0x" + self.sender.hex()
+
+    @classmethod
+    def from_txlist(cls, row: dict, addresses: AddressTable, order_calls: bool = False) -> "TxRecord":
+        """
+        Project an Arbiscan txlist row (or a txlist_row() built from RPC data);
+        `order_calls` also keeps the order calls from the calldata.
+        """
+        tx_input = row.get("input", "")
+        method_id = _method_id(tx_input)
+        method = METHOD_NAMES.get(method_id)
+        return cls(
+            block=_to_int(row.get("blockNumber", 0)),
+            timestamp=_to_int(row.get("timeStamp", 0)),
+            tx_index=_to_int(row.get("transactionIndex", 0)),
+            tx_hash=_ref_bytes(row.get("hash", "")),
+            sender=addresses.intern(row.get("from") or ""),
+            to=addresses.intern(row.get("to") or ""),
+            method_id=method_id,
+            gas_used=_to_int(row.get("gasUsed", 0)),
+            gas_price=_to_int(row.get("gasPrice", 0)),
+            failed=row.get("isError") == "1" or row.get("txreceipt_status") == "0",
+            amount=_first_argument(tx_input) if method in TRANSFER_ONLY_METHODS else 0,
+            order_calls=_order_calls(tx_input) if order_calls and method in ORDER_CALL_METHODS else (),
+        )
+
+
+def build_tx_filter(
+    methods: Optional[Iterable[str]] = None,
+    include_wallets: Optional[Iterable[str]] = None,
+    exclude_wallets: Optional[Iterable[str]] = None,
+    min_gas: Optional[int] = None,
+    min_value: Optional[float] = None,
+) -> Optional[Callable[[TxRecord], bool]]:
+    """
+    Compile filter options into one predicate over TxRecords (None if no filter is set).
+
+    Everything is resolved up front - method names to int selectors, wallets
+    to 20-byte values, USD to wUSDC units - so the predicate is a few int and
+    set comparisons per transaction and runs before any receipt is fetched.
+    `methods` takes names (addMargin) or 0x selectors; `min_value` is the
+    margin amount in USD, which only addMargin/removeMargin carry.
+    """
+    checks: list[Callable[[TxRecord], bool]] = []
+    if methods:
+        selectors = set()
+        for method in methods:
+            if method.startswith("0x"):
+                selectors.add(int(method, 16))
+            elif method in METHOD_IDS:
+                selectors.add(int(METHOD_IDS[method], 16))
+            else:
+                raise ValueError(f"Unknown method '{method}' (known: {', '.join(METHOD_IDS)})")
+        checks.append(lambda tx: tx.method_id in selectors)
+    if include_wallets:
+        allowed = {bytes.fromhex(to_checksum_address(w)[2:]) for w in include_wallets}
+        checks.append(lambda tx: tx.sender in allowed)
+    if exclude_wallets:
+        denied = {bytes.fromhex(to_checksum_address(w)[2:]) for w in exclude_wallets}
+        checks.append(lambda tx: tx.sender not in denied)
+    if min_gas:
+        checks.append(lambda tx: tx.gas_used >= min_gas)
+    if min_value:
+        min_amount = round(min_value * 10**USDC_DECIMALS)
+        checks.append(lambda tx: tx.amount >= min_amount)
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+    return lambda tx: all(check(tx) for check in checks)
+
+
+# ============================================================================
+# SAMPLING
+# ============================================================================
+
+# Normal quantile for the two-sided 95% confidence intervals of sampled runs
+CONFIDENCE_Z = 1.96
+
+# TransactionAnalysis attributes that sampled runs estimate totals for
+SAMPLED_METRICS = ("gas_fee_usd", "usdc_fees", "usdc_deposit", "usdc_withdrawal", "orders_created", "orders_closed")
+
+
+@dataclass
+class SampleEstimate:
+    """Scaled totals of a sampled run with 95% confidence half-widths."""
+
+    rate: float
+    population: int  # Transactions the sample stands for
+    sampled: int  # Transactions actually analyzed
+    strata: int
+    totals: dict[str, tuple[float, float]]  # metric -> (estimate, +/- half-width)
+    hours: dict[datetime, dict[str, tuple[float, float]]]
+
+
+class StratifiedSample:
+    """
+    Deterministic stratified sample of txlist records.
+
+    Strata are (contract, method id, hour). Each keeps the max(1, round(rate * N))
+    transactions with the lowest blake2b(tx hash), so a range and rate always
+    select the same transactions and every non-empty stratum is represented.
+    A kept transaction stands for N / n transactions of its stratum (its
+    analysis weight); confidence intervals come from the within-stratum
+    variance with the finite-population correction.
+    """
+
+    def __init__(self, rate: float):
+        if not 0 < rate <= 1:
+            raise ValueError(f"Sample rate must be in (0, 1], got {rate}")
+        self.rate = rate
+        self.strata: dict[tuple[bytes, int, int], tuple[int, int]] = {}  # key -> (population, sampled)
+        self._stratum_of: dict[bytes, tuple[bytes, int, int]] = {}
+
+    @staticmethod
+    def _rank(tx: TxRecord) -> bytes:
+        import hashlib
+
+        return hashlib.blake2b(tx.tx_hash, digest_size=8).digest()
+
+    def select(self, txs: Iterable[TxRecord]) -> list[TxRecord]:
+        """Sampled transactions in chain order. Failed transactions are never analyzed, so they are left out."""
+        groups: dict[tuple[bytes, int, int], list[TxRecord]] = {}
+        for tx in txs:
+            if not tx.failed:
+                groups.setdefault((tx.to, tx.method_id, tx.timestamp // 3600), []).append(tx)
+        selected = []
+        for key, members in groups.items():
+            sampled = max(1, round(self.rate * len(members)))
+            members.sort(key=self._rank)
+            self.strata[key] = (len(members), sampled)
+            for tx in members[:sampled]:
+                self._stratum_of[tx.tx_hash] = key
+            selected.extend(members[:sampled])
+        selected.sort(key=lambda tx: (tx.block, tx.tx_index))
+        return selected
+
+    def weight(self, tx: TxRecord) -> float:
+        population, sampled = self.strata[self._stratum_of[tx.tx_hash]]
+        return population / sampled
+
+    def estimate(self, results: Iterable[TransactionAnalysis]) -> SampleEstimate:
+        """Scaled totals (overall and per hour) with 95% confidence intervals."""
+        values: dict[tuple[bytes, int, int], list[TransactionAnalysis]] = {}
+        for r in results:
+            key = self._stratum_of.get(bytes.fromhex(r.tx_hash[2:]))
+            if key is not None:
+                values.setdefault(key, []).append(r)
+
+        totals: dict[str, tuple[float, float]] = {}
+        hours: dict[datetime, dict[str, tuple[float, float]]] = {}
+        for metric in SAMPLED_METRICS:
+            # Per stratum: sample values, zero-padded for any sampled tx without an analysis
+            samples = {}
+            for key, (population, sampled) in self.strata.items():
+                xs = [float(getattr(r, metric)) for r in values.get(key, [])]
+                samples[key] = xs + [0.0] * (sampled - len(xs))
+
+            # Strata with a single sampled tx borrow the variance of their method's other hours
+            pooled: dict[tuple[bytes, int], float] = {}
+            for group in {(key[0], key[1]) for key in samples}:
+                squares = dof = 0.0
+                singles = []
+                for key, xs in samples.items():
+                    if (key[0], key[1]) != group:
+                        continue
+                    if len(xs) > 1:
+                        mean = sum(xs) / len(xs)
+                        squares += sum((x - mean) ** 2 for x in xs)
+                        dof += len(xs) - 1
+                    else:
+                        singles.extend(xs)
+                if dof:
+                    pooled[group] = squares / dof
+                elif len(singles) > 1:
+                    mean = sum(singles) / len(singles)
+                    pooled[group] = sum((x - mean) ** 2 for x in singles) / (len(singles) - 1)
+                else:
+                    pooled[group] = 0.0
+
+            total = variance = 0.0
+            hourly: dict[datetime, list[float]] = {}
+            for key, xs in samples.items():
+                population, sampled = self.strata[key]
+                mean = sum(xs) / sampled
+                if sampled > 1:
+                    s2 = sum((x - mean) ** 2 for x in xs) / (sampled - 1)
+                else:
+                    s2 = pooled[(key[0], key[1])]
+                stratum_total = population * mean
+                stratum_variance = population**2 * (1 - sampled / population) * s2 / sampled
+                total += stratum_total
+                variance += stratum_variance
+                hour = datetime.fromtimestamp(key[2] * 3600, tz=timezone.utc)
+                bucket = hourly.setdefault(hour, [0.0, 0.0])
+                bucket[0] += stratum_total
+                bucket[1] += stratum_variance
+            totals[metric] = (total, CONFIDENCE_Z * variance**0.5)
+            for hour, (hour_total, hour_variance) in hourly.items():
+                hours.setdefault(hour, {})[metric] = (hour_total, CONFIDENCE_Z * hour_variance**0.5)
+
+        return SampleEstimate(
+            rate=self.rate,
+            population=sum(population for population, _ in self.strata.values()),
+            sampled=sum(sampled for _, sampled in self.strata.values()),
+            strata=len(self.strata),
+            totals=totals,
+            hours=hours,
+        )
 
 
 # ============================================================================
@@ -107,26 +963,175 @@ class TransactionAnalysis:
 # ============================================================================
 
 
+class ApiKey:
+    """One Arbiscan key of a pool: its request spacing (rate budget) and health."""
+
+    __slots__ = ("key", "interval", "next_request_at", "in_flight", "parked_until", "strikes", "requests")
+
+    def __init__(self, key: str, interval: float):
+        self.key = key
+        self.interval = interval  # Seconds between requests on this key
+        self.next_request_at = 0.0
+        self.in_flight = 0
+        self.parked_until = 0.0
+        self.strikes = 0  # Consecutive rate-limit hits (grows the park time)
+        self.requests = 0
+
+    @classmethod
+    def parse(cls, spec: str, default_interval: float) -> "ApiKey":
+        """KEY or KEY@RATE (calls per second)."""
+        key, _, rate = spec.strip().partition("@")
+        if not key:
+            raise ValueError(f"Empty Arbiscan API key in {spec!r}")
+        if not rate:
+            return cls(key, default_interval)
+        try:
+            calls_per_second = float(rate)
+        except ValueError:
+            raise ValueError(f"Invalid rate in Arbiscan API key spec {spec!r}") from None
+        if calls_per_second <= 0:
+            raise ValueError(f"Invalid rate in Arbiscan API key spec {spec!r}")
+        return cls(key, 1.0 / calls_per_second)
+
+    @property
+    def label(self) -> str:
+        """Key suffix for messages (keys themselves are never printed)."""
+        return f"...{self.key[-4:]}"
+
+
 class ArbiscanClient:
-    """Client for interacting with Arbiscan/Etherscan API (v2 API with chainid)."""
+    """
+    Client for interacting with Arbiscan/Etherscan API (v2 API with chainid).
+
+    `api_key` is one key or a pool (a list, or a comma-separated string). Each
+    key keeps its own request spacing (MIN_REQUEST_INTERVAL, or KEY@RATE calls
+    per second), and requests are spread over the keys by `selection`:
+    "round-robin", or "least-loaded" (the key with the earliest free slot,
+    then the fewest requests in flight). A key that hits its rate limit or is
+    rejected as invalid is parked for a while and the request is retried on
+    another key, so throughput grows with the number of healthy keys.
+    """
 
     # V2 API endpoint (Etherscan unified API)
     BASE_URL_V2 = "https://api.etherscan.io/v2/api"
     # Arbitrum One chain ID
     CHAIN_ID = 42161
+    # Rate limiting - free tier allows 5 calls/second
+    MIN_REQUEST_INTERVAL = 0.25
+    SELECTIONS = ("round-robin", "least-loaded")
+
+    def __init__(self, api_key: Union[str, Iterable[str]], selection: str = "round-robin"):
+        if selection not in self.SELECTIONS:
+            raise ValueError(f"Unknown key selection {selection!r} (choose from {', '.join(self.SELECTIONS)})")
+        specs = api_key.split(",") if isinstance(api_key, str) else list(api_key)
+        self.keys = [ApiKey.parse(spec, self.MIN_REQUEST_INTERVAL) for spec in specs if spec.strip()]
+        if not self.keys:
+            self.keys = [ApiKey("", self.MIN_REQUEST_INTERVAL)]
+        self.selection = selection
+        self._session = None
+        # Shared across threads so concurrent analyzers stay within every key's rate limit
+        self._rate_lock = threading.Lock()
+        self._cursor = 0
+
+    @property
+    def api_key(self) -> str:
+        return self.keys[0].key
+
+    @property
+    def session(self):
+        """HTTP session, created (and requests imported) on first use."""
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+        return self._session
+
+    def _select_locked(self, now: float) -> ApiKey:
+        healthy = [key for key in self.keys if key.parked_until <= now]
+        if not healthy:
+            # Every key is parked: take the one released first
+            return min(self.keys, key=lambda key: key.parked_until)
+        if self.selection == "least-loaded":
+            return min(healthy, key=lambda key: (max(now, key.next_request_at), key.in_flight))
+        for _ in range(len(self.keys)):
+            key = self.keys[self._cursor % len(self.keys)]
+            self._cursor += 1
+            if key.parked_until <= now:
+                return key
+        return healthy[0]
+
+    def _acquire(self) -> ApiKey:
+        """Pick a key and reserve its next request slot, sleeping until the slot comes."""
+        with self._rate_lock:
+            now = time.monotonic()
+            key = self._select_locked(now)
+            start = max(now, key.next_request_at, min(key.parked_until, now + ARBISCAN_MAX_PARK_WAIT))
+            key.next_request_at = start + key.interval
+            key.in_flight += 1
+            key.requests += 1
+        if start > now:
+            time.sleep(start - now)
+        return key
 
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        self.session = requests.Session()
+    def _release(self, key: ApiKey, problem: Optional[str]):
+        with self._rate_lock:
+            key.in_flight -= 1
+            now = time.monotonic()
+            if problem == "rate-limit":
+                park = min(ARBISCAN_RATE_LIMIT_PARK * 2 ** key.strikes, ARBISCAN_RATE_LIMIT_PARK_MAX)
+                key.strikes += 1
+            elif problem == "invalid-key":
+                park = ARBISCAN_INVALID_KEY_PARK
+            else:
+                key.strikes = 0
+                return
+            # Requests that were already in flight when the key got parked extend the park quietly
+            newly_parked = key.parked_until <= now
+            key.parked_until = max(key.parked_until, now + park)
+        if newly_parked and len(self.keys) > 1:
+            print(f"  [Warning] Arbiscan key {key.label} parked for {park:.0f}s ({problem})")
+
+    def _has_healthy_key(self) -> bool:
+        with self._rate_lock:
+            now = time.monotonic()
+            return any(key.parked_until <= now for key in self.keys)
+
+    @staticmethod
+    def _key_problem(data: dict) -> Optional[str]:
+        """'rate-limit' / 'invalid-key' when a response is the key's fault, else None."""
+        if data.get("status") != "0":
+            return None
+        result = str(data.get("result", "")).lower()
+        if "rate limit" in result:
+            return "rate-limit"
+        if "invalid api key" in result or "missing/invalid api key" in result:
+            return "invalid-key"
+        return None
 
     def _request(self, params: dict) -> dict:
-        """Make a request to Arbiscan API with rate limiting."""
-        params["apikey"] = self.api_key
+        """Make a request to Arbiscan API with rate limiting, retrying key problems on other keys."""
         params["chainid"] = self.CHAIN_ID  # Required for v2 API
-        
-        response = self.session.get(self.BASE_URL_V2, params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+
+        attempts = len(self.keys) + 2
+        for _ in range(attempts):
+            key = self._acquire()
+            problem = None
+            try:
+                response = self.session.get(self.BASE_URL_V2, params={**params, "apikey": key.key}, timeout=30)
+                if response.status_code == 429:
+                    problem = "rate-limit"
+                    continue
+                response.raise_for_status()
+                data = response.json()
+                problem = self._key_problem(data)
+            finally:
+                self._release(key, problem)
+            if problem is None or (problem == "invalid-key" and not self._has_healthy_key()):
+                break
+        else:
+            raise RuntimeError(
+                f"Arbiscan request failed after {attempts} attempts: all API keys rate-limited or rejected"
+            )
 
         if data.get("status") == "0":
             msg = data.get("message", "Unknown error")
@@ -135,8 +1140,6 @@ class ArbiscanClient:
             if msg not in ["No transactions found", "No records found", "OK"]:
                 print(f"  [Warning] API: {msg} - {str(result)[:100]}")
 
-        # Rate limiting - free tier allows 5 calls/second
-        time.sleep(0.25)
         return data
 
     def get_transactions(
@@ -193,6 +1196,41 @@ class ArbiscanClient:
             return [tx for tx in result if tx.get("to", "").lower() == contract_address.lower()]
         return []
 
+    def get_token_transfers(self, address: str, start_block: int, end_block: int) -> Iterator[dict]:
+        """
+        All ERC20 transfers from or to an address in a block range (tokentx, any token).
+
+        Etherscan caps page * offset at 10000, so instead of numbering pages the
+        window slides: after a full page the next request starts at the page's
+        last block, and rows already seen in that block are skipped.
+        """
+        cursor = start_block
+        seen: set[tuple[str, str]] = set()
+        while cursor <= end_block:
+            data = self._request({
+                "module": "account",
+                "action": "tokentx",
+                "address": address,
+                "startblock": cursor,
+                "endblock": end_block,
+                "page": 1,
+                "offset": TOKENTX_PAGE_SIZE,
+                "sort": "asc",
+            })
+            rows = data.get("result", [])
+            if not isinstance(rows, list) or not rows:
+                break
+            for row in rows:
+                key = (row.get("hash", ""), row.get("logIndex") or f"{row.get('from')}>{row.get('to')}:{row.get('value')}")
+                if key not in seen:
+                    seen.add(key)
+                    yield row
+            if len(rows) < TOKENTX_PAGE_SIZE:
+                break
+            last_block = int(rows[-1]["blockNumber"])
+            # A page that is all one block can't slide - move past it
+            cursor = last_block + 1 if last_block == int(rows[0]["blockNumber"]) else last_block
+
     def get_block_by_timestamp(self, timestamp: int, closest: str = "before") -> int:
         """Get block number closest to a timestamp."""
         params = {
@@ -239,77 +1277,464 @@ class ArbiscanClient:
         return 3300.0
 
 
+class RPCError(Exception):
+    """JSON-RPC error response."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"RPC error {code}: {message}")
+        self.code = code
+        self.message = message
+
+
+def _is_throttle_error(error: Exception) -> bool:
+    """Whether an RPC error is a rate limit or capacity error (retry later, unchanged)."""
+    if isinstance(error, RPCError) and error.code in RPC_THROTTLE_CODES:
+        return True
+    message = str(error).lower()
+    return any(hint in message for hint in RPC_THROTTLE_HINTS)
+
+
+def _is_log_range_error(error: Exception) -> bool:
+    """Whether an eth_getLogs error means the block range or result set was too large."""
+    if _is_throttle_error(error):
+        return False
+    message = str(error).lower()
+    return any(hint in message for hint in LOGS_RANGE_ERROR_HINTS)
+
+
+def _web3_log(log: dict):
+    """A raw eth_getLogs entry formatted the way web3's eth.get_logs returns it."""
+    from hexbytes import HexBytes
+    from web3.datastructures import AttributeDict
+
+    formatted = dict(log)
+    for key in ("blockHash", "transactionHash", "data"):
+        if log.get(key) is not None:
+            formatted[key] = HexBytes(log[key])
+    for key in ("blockNumber", "transactionIndex", "logIndex"):
+        if log.get(key) is not None:
+            formatted[key] = _to_int(log[key])
+    if log.get("address"):
+        formatted["address"] = to_checksum_address(log["address"])
+    if "topics" in log:
+        formatted["topics"] = [HexBytes(topic) for topic in log["topics"]]
+    return AttributeDict(formatted)
+
+
 class AlchemyClient:
     """Client for interacting with Alchemy JSON-RPC API."""
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, cache: Optional["ResponseCache"] = None):
         self.url = url
-        self.web3 = Web3(Web3.HTTPProvider(url))
+        self.cache = cache
+        self._web3 = None
+        self._session = None
 
-    def get_transaction(self, tx_hash: str) -> dict:
-        """Get transaction details."""
-        try:
-            tx = self.web3.eth.get_transaction(tx_hash)
-            return dict(tx)
-        except TransactionNotFound:
-            return {}
+    @property
+    def session(self):
+        """HTTP session for raw (batched) JSON-RPC, created on first use."""
+        if self._session is None:
+            import requests
 
-    def get_transaction_receipt(self, tx_hash: str) -> dict:
-        """Get transaction receipt with logs."""
-        try:
-            receipt = self.web3.eth.get_transaction_receipt(tx_hash)
-            return dict(receipt)
-        except TransactionNotFound:
-            return {}
+            self._session = requests.Session()
+        return self._session
 
-    def get_logs(
-        self,
-        address: str,
-        from_block: int,
-        to_block: int,
-        topics: Optional[list] = None,
-    ) -> list:
-        """Get event logs."""
-        filter_params = {
-            "address": Web3.to_checksum_address(address),
-            "fromBlock": from_block,
-            "toBlock": to_block,
-        }
-        if topics:
-            filter_params["topics"] = topics
-        return self.web3.eth.get_logs(filter_params)
+    def rpc_batch(self, calls: list[tuple[str, list]], batch_size: int = RPC_BATCH_SIZE) -> list:
+        """
+        Send (method, params) calls as JSON-RPC batches of `batch_size`.
 
-    def get_block_by_timestamp(self, timestamp: int, direction: str = "before") -> int:
+        Results come back in call order as raw JSON (hex quantities). A call that
+        returns an error raises RPCError.
         """
-        Binary search for block number closest to timestamp.
-        direction: 'before' returns block just before timestamp, 'after' returns block just after
+        results = []
+        for offset in range(0, len(calls), batch_size):
+            chunk = calls[offset:offset + batch_size]
+            payload = [
+                {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+                for i, (method, params) in enumerate(chunk)
+            ]
+            response = self.session.post(self.url, json=payload, timeout=60)
+            response.raise_for_status()
+            body = response.json()
+            if isinstance(body, dict):
+                # Whole batch rejected
+                error = body.get("error") or {}
+                raise RPCError(error.get("code", 0), error.get("message", str(body)))
+            by_id = {item.get("id"): item for item in body}
+            for i in range(len(chunk)):
+                item = by_id.get(i, {})
+                if item.get("error"):
+                    raise RPCError(item["error"].get("code", 0), item["error"].get("message", ""))
+                results.append(item.get("result"))
+        return results
+
+    def get_transactions_bulk(self, tx_hashes: list[str]) -> dict[str, tuple[dict, dict]]:
         """
-        latest_block = self.web3.eth.block_number
-        
-        # Binary search
-        low = 1
-        high = latest_block
-        result_block = low if direction == "after" else high
-        
-        while low <= high:
-            mid = (low + high) // 2
-            block = self.web3.eth.get_block(mid)
-            block_timestamp = int(block.timestamp)
-            
-            if block_timestamp == timestamp:
-                return mid
-            elif block_timestamp < timestamp:
-                if direction == "after":
-                    result_block = mid
-                low = mid + 1
+        Fetch transactions and receipts for many hashes in combined JSON-RPC batches.
+
+        Returns {hash: (transaction, receipt)} for the hashes that exist; cached
+        entries are served without a request and mined results are cached.
+        """
+        found: dict[str, tuple[dict, dict]] = {}
+        missing = []
+        for tx_hash in tx_hashes:
+            cached_tx = self.cache.get("tx", tx_hash) if self.cache is not None else None
+            cached_receipt = self.cache.get("receipt", tx_hash) if self.cache is not None else None
+            if cached_tx and cached_receipt:
+                found[tx_hash] = (cached_tx, cached_receipt)
             else:
-                if direction == "before":
+                missing.append(tx_hash)
+
+        calls = []
+        for tx_hash in missing:
+            calls.append(("eth_getTransactionByHash", [tx_hash]))
+            calls.append(("eth_getTransactionReceipt", [tx_hash]))
+        responses = self.rpc_batch(calls)
+
+        for i, tx_hash in enumerate(missing):
+            tx, receipt = responses[2 * i], responses[2 * i + 1]
+            if not tx or not receipt:
+                continue
+            found[tx_hash] = (tx, receipt)
+            if self.cache is not None and tx.get("blockNumber") is not None:
+                block = _to_int(tx["blockNumber"])
+                self.cache.put("tx", tx_hash, tx, block=block)
+                self.cache.put("receipt", tx_hash, receipt, block=block)
+        return found
+
+    def trace_transactions(self, tx_hashes: Iterable[str]) -> dict[str, dict]:
+        """
+        callTracer traces (with logs) for many transactions, in JSON-RPC batches
+        of TRACE_BATCH_SIZE; returns {hash: trace}. Traces are cached in the
+        'trace' namespace. Batches the node rejects (no debug API, pruned
+        history) are left out and reported once.
+        """
+        traces: dict[str, dict] = {}
+        missing = []
+        for tx_hash in dict.fromkeys(h.lower() for h in tx_hashes):
+            cached = self.cache.get("trace", tx_hash) if self.cache is not None else None
+            if cached is not None:
+                traces[tx_hash] = cached
+            else:
+                missing.append(tx_hash)
+
+        failed, first_error = 0, None
+        for offset in range(0, len(missing), TRACE_BATCH_SIZE):
+            chunk = missing[offset:offset + TRACE_BATCH_SIZE]
+            try:
+                responses = self.rpc_batch(
+                    [("debug_traceTransaction", [tx_hash, TRACE_CONFIG]) for tx_hash in chunk],
+                    batch_size=TRACE_BATCH_SIZE,
+                )
+            except RPCError as e:
+                failed += len(chunk)
+                first_error = first_error or e
+                continue
+            for tx_hash, trace in zip(chunk, responses):
+                if not trace:
+                    continue
+                traces[tx_hash] = trace
+                if self.cache is not None:
+                    self.cache.put("trace", tx_hash, trace)
+        if failed:
+            print(f"  [Warning] debug_traceTransaction failed for {failed} transactions ({first_error})")
+        return traces
+
+    def get_blocks_bulk(self, block_numbers: Iterable[int]) -> dict[int, dict]:
+        """Fetch block headers (without transactions) for many blocks, one batch per RPC_BATCH_SIZE."""
+        blocks: dict[int, dict] = {}
+        missing = []
+        for number in sorted(set(block_numbers)):
+            cached = self.cache.get("block", str(number)) if self.cache is not None else None
+            if cached:
+                blocks[number] = cached
+            else:
+                missing.append(number)
+
+        responses = self.rpc_batch([("eth_getBlockByNumber", [hex(number), False]) for number in missing])
+        for number, block in zip(missing, responses):
+            if not block:
+                continue
+            blocks[number] = block
+            if self.cache is not None:
+                self.cache.put("block", str(number), block, block=number)
+        return blocks
+
+    def iter_block_blooms(self, from_block: int, to_block: int) -> Iterator[tuple[int, int]]:
+        """
+        Yield (block number, logsBloom as int) for a block range, in order.
+
+        Headers are fetched as JSON-RPC batches on BLOOM_WORKERS threads with a
+        bounded number of batches in flight. They are not cached: bloom scans
+        cover far more blocks than they keep.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        def blooms(numbers: range, future) -> Iterator[tuple[int, int]]:
+            for number, header in zip(numbers, future.result()):
+                if header:
+                    yield number, int(header.get("logsBloom") or "0x0", 16)
+
+        with ThreadPoolExecutor(max_workers=BLOOM_WORKERS) as pool:
+            pending: deque = deque()
+            for start in range(from_block, to_block + 1, RPC_BATCH_SIZE):
+                numbers = range(start, min(start + RPC_BATCH_SIZE, to_block + 1))
+                calls = [("eth_getBlockByNumber", [hex(number), False]) for number in numbers]
+                pending.append((numbers, pool.submit(self.rpc_batch, calls)))
+                if len(pending) >= BLOOM_WORKERS * BLOOM_BATCHES_PER_WORKER:
+                    yield from blooms(*pending.popleft())
+            while pending:
+                yield from blooms(*pending.popleft())
+
+    def get_blocks_at_timestamps(
+        self,
+        timestamps: Iterable[int],
+        low_block: int,
+        high_block: int,
+    ) -> dict[int, int]:
+        """
+        Last block at or before each timestamp, searched within [low_block, high_block].
+
+        All targets are searched together: every round fetches each target's next
+        probe block in one batch, alternating interpolation (Arbitrum blocks are
+        roughly evenly spaced in time) with bisection so a bad guess can't stall
+        a target. Results are cached in the 'timestamp' namespace.
+        """
+        found: dict[int, int] = {}
+        pending = []
+        for timestamp in sorted(set(timestamps)):
+            cached = self.cache.get("timestamp", str(timestamp)) if self.cache is not None else None
+            if cached is not None:
+                found[timestamp] = cached
+            else:
+                pending.append(timestamp)
+        if not pending:
+            return found
+
+        edges = self.get_blocks_bulk([low_block, high_block])
+        low = (low_block, _to_int(edges[low_block]["timestamp"]))
+        high = (high_block, _to_int(edges[high_block]["timestamp"]))
+        bounds: dict[int, list[tuple[int, int]]] = {}  # timestamp -> [(block, ts) at or before, (block, ts) after]
+        for timestamp in pending:
+            if high[1] <= timestamp:
+                found[timestamp] = high_block
+            elif low[1] > timestamp:
+                found[timestamp] = low_block  # nothing earlier in range - clamp
+            else:
+                bounds[timestamp] = [low, high]
+
+        interpolate = True
+        while bounds:
+            probes = {}
+            for timestamp, ((lo_block, lo_ts), (hi_block, hi_ts)) in bounds.items():
+                if interpolate and hi_ts > lo_ts:
+                    guess = lo_block + (timestamp - lo_ts) * (hi_block - lo_block) // (hi_ts - lo_ts)
+                else:
+                    guess = (lo_block + hi_block) // 2
+                probes[timestamp] = min(max(guess, lo_block + 1), hi_block - 1)
+            blocks = self.get_blocks_bulk(probes.values())
+            for timestamp, number in probes.items():
+                if number not in blocks:
+                    raise RPCError(0, f"Block {number} not found")
+                block_ts = _to_int(blocks[number]["timestamp"])
+                bounds[timestamp][0 if block_ts <= timestamp else 1] = (number, block_ts)
+            for timestamp in [t for t, (lo, hi) in bounds.items() if hi[0] - lo[0] <= 1]:
+                found[timestamp] = bounds.pop(timestamp)[0][0]
+                if self.cache is not None:
+                    self.cache.put("timestamp", str(timestamp), found[timestamp], block=found[timestamp])
+            interpolate = not interpolate
+        return found
+
+    def eth_call_batch(self, calls: list[tuple[str, bytes, int]]) -> list[bytes]:
+        """Run (to, calldata, block) eth_calls as JSON-RPC batches; returns raw return data."""
+        responses = self.rpc_batch([
+            ("eth_call", [{"to": to, "data": "0x" + data.hex()}, hex(block)])
+            for to, data, block in calls
+        ])
+        return [bytes.fromhex((result or "0x")[2:]) for result in responses]
+
+    @property
+    def web3(self):
+        """Web3 instance, created (and web3 imported) on first use."""
+        if self._web3 is None:
+            from web3 import Web3
+
+            self._web3 = Web3(Web3.HTTPProvider(self.url))
+        return self._web3
+
+    def _cached_fetch(self, namespace: str, key: str, fetch) -> dict:
+        """Serve from cache, or fetch, normalize and cache mined (immutable) data."""
+        if self.cache is not None:
+            cached = self.cache.get(namespace, key)
+            if cached is not None:
+                return cached
+
+        from web3.exceptions import BlockNotFound, TransactionNotFound
+
+        try:
+            value = _plain(fetch())
+        except (TransactionNotFound, BlockNotFound):
+            return {}
+
+        block = value.get("blockNumber", value.get("number"))
+        if self.cache is not None and block is not None:
+            self.cache.put(namespace, key, value, block=_to_int(block))
+        return value
+
+    def get_transaction(self, tx_hash: str) -> dict:
+        """Get transaction details."""
+        return self._cached_fetch("tx", tx_hash.lower(), lambda: self.web3.eth.get_transaction(tx_hash))
+
+    def get_transaction_receipt(self, tx_hash: str) -> dict:
+        """Get transaction receipt with logs."""
+        return self._cached_fetch("receipt", tx_hash.lower(), lambda: self.web3.eth.get_transaction_receipt(tx_hash))
+
+    def get_block(self, block_number: int) -> dict:
+        """Get block header (transaction hashes only)."""
+        return self._cached_fetch("block", str(block_number), lambda: self.web3.eth.get_block(block_number))
+
+    def rpc(self, method: str, params: list):
+        """Send a single JSON-RPC call; raises RPCError on an error response."""
+        response = self.session.post(
+            self.url,
+            json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params},
+            timeout=60,
+        )
+        if response.status_code >= 400:
+            # Providers report oversized eth_getLogs requests as 4xx with a JSON-RPC body
+            try:
+                error = response.json().get("error") or {}
+            except ValueError:
+                error = {}
+            if error:
+                raise RPCError(error.get("code", response.status_code), error.get("message", ""))
+            response.raise_for_status()
+        body = response.json()
+        if body.get("error"):
+            raise RPCError(body["error"].get("code", 0), body["error"].get("message", ""))
+        return body.get("result")
+
+    def _get_logs_chunk(self, base_filter: dict, start: int, end: int) -> tuple[list, float]:
+        """
+        Fetch one eth_getLogs chunk, retrying transient failures (rate limits
+        included) with exponential backoff. Range errors are raised at once so
+        the caller can split the chunk. Returns (logs, seconds).
+        """
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                logs = self.rpc("eth_getLogs", [{**base_filter, "fromBlock": hex(start), "toBlock": hex(end)}])
+                return logs or [], time.monotonic() - started
+            except Exception as e:
+                if isinstance(e, RPCError) and _is_log_range_error(e):
+                    raise
+                # Rate limits (RPC errors, or a bare HTTP 429) get a longer backoff
+                attempts = LOGS_THROTTLE_RETRIES if _is_throttle_error(e) else LOGS_MAX_RETRIES
+                if attempt == attempts - 1:
+                    raise
+            time.sleep(2 ** attempt)
+            attempt += 1
+
+    def get_logs(
+        self,
+        address: str,
+        from_block: int,
+        to_block: int,
+        topics: Optional[list] = None,
+    ) -> list:
+        """
+        Get event logs for a block range of any size, as web3 AttributeDicts.
+
+        The range is fetched as eth_getLogs chunks on LOGS_WORKERS threads. A chunk
+        the provider rejects as too wide or too large is halved and retried (and
+        the chunk size shrinks with it); chunks that come back quickly grow the
+        chunk size, up to LOGS_MAX_CHUNK. Rate-limited chunks are retried as they
+        are. Results are reassembled in block order and deduplicated by
+        (block, tx hash, log index).
+        """
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        base_filter = {"address": to_checksum_address(address)}
+        if topics:
+            base_filter["topics"] = topics
+
+        chunk_size = LOGS_INITIAL_CHUNK
+        cursor = from_block
+        retry_ranges: deque[tuple[int, int]] = deque()  # halves of rejected chunks, fetched first
+        chunks: dict[int, list] = {}  # start block -> logs
+
+        with ThreadPoolExecutor(max_workers=LOGS_WORKERS) as pool:
+            in_flight = {}
+            while cursor <= to_block or retry_ranges or in_flight:
+                while len(in_flight) < LOGS_WORKERS and (retry_ranges or cursor <= to_block):
+                    if retry_ranges:
+                        start, end = retry_ranges.popleft()
+                    else:
+                        start, end = cursor, min(cursor + chunk_size - 1, to_block)
+                        cursor = end + 1
+                    in_flight[pool.submit(self._get_logs_chunk, base_filter, start, end)] = (start, end)
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end = in_flight.pop(future)
+                    try:
+                        logs, elapsed = future.result()
+                    except RPCError as e:
+                        if not _is_log_range_error(e) or start == end:
+                            raise
+                        middle = (start + end) // 2
+                        retry_ranges.appendleft((middle + 1, end))
+                        retry_ranges.appendleft((start, middle))
+                        chunk_size = max(LOGS_MIN_CHUNK, (end - start + 1) // 2)
+                        continue
+                    chunks[start] = logs
+                    if elapsed < LOGS_FAST_SECONDS and end - start + 1 >= chunk_size:
+                        chunk_size = min(chunk_size * 2, LOGS_MAX_CHUNK)
+
+        seen = set()
+        ordered = []
+        for start in sorted(chunks):
+            for log in chunks[start]:
+                key = (_to_int(log.get("blockNumber")), log.get("transactionHash"), _to_int(log.get("logIndex")))
+                if key in seen:
+                    continue
+                seen.add(key)
+                ordered.append(log)
+        ordered.sort(key=lambda log: (_to_int(log.get("blockNumber")), _to_int(log.get("logIndex"))))
+        return [_web3_log(log) for log in ordered]
+
+    def get_block_by_timestamp(self, timestamp: int, direction: str = "before") -> int:
+        """
+        Binary search for block number closest to timestamp.
+        direction: 'before' returns block just before timestamp, 'after' returns block just after
+        """
+        latest_block = self.web3.eth.block_number
+        
+        # Binary search
+        low = 1
+        high = latest_block
+        result_block = low if direction == "after" else high
+        
+        while low <= high:
+            mid = (low + high) // 2
+            block = self.get_block(mid)
+            block_timestamp = _to_int(block["timestamp"])
+            
+            if block_timestamp == timestamp:
+                return mid
+            elif block_timestamp < timestamp:
+                if direction == "after":
+                    result_block = mid
+                low = mid + 1
+            else:
+                if direction == "before":
                     result_block = mid
                 high = mid - 1
         
         # Verify and adjust result
-        result_block_data = self.web3.eth.get_block(result_block)
-        result_timestamp = int(result_block_data.timestamp)
+        result_block_data = self.get_block(result_block)
+        result_timestamp = _to_int(result_block_data["timestamp"])
         
         if direction == "before" and result_timestamp > timestamp and result_block > 1:
             result_block -= 1
@@ -323,128 +1748,252 @@ class AlchemyClient:
         return self.web3.eth.block_number
 
 
+class SubgraphError(Exception):
+    """GraphQL error response from the subgraph."""
+
+
+class SubgraphClient:
+    """
+    Client for the project's futures subgraph (indexer/schema.graphql).
+
+    `transport(url, payload) -> response body` can be injected (e.g. a recorded
+    stand-in); by default payloads are POSTed with requests.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        transport: Optional[Callable[[str, dict], dict]] = None,
+        page_size: int = SUBGRAPH_PAGE_SIZE,
+    ):
+        self.url = url
+        self.page_size = page_size
+        self._transport = transport
+        self._session = None
+
+    def _post(self, url: str, payload: dict) -> dict:
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+        response = self._session.post(url, json=payload, timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    def query(self, query: str, variables: Optional[dict] = None) -> dict:
+        """Run one GraphQL query and return its data; raises SubgraphError on errors."""
+        transport = self._transport or self._post
+        body = transport(self.url, {"query": query, "variables": variables or {}})
+        if body.get("errors"):
+            raise SubgraphError("; ".join(str(e.get("message", e)) for e in body["errors"]))
+        return body.get("data") or {}
+
+    def iter_entities(
+        self,
+        collection: str,
+        filter_type: str,
+        fields: str,
+        where: dict,
+    ) -> Iterator[dict]:
+        """
+        Page through every entity matching `where`, ordered by id.
+
+        Pages are cursored with id_gt on the last id seen rather than `skip`,
+        which graph-node caps and which gets slower the deeper it pages.
+        """
+        query = (
+            f"query($first: Int!, $where: {filter_type}!) {{ "
+            f"{collection}(first: $first, where: $where, orderBy: id, orderDirection: asc) {{ {fields} }} }}"
+        )
+        cursor = None
+        while True:
+            page_where = {**where, "id_gt": cursor} if cursor is not None else where
+            rows = self.query(query, {"first": self.page_size, "where": page_where}).get(collection) or []
+            yield from rows
+            if len(rows) < self.page_size:
+                return
+            cursor = rows[-1]["id"]
+
+
 # ============================================================================
 # TRANSACTION ANALYZER
 # ============================================================================
 
 
 class MarketMakerAnalyzer:
-    """Analyzes market maker transactions on the futures contract."""
+    """
+    Analyzes market maker transactions on the futures contract.
+
+    Library use: pass already-built `arbiscan` / `alchemy` clients, a `cache`
+    or an `archive` to share connections and cached data between analyzers,
+    then consume iter_analyses() and aggregate() instead of the CSV writers.
+    """
 
     def __init__(
         self,
-        arbiscan_api_key: str,
-        alchemy_url: str,
-        futures_contract: str,
+        arbiscan_api_key: str = "",
+        alchemy_url: str = "",
+        futures_contract: str = DEFAULT_CONFIG["FUTURES_CONTRACT"],
         market_maker_wallet: Optional[str] = None,
         analyze_all_wallets: bool = False,
         exclude_wallet: Optional[str] = None,
+        archive_dir: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        arbiscan: Optional[ArbiscanClient] = None,
+        alchemy: Optional[AlchemyClient] = None,
+        cache: Optional["ResponseCache"] = None,
+        archive: Optional[EventArchive] = None,
+        label: str = "",
+        journal: Optional["RunJournal"] = None,
+        transfer_source: str = "receipts",
+        subgraph: Optional[SubgraphClient] = None,
+        sample: Optional[StratifiedSample] = None,
+        tx_scan: str = "txlist",
     ):
-        self.arbiscan = ArbiscanClient(arbiscan_api_key)
-        self.alchemy = AlchemyClient(alchemy_url)
-        self.futures_contract = Web3.to_checksum_address(futures_contract)
-        self.market_maker_wallet = Web3.to_checksum_address(market_maker_wallet) if market_maker_wallet else None
+        if cache is None and cache_dir:
+            from response_cache import ResponseCache
+
+            cache = ResponseCache(cache_dir)
+        self.cache = cache
+        self.arbiscan = arbiscan or ArbiscanClient(arbiscan_api_key)
+        self.alchemy = alchemy or AlchemyClient(alchemy_url, cache=self.cache)
+        self.futures_contract = to_checksum_address(futures_contract)
+        self.market_maker_wallet = to_checksum_address(market_maker_wallet) if market_maker_wallet else None
         self.analyze_all_wallets = analyze_all_wallets
-        self.exclude_wallet = Web3.to_checksum_address(exclude_wallet) if exclude_wallet else None
+        self.exclude_wallet = to_checksum_address(exclude_wallet) if exclude_wallet else None
         self.eth_price_cache: dict[int, float] = {}  # block -> price
+        self.archive = archive or (EventArchive(archive_dir) if archive_dir else None)
+        self.label = label
+        self.journal = journal
+        self.block_range: Optional[tuple[int, int]] = None  # Set by analyze_date_range
+        # "tokentx": transfers come from Arbiscan in bulk (see load_token_transfers)
+        self.transfer_source = transfer_source
+        self.token_transfers: Optional[dict[bytes, list[DecodedEvent]]] = None
+        # With a subgraph, order/position events come from it (see load_subgraph_events)
+        self.subgraph = subgraph
+        self.subgraph_events: Optional[dict[bytes, list[DecodedEvent]]] = None
+        # (closedBy, closedAt) -> ((order id, price per day, delivery date, is buy), OrderClosed) to place
+        self.subgraph_closures: dict[tuple[bytes, int], list[tuple[tuple, DecodedEvent]]] = {}
+        # With a sample only its transactions are analyzed, each weighted by its stratum
+        self.sample = sample
+        # "bloom": transactions are found from block headers' logsBloom (see scan_bloom_transactions)
+        self.tx_scan = tx_scan
+        self.bloom_stats: Optional[dict[str, int]] = None
+        self.prefetched_receipts: dict[bytes, dict] = {}  # Receipts the bloom scan already fetched
+        self.receipts_fetched = 0
+        self.receipts_saved = 0
+        self.filtered_out = 0  # Transactions rejected by `filters` before any receipt fetch
+        self.set_address_table(AddressTable())
+
+    def set_address_table(self, addresses: AddressTable):
+        """Use (or share) an address table and intern the configured addresses in it."""
+        self.addresses = addresses
+        self._contract = addresses.intern(self.futures_contract.lower())
+        self._excluded = addresses.intern(self.exclude_wallet.lower()) if self.exclude_wallet else None
+
+    def for_deployment(self, deployment: Deployment) -> "MarketMakerAnalyzer":
+        """
+        Analyzer for another deployment sharing this one's clients, cache, archive
+        and ETH price. The wallet mode (single wallet / all / exclude) is kept;
+        the deployment's own wallet replaces the market maker wallet if given.
+        """
+        wallet = deployment.wallet or self.market_maker_wallet or self.exclude_wallet
+        analyzer = MarketMakerAnalyzer(
+            futures_contract=deployment.contract,
+            market_maker_wallet=None if self.analyze_all_wallets else wallet,
+            analyze_all_wallets=self.analyze_all_wallets,
+            exclude_wallet=wallet if self.exclude_wallet else None,
+            arbiscan=self.arbiscan,
+            alchemy=self.alchemy,
+            cache=self.cache,
+            archive=self.archive,
+            label=deployment.label,
+            journal=self.journal,
+            transfer_source=self.transfer_source,
+        )
+        analyzer.eth_price_cache = self.eth_price_cache
+        analyzer.set_address_table(self.addresses)
+        return analyzer
 
     def get_eth_price_at_time(self, timestamp: int) -> float:
         """Get ETH price at a specific time (approximated with current price for now)."""
         if not self.eth_price_cache:
-            self.eth_price_cache[0] = self.arbiscan.get_eth_price()
+            price = None
+            if self.journal is not None:
+                # A resumed run keeps the price its journaled results were computed with
+                price = self.journal.values.get("eth_price")
+            if price is None and self.cache is not None:
+                price = self.cache.get("eth_price", "current", max_age=ETH_PRICE_CACHE_TTL)
+            if price is None:
+                price = self.arbiscan.get_eth_price()
+                if self.cache is not None:
+                    self.cache.put("eth_price", "current", price)
+            if self.journal is not None and "eth_price" not in self.journal.values:
+                self.journal.set_value("eth_price", price)
+            self.eth_price_cache[0] = price
         return self.eth_price_cache[0]
 
-    def decode_order_created_event(self, log: dict) -> dict:
+    def decode_logs(self, logs: list) -> list[DecodedEvent]:
         """
-        Decode OrderCreated event log.
-        
-        Event signature: OrderCreated(bytes32 indexed orderId, address indexed participant, 
-                                       string destURL, uint256 pricePerDay, uint256 deliveryAt, bool isBuy)
-        
-        Data layout (ABI encoded):
-        - bytes 0-31: offset to destURL string (dynamic)
-        - bytes 32-63: pricePerDay (uint256)
-        - bytes 64-95: deliveryAt (uint256)
-        - bytes 96-127: isBuy (bool, padded to 32 bytes)
-        - bytes 128+: string data (length + content)
+        Decode receipt logs into DecodedEvents.
+
+        Every event in the Futures and ERC20 ABIs is decoded (one dict lookup
+        on topic0); logs with unknown topics are ignored.
         """
-        topics = log.get("topics", [])
-        data = log.get("data", "0x")
+        events = []
+        for position, log in enumerate(logs):
+            # Get topics - handle both dict and AttributeDict formats
+            if hasattr(log, "topics"):
+                topics = [_to_hex(t) for t in log.topics]
+            else:
+                topics = [_to_hex(t) for t in log.get("topics", [])]
 
-        if len(topics) < 3:
-            return {}
+            if not topics:
+                continue
 
-        # Topics[1] = orderId (bytes32, indexed)
-        # Topics[2] = participant (address, indexed)
-        order_id = topics[1] if len(topics) > 1 else None
-        participant = "0x" + topics[2][-40:] if len(topics) > 2 else None
+            decoder = event_registry().get(topics[0].lower())
+            if decoder is None:
+                continue
 
-        # Decode data to get isBuy flag
-        is_buy = False
-        price_per_day = 0
-        delivery_at = 0
-        
-        if data and data != "0x":
-            try:
-                data_hex = data[2:] if data.startswith("0x") else data
-                data_bytes = bytes.fromhex(data_hex)
-                
-                # isBuy is at offset 96 (3rd uint256 slot after string offset)
-                if len(data_bytes) >= 128:  # Need at least 4 slots (32 bytes each)
-                    # Slot 0 (bytes 0-31): string offset
-                    # Slot 1 (bytes 32-63): pricePerDay
-                    price_per_day = int.from_bytes(data_bytes[32:64], "big")
-                    # Slot 2 (bytes 64-95): deliveryAt
-                    delivery_at = int.from_bytes(data_bytes[64:96], "big")
-                    # Slot 3 (bytes 96-127): isBuy (bool)
-                    is_buy = int.from_bytes(data_bytes[96:128], "big") == 1
-            except Exception as e:
-                pass  # Keep defaults
+            # Get log address
+            log_address = log.address if hasattr(log, "address") else log.get("address", "")
+            log_address = str(log_address).lower()
 
-        return {
-            "order_id": order_id,
-            "participant": participant,
-            "is_buy": is_buy,
-            "price_per_day": price_per_day,
-            "delivery_at": delivery_at,
-        }
+            log_data = log.data if hasattr(log, "data") else log.get("data", "0x")
+            log_data = _to_hex(log_data)
 
-    def analyze_transaction(self, tx: dict, override_wallet: Optional[str] = None) -> Optional[TransactionAnalysis]:
-        """Analyze a single transaction."""
-        tx_hash = tx.get("hash", "")
-        to_address = tx.get("to", "").lower()
+            log_index = log.logIndex if hasattr(log, "logIndex") else log.get("logIndex", position)
+            log_index = _to_int(log_index)
 
-        # Only analyze transactions to the futures contract
-        if to_address != self.futures_contract.lower():
-            return None
+            try:
+                args = decoder.decode(topics, bytes.fromhex(log_data[2:]))
+            except ValueError:
+                continue
+            if args is None:
+                continue
+            events.append(DecodedEvent(decoder.name, log_index, log_address, args))
 
-        # Skip failed transactions
-        if tx.get("isError") == "1" or tx.get("txreceipt_status") == "0":
-            return None
+        return events
 
-        timestamp = datetime.fromtimestamp(int(tx.get("timeStamp", 0)), tz=timezone.utc)
-        # Use override wallet if provided, otherwise get from transaction
-        wallet = override_wallet if override_wallet else tx.get("from", "")
-        wallet_checksum = Web3.to_checksum_address(wallet) if wallet else ""
-
-        # Get method ID
-        input_data = tx.get("input", "")
-        if hasattr(input_data, "hex"):
-            input_data = "0x" + input_data.hex()
-        if not input_data.startswith("0x"):
-            input_data = "0x" + input_data
-        method_id = input_data[:10] if len(input_data) >= 10 else ""
-
-        # Determine method from method ID
-        method = "unknown"
-        for name, mid in METHOD_IDS.items():
-            if method_id.lower() == mid.lower():
-                method = name
-                break
+    def classify_transaction(
+        self,
+        timestamp: int,
+        tx_hash: str,
+        wallet: str,
+        method: str,
+        gas_used: int,
+        gas_price: int,
+        eth_price_usd: float,
+        events: list[DecodedEvent],
+    ) -> TransactionAnalysis:
+        """
+        Turn a transaction's decoded events into a TransactionAnalysis.
 
-        # Get transaction receipt for detailed logs
-        receipt = self.alchemy.get_transaction_receipt(tx_hash)
-        logs = receipt.get("logs", [])
+        This is pure classification - no network access - so it can be re-run
+        over archived events whenever the rules below change.
+        """
+        wallet_lower = wallet.lower()
+        contract_lower = self.futures_contract.lower()
 
         # Analyze logs
         usdc_fees = 0.0
@@ -454,78 +2003,58 @@ class MarketMakerAnalyzer:
         orders_closed = 0
         buy_orders = 0
         sell_orders = 0
-        
+
         # Track all transfer amounts for analysis
         transfers_to_contract = []
         transfers_from_contract = []
+        cohorts = []
+        cohort_fees = []  # Order fee paid for each cohorts entry
+        unpaid = 0  # Trailing cohorts entries whose createOrder hasn't paid its fee yet
 
-        for log in logs:
-            # Get topics - handle both dict and AttributeDict formats
-            if hasattr(log, "topics"):
-                topics = [t.hex() if hasattr(t, "hex") else t for t in log.topics]
-            else:
-                topics = log.get("topics", [])
-                topics = [t.hex() if hasattr(t, "hex") else t for t in topics]
+        for event in events:
+            if event.name == "Transfer":
+                from_addr = event.args["from"]
+                to_addr = event.args["to"]
+                value_usdc = event.args["value"] / (10**USDC_DECIMALS)
 
-            if not topics:
-                continue
+                # Track transfers TO contract (from the transaction's wallet)
+                if from_addr == wallet_lower and to_addr == contract_lower:
+                    transfers_to_contract.append(value_usdc)
+                    # createOrder pays one fee after the orders and fills it produced
+                    for i in range(len(cohorts) - unpaid, len(cohorts)):
+                        cohort_fees[i] += value_usdc / unpaid
+                    unpaid = 0
 
-            topic0 = topics[0] if topics else ""
-            if hasattr(topic0, "hex"):
-                topic0 = topic0.hex()
-            if not topic0.startswith("0x"):
-                topic0 = "0x" + topic0
+                # Track transfers FROM contract (to the transaction's wallet)
+                if from_addr == contract_lower and to_addr == wallet_lower:
+                    transfers_from_contract.append(value_usdc)
 
-            # Get log address
-            log_address = log.address if hasattr(log, "address") else log.get("address", "")
-            if hasattr(log_address, "lower"):
-                log_address = log_address.lower()
-
-            # Check for Transfer events
-            if topic0.lower() == EVENT_TOPICS["Transfer"].lower():
-                if len(topics) >= 3:
-                    from_addr = "0x" + topics[1][-40:] if topics[1] else ""
-                    to_addr = "0x" + topics[2][-40:] if topics[2] else ""
-
-                    # Decode value from data
-                    log_data = log.data if hasattr(log, "data") else log.get("data", "0x")
-                    if hasattr(log_data, "hex"):
-                        log_data = log_data.hex()
-                    if log_data.startswith("0x"):
-                        log_data = log_data[2:]
-                    try:
-                        value = int(log_data, 16) if log_data else 0
-                        value_usdc = value / (10**USDC_DECIMALS)
-                        
-                        # Track transfers TO contract (from the transaction's wallet)
-                        if (from_addr.lower() == wallet_checksum.lower()
-                            and to_addr.lower() == self.futures_contract.lower()):
-                            transfers_to_contract.append(value_usdc)
-                        
-                        # Track transfers FROM contract (to the transaction's wallet)
-                        if (from_addr.lower() == self.futures_contract.lower()
-                            and to_addr.lower() == wallet_checksum.lower()):
-                            transfers_from_contract.append(value_usdc)
-                    except ValueError:
-                        pass
-
-            # Check for OrderCreated events
-            elif topic0.lower() == EVENT_TOPICS["OrderCreated"].lower():
+            elif event.name == "OrderCreated":
                 orders_created += 1
-                # Decode to check if buy or sell
-                log_data = log.data if hasattr(log, "data") else log.get("data", "0x")
-                if hasattr(log_data, "hex"):
-                    log_data = "0x" + log_data.hex()
-                decoded = self.decode_order_created_event({"topics": topics, "data": log_data})
-                if decoded.get("is_buy"):
+                if event.args.get("is_buy"):
                     buy_orders += 1
                 else:
                     sell_orders += 1
+                cohorts.append((event.args["delivery_at"], event.args["price_per_day"], False))
+                cohort_fees.append(0.0)
+                unpaid += 1
 
-            # Check for OrderClosed events
-            elif topic0.lower() == EVENT_TOPICS["OrderClosed"].lower():
+            elif event.name == "OrderClosed":
                 orders_closed += 1
 
+            elif event.name == "PositionCreated":
+                # A fill: the order it matched is priced at what the buyer pays
+                cohorts.append((event.args["delivery_at"], event.args["buy_price_per_day"], True))
+                cohort_fees.append(0.0)
+                unpaid += 1
+
+        # Each cohorts entry's share of the transaction: its part of the fees paid, evenly if none were
+        paid = sum(cohort_fees)
+        cohorts = [
+            (delivery_at, price, filled, fee / paid if paid else 1 / len(cohorts))
+            for (delivery_at, price, filled), fee in zip(cohorts, cohort_fees)
+        ]
+
         # Categorize transfers based on method type
         if method == "addMargin":
             # All transfers to contract are deposits
@@ -543,13 +2072,8 @@ class MarketMakerAnalyzer:
             usdc_fees = sum(transfers_to_contract)
 
         # Calculate gas fees
-        gas_used = int(tx.get("gasUsed", 0))
-        gas_price = int(tx.get("gasPrice", 0))
         gas_fee_wei = gas_used * gas_price
         gas_fee_eth = gas_fee_wei / 10**18
-
-        # Get ETH price for USD conversion
-        eth_price_usd = self.get_eth_price_at_time(int(tx.get("timeStamp", 0)))
         gas_fee_usd = gas_fee_eth * eth_price_usd
 
         # Determine action description (method is now a separate column, so no prefix needed)
@@ -571,7 +2095,7 @@ class MarketMakerAnalyzer:
             action = f"-${usdc_withdrawal:.2f} withdrawal"
 
         return TransactionAnalysis(
-            timestamp=timestamp,
+            timestamp=datetime.fromtimestamp(timestamp, tz=timezone.utc),
             tx_hash=tx_hash,
             wallet=wallet,
             action=action,
@@ -586,254 +2110,1700 @@ class MarketMakerAnalyzer:
             orders_closed=orders_closed,
             buy_orders=buy_orders,
             sell_orders=sell_orders,
+            contract=self.label,
+            cohorts=cohorts,
         )
 
-    def analyze_date_range(
+    def analyze_transaction(
         self,
-        start_date: datetime,
-        end_date: datetime,
-        verbose: bool = True,
-    ) -> list[TransactionAnalysis]:
-        """Analyze all transactions in a date range."""
-        results = []
+        tx: Union[TxRecord, dict],
+        override_wallet: Optional[str] = None,
+        receipt: Optional[dict] = None,
+    ) -> Optional[TransactionAnalysis]:
+        """Analyze a single transaction (fetching its receipt unless one is passed in)."""
+        if isinstance(tx, dict):
+            tx = TxRecord.from_txlist(tx, self.addresses)
 
-        # Get block numbers for date range
-        start_timestamp = int(start_date.timestamp())
-        end_timestamp = int(end_date.timestamp())
+        # Only analyze transactions to the futures contract
+        if tx.to != self._contract:
+            return None
 
-        if verbose:
-            print(f"Fetching block numbers for date range...")
-            print(f"  Start: {start_date.isoformat()} (timestamp: {start_timestamp})")
-            print(f"  End: {end_date.isoformat()} (timestamp: {end_timestamp})")
+        # Skip failed transactions
+        if tx.failed:
+            return None
 
-        start_block = self.arbiscan.get_block_by_timestamp(start_timestamp, "after")
-        if start_block == 0:
-            # Fallback to Alchemy
-            if verbose:
-                print("  Using Alchemy for block lookup (Arbiscan API unavailable)...")
-            start_block = self.alchemy.get_block_by_timestamp(start_timestamp, "after")
-        
-        end_block = self.arbiscan.get_block_by_timestamp(end_timestamp, "before")
-        if end_block == 0:
-            end_block = self.alchemy.get_block_by_timestamp(end_timestamp, "before")
+        tx_hash = tx.hash
+        timestamp = tx.timestamp
+        # Use override wallet if provided, otherwise get from transaction
+        wallet = override_wallet if override_wallet else tx.wallet
+        method = method_name(tx.method_id)
 
-        if verbose:
-            print(f"  Block range: {start_block} - {end_block}")
+        if receipt is None and self.prefetched_receipts:
+            receipt = self.prefetched_receipts.pop(tx.tx_hash, None)
 
-        # Fetch transactions based on mode
-        all_txs = []
-        page = 1
-        
-        # Use max offset (10000) for better pagination - Arbiscan can return less than requested
-        MAX_OFFSET = 10000
-        
-        if self.analyze_all_wallets:
-            # Fetch ALL transactions to the contract
-            if verbose:
-                print(f"\nFetching ALL transactions to contract {self.futures_contract}...")
-            
-            while True:
-                txs = self.arbiscan.get_transactions_to_contract(
-                    self.futures_contract,
-                    start_block=start_block,
-                    end_block=end_block,
-                    page=page,
-                    offset=MAX_OFFSET,
-                )
-                if not txs:
-                    break
-                all_txs.extend(txs)
-                if len(txs) < MAX_OFFSET:
-                    break
-                page += 1
-            
-            futures_txs = all_txs  # Already filtered to contract
-        else:
-            # Fetch transactions from specific wallet
-            if verbose:
-                print(f"\nFetching transactions for wallet {self.market_maker_wallet}...")
-            
-            while True:
-                txs = self.arbiscan.get_transactions(
-                    self.market_maker_wallet,
-                    start_block=start_block,
-                    end_block=end_block,
-                    page=page,
-                    offset=MAX_OFFSET,
-                )
-                if not txs:
-                    break
-                all_txs.extend(txs)
-                if len(txs) < MAX_OFFSET:
-                    break
-                page += 1
-
-            # Filter for transactions to the futures contract
-            futures_txs = [
-                tx for tx in all_txs if tx.get("to", "").lower() == self.futures_contract.lower()
+        # Get transaction receipt for detailed logs (margin moves only need the bulk transfers,
+        # and with the subgraph loaded nothing needs a receipt)
+        if receipt is None and self.subgraph_events is not None:
+            events = [
+                *self.token_transfers.get(tx.tx_hash, []),
+                *self.subgraph_events.get(tx.tx_hash, []),
+                *self.take_subgraph_closures(tx),
             ]
+            self.receipts_saved += 1
+        elif receipt is None and self.token_transfers is not None and method in TRANSFER_ONLY_METHODS:
+            events = self.token_transfers.get(tx.tx_hash, [])
+            self.receipts_saved += 1
+        else:
+            if receipt is None:
+                receipt = self.alchemy.get_transaction_receipt(tx_hash)
+                self.receipts_fetched += 1
+            events = self.decode_logs(receipt.get("logs", []))
 
-        # Filter out excluded wallet if specified
-        if self.exclude_wallet:
-            before_count = len(futures_txs)
-            futures_txs = [
-                tx for tx in futures_txs 
-                if tx.get("from", "").lower() != self.exclude_wallet.lower()
-            ]
-            if verbose:
-                excluded_count = before_count - len(futures_txs)
-                print(f"  Excluded {excluded_count} transactions from {self.exclude_wallet[:10]}...")
+        gas_used = tx.gas_used
+        gas_price = tx.gas_price
 
-        if verbose:
-            print(f"  Found {len(all_txs)} total transactions")
-            print(f"  {len(futures_txs)} transactions to futures contract")
-            if self.analyze_all_wallets:
-                unique_wallets = len(set(tx.get("from", "").lower() for tx in futures_txs))
-                print(f"  {unique_wallets} unique wallets")
-            print(f"\nAnalyzing transactions...")
+        # Get ETH price for USD conversion
+        eth_price_usd = self.get_eth_price_at_time(timestamp)
 
-        # Analyze each transaction
-        for i, tx in enumerate(futures_txs):
-            if verbose:
-                print(f"  [{i+1}/{len(futures_txs)}] {tx.get('hash', '')[:16]}...", end=" ")
+        if self.archive is not None:
+            block_number = _to_int(receipt.get("blockNumber", tx.block)) if receipt else tx.block
+            tx_index = _to_int(receipt.get("transactionIndex", tx.tx_index)) if receipt else tx.tx_index
+            sender = self.addresses.intern(wallet.lower()) if override_wallet else tx.sender
+            try:
+                self.archive.append(*encode_archive_records(
+                    block_number, timestamp, tx_index, tx_hash, sender, tx.to,
+                    tx.method_id, gas_used, gas_price, eth_price_usd, events,
+                ))
+            except ValueError as e:
+                print(f"  [Warning] Not archived: {e}")
 
-            analysis = self.analyze_transaction(tx)
-            if analysis:
-                results.append(analysis)
-                if verbose:
-                    print(f"✓ {analysis.method}: {analysis.action} | ${analysis.usdc_fees:.2f} fees")
-            else:
-                if verbose:
-                    print("✗ skipped (failed or non-relevant)")
+        return self.classify_transaction(
+            timestamp, tx_hash, wallet, method, gas_used, gas_price, eth_price_usd, events
+        )
 
-        return results
+    def load_token_transfers(self, start_block: int, end_block: int, verbose: bool = False):
+        """
+        Pull every token transfer from or to the futures contract in the block range
+        (wUSDC margin moves and futures-token order fees) and index them by tx hash.
 
+        Once loaded, addMargin / removeMargin are analyzed from these transfers
+        without a receipt; other methods still fetch receipts for order events.
+        """
+        if verbose:
+            print(f"Fetching token transfers (tokentx) for {self.futures_contract}...")
+        transfers: dict[bytes, list[DecodedEvent]] = {}
+        count = 0
+        for row in self.arbiscan.get_token_transfers(self.futures_contract, start_block, end_block):
+            events = transfers.setdefault(_ref_bytes(row.get("hash", "")), [])
+            events.append(DecodedEvent(
+                name="Transfer",
+                log_index=_to_int(row.get("logIndex") or len(events)),
+                address=(row.get("contractAddress") or "").lower(),
+                args={
+                    "from": (row.get("from") or "").lower(),
+                    "to": (row.get("to") or "").lower(),
+                    "value": int(row.get("value") or 0),
+                },
+            ))
+            count += 1
+        self.token_transfers = transfers
+        if verbose:
+            print(f"  {count} transfers in {len(transfers)} transactions")
 
-# ============================================================================
-# OUTPUT FUNCTIONS
-# ============================================================================
+    def load_subgraph_events(
+        self,
+        start_block: int,
+        end_block: int,
+        start_timestamp: int,
+        end_timestamp: int,
+        verbose: bool = False,
+    ):
+        """
+        Page the subgraph's orders and positions for the range and index them as
+        DecodedEvents by transaction hash, so classification needs no receipts.
 
+        Orders and positions carry their creating transaction. Closed orders
+        only carry closedAt / closedBy, so a closure is attributed to the
+        position that matched the order in the same block time, or else left
+        for take_subgraph_closures to place among the transactions its
+        participant sent at closedAt (if that participant is in scope).
+        Closures neither places are reported.
+        """
+        if verbose:
+            print(f"Fetching orders and positions from the subgraph ({self.subgraph.url})...")
+        contract = self.futures_contract.lower()
+        blocks = {"blockNumber_gte": str(start_block), "blockNumber_lte": str(end_block)}
+        events: dict[bytes, list[DecodedEvent]] = {}
+
+        def add(tx_hash: str, name: str, args: dict):
+            tx_events = events.setdefault(_ref_bytes(tx_hash), [])
+            tx_events.append(DecodedEvent(name, len(tx_events), contract, args))
+
+        orders = 0
+        for order in self.subgraph.iter_entities(
+            "orders", "Order_filter",
+            "id participant { id } pricePerDay deliveryAt isBuy transactionHash destURL", blocks,
+        ):
+            add(order["transactionHash"], "OrderCreated", {
+                "order_id": order["id"].lower(),
+                "participant": order["participant"]["id"].lower(),
+                "price_per_day": int(order["pricePerDay"]),
+                "delivery_at": int(order["deliveryAt"]),
+                "is_buy": bool(order["isBuy"]),
+                "dest_url": order["destURL"],
+            })
+            orders += 1
+
+        # orderId -> (tx hash, timestamp) of the position that matched it
+        matched: dict[str, tuple[str, int]] = {}
+        positions = 0
+        for position in self.subgraph.iter_entities(
+            "positions", "Position_filter",
+            "id seller { id } buyer { id } sellPricePerDay buyPricePerDay deliveryAt timestamp "
+            "transactionHash orderId destURL",
+            blocks,
+        ):
+            add(position["transactionHash"], "PositionCreated", {
+                "position_id": position["id"].lower(),
+                "seller": position["seller"]["id"].lower(),
+                "buyer": position["buyer"]["id"].lower(),
+                "sell_price_per_day": int(position["sellPricePerDay"]),
+                "buy_price_per_day": int(position["buyPricePerDay"]),
+                "delivery_at": int(position["deliveryAt"]),
+                "dest_url": position["destURL"],
+                "order_id": position["orderId"].lower(),
+            })
+            matched[position["orderId"].lower()] = (position["transactionHash"], int(position["timestamp"]))
+            positions += 1
+
+        closures: dict[tuple[bytes, int], list[tuple[tuple, DecodedEvent]]] = {}
+        # Only closures by wallets whose transactions are analyzed can be placed in one
+        wallet = None
+        if not self.analyze_all_wallets and self.market_maker_wallet:
+            wallet = self.addresses.intern(self.market_maker_wallet.lower())
+        closed = 0
+        for order in self.subgraph.iter_entities(
+            "orders", "Order_filter", "id participant { id } pricePerDay deliveryAt isBuy closedAt closedBy",
+            {"closedAt_gte": str(start_timestamp), "closedAt_lte": str(end_timestamp)},
+        ):
+            order_id = order["id"].lower()
+            closed_at = int(order["closedAt"])
+            closed_by = (order.get("closedBy") or order["participant"]["id"]).lower()
+            args = {"order_id": order_id, "participant": closed_by}
+            match = matched.get(order_id)
+            if match is not None and match[1] == closed_at:
+                add(match[0], "OrderClosed", args)
+            else:
+                closer = self.addresses.intern(closed_by)
+                if closer == self._excluded or (wallet is not None and closer != wallet):
+                    closed += 1
+                    continue
+                key = (closer, closed_at)
+                terms = (
+                    _ref_bytes(order_id), int(order["pricePerDay"]), int(order["deliveryAt"]), bool(order["isBuy"])
+                )
+                closures.setdefault(key, []).append((terms, DecodedEvent("OrderClosed", 0, contract, args)))
+            closed += 1
+
+        self.subgraph_events = events
+        self.subgraph_closures = closures
+        if verbose:
+            print(f"  {orders} orders created, {positions} positions, {closed} orders closed")
+
+    def take_subgraph_closures(self, tx: TxRecord) -> list[DecodedEvent]:
+        """
+        The subgraph closures left at (sender, timestamp) that this transaction's
+        calldata accounts for: orders it closes with closeOrder (by order ID)
+        and orders its createOrder offsets (opposite side at the same price and
+        delivery date). Anything else is left over and reported as unplaced.
+
+        A wallet can send several transactions within one second, so the
+        closures at its (sender, timestamp) are split by this evidence rather
+        than all handed to the first of them.
+        """
+        key = (tx.sender, tx.timestamp)
+        pending = self.subgraph_closures.get(key)
+        if not pending or not tx.order_calls:
+            return []
+        closed_ids = {call for call in tx.order_calls if isinstance(call, bytes)}
+        created = {call for call in tx.order_calls if isinstance(call, tuple)}
+
+        taken, kept = [], []
+        for terms, event in pending:
+            order_id, price, delivery_at, is_buy = terms
+            if order_id in closed_ids or (price, delivery_at, not is_buy) in created:
+                taken.append(event)
+            else:
+                kept.append((terms, event))
+        if kept:
+            self.subgraph_closures[key] = kept
+        else:
+            del self.subgraph_closures[key]
+        return taken
+
+    def load_event_sources(self, start_date: datetime, end_date: datetime, verbose: bool = False):
+        """Bulk-load the transfer / subgraph data that stands in for receipts."""
+        start_block, end_block = self.block_range
+        if self.transfer_source == "tokentx" or self.subgraph is not None:
+            self.load_token_transfers(start_block, end_block, verbose=verbose)
+        if self.subgraph is not None:
+            self.load_subgraph_events(
+                start_block, end_block, int(start_date.timestamp()), int(end_date.timestamp()), verbose=verbose
+            )
+
+    def analyze_journaled(self, tx: TxRecord) -> Optional[TransactionAnalysis]:
+        """
+        analyze_transaction through the run journal: transactions already in the
+        journal are replayed from it (no receipt fetch), new results are journaled.
+        """
+        if self.journal is None:
+            return self.analyze_transaction(tx)
+        key = f"{self._contract.hex()}:{tx.tx_hash.hex()}"
+        if key in self.journal:
+            fields = self.journal.get(key)
+            return TransactionAnalysis.from_journal(fields) if fields is not None else None
+        analysis = self.analyze_transaction(tx)
+        self.journal.record(key, analysis.to_journal() if analysis else None)
+        return analysis
+
+    def state_snapshots(
+        self,
+        hours: Iterable[datetime],
+        block_range: tuple[int, int],
+        wallets: list[str],
+    ) -> dict[datetime, StateSnapshot]:
+        """
+        Read futures contract state at the last block of each hour.
+
+        Each snapshot is a single Multicall3 aggregate3 eth_call (market price,
+        plus balanceOf / getMinMargin / getCollateralDeficit per wallet), and the
+        snapshots for all hours go out as JSON-RPC batches. Historical state is
+        immutable, so decoded snapshots are cached per block.
+        """
+        contract = self.futures_contract
+        wallets = [to_checksum_address(wallet) for wallet in wallets]
+        hours = sorted(hours)
+        hour_ends = {hour: int(hour.timestamp()) + 3599 for hour in hours}
+        blocks = self.alchemy.get_blocks_at_timestamps(hour_ends.values(), *block_range)
+
+        calls = [(contract, True, encode_call("getMarketPrice()"))]
+        for wallet in wallets:
+            calls.append((contract, True, encode_call("balanceOf(address)", wallet)))
+            calls.append((contract, True, encode_call("getMinMargin(address)", wallet)))
+            calls.append((contract, True, encode_call("getCollateralDeficit(address)", wallet)))
+        calldata = encode_aggregate3(calls)
+
+        def cache_key(block: int) -> str:
+            return f"{contract.lower()}:{block}:{','.join(w.lower() for w in wallets)}"
+
+        decoded: dict[int, dict] = {}
+        missing = []
+        for block in sorted(set(blocks.values())):
+            cached = self.cache.get("state", cache_key(block)) if self.cache is not None else None
+            if cached is not None:
+                decoded[block] = cached
+            else:
+                missing.append(block)
+
+        responses = self.alchemy.eth_call_batch([(MULTICALL3_ADDRESS, calldata, block) for block in missing])
+        for block, data in zip(missing, responses):
+            values = [
+                (decode_int(ret) if signed else decode_uint(ret)) if ok and len(ret) >= 32 else None
+                for (ok, ret), signed in zip(decode_aggregate3(data), [False] + [False, True, True] * len(wallets))
+            ]
+            decoded[block] = {"market_price": values[0], "wallets": values[1:]}
+            if self.cache is not None:
+                self.cache.put("state", cache_key(block), decoded[block], block=block)
+
+        def usd(value: Optional[int]) -> Optional[float]:
+            return value / 10**USDC_DECIMALS if value is not None else None
+
+        snapshots = {}
+        for hour in hours:
+            block = blocks[hour_ends[hour]]
+            raw = decoded[block]
+            snapshots[hour] = StateSnapshot(
+                block=block,
+                market_price=usd(raw["market_price"]),
+                wallets={
+                    wallet: WalletState(*(usd(value) for value in raw["wallets"][3 * i:3 * i + 3]))
+                    for i, wallet in enumerate(wallets)
+                },
+            )
+        return snapshots
+
+    def analyze_transaction_hashes(self, tx_hashes: list[str], verbose: bool = True) -> list[TransactionAnalysis]:
+        """
+        Analyze a list of transactions by hash.
+
+        Hashes are deduplicated, then transactions and receipts are fetched in
+        combined JSON-RPC batches, followed by one batch for the distinct blocks
+        they landed in (each block's timestamp is fetched once).
+        """
+        unique_hashes = list(dict.fromkeys(h.lower() for h in tx_hashes))
+        if verbose:
+            duplicates = len(tx_hashes) - len(unique_hashes)
+            print(f"Fetching {len(unique_hashes)} transactions and receipts in batches"
+                  + (f" ({duplicates} duplicates dropped)" if duplicates else "") + "...")
+
+        fetched = self.alchemy.get_transactions_bulk(unique_hashes)
+        blocks = self.alchemy.get_blocks_bulk(_to_int(tx["blockNumber"]) for tx, _ in fetched.values())
+        if verbose:
+            print(f"  {len(fetched)} found, {len(blocks)} distinct blocks")
+
+        rows = []
+        for tx_hash in unique_hashes:
+            if tx_hash not in fetched:
+                if verbose:
+                    print(f"  [Warning] Transaction {tx_hash} not found")
+                continue
+            tx_details, receipt = fetched[tx_hash]
+            block = blocks.get(_to_int(tx_details["blockNumber"]))
+            if block is None:
+                if verbose:
+                    print(f"  [Warning] Block for {tx_hash} not found")
+                continue
+            tx = TxRecord.from_txlist(txlist_row(tx_hash, tx_details, receipt, block), self.addresses)
+            rows.append((tx, receipt))
+
+        # Same ordering as a date-range run
+        rows.sort(key=lambda item: (item[0].block, item[0].tx_index))
+
+        results = []
+        for i, (tx, receipt) in enumerate(rows):
+            if verbose:
+                print(f"  [{i+1}/{len(rows)}] {tx.hash[:16]}...", end=" ")
+            analysis = self.analyze_transaction(tx, receipt=receipt)
+            if analysis:
+                results.append(analysis)
+                if verbose:
+                    print(f"✓ {analysis.method}: {analysis.action} | ${analysis.usdc_fees:.2f} fees")
+            elif verbose:
+                print("✗ skipped (failed or non-relevant)")
+        if self.archive is not None:
+            self.archive.flush()
+        return results
+
+    def analyze_archive(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        verbose: bool = True,
+    ) -> list[TransactionAnalysis]:
+        """
+        Re-analyze archived events for a date range without any network access.
+
+        Applies the same wallet selection as analyze_date_range, then runs the
+        current classification rules over the stored events.
+        """
+        if self.archive is None:
+            raise ValueError("No event archive configured")
+
+        contract = bytes.fromhex(self.futures_contract[2:])
+        wallet = bytes.fromhex(self.market_maker_wallet[2:]) if self.market_maker_wallet else None
+        excluded = bytes.fromhex(self.exclude_wallet[2:]) if self.exclude_wallet else None
+
+        if verbose:
+            stats = self.archive.stats()
+            print(f"Scanning event archive {self.archive.directory}...")
+            print(f"  {stats['segments']} segments, {stats['records']:,d} records ({stats['bytes'] / 1e6:,.1f} MB)")
+
+        # Bound the scan to the segments that can hold the date range
+        start_timestamp, end_timestamp = int(start_date.timestamp()), int(end_date.timestamp())
+        from_block, to_block = self.archive.block_bounds(start_timestamp, end_timestamp)
+
+        results = []
+        for header, records in self.archive.scan(from_block, to_block, start_timestamp, end_timestamp):
+            sender = header[event_archive.F_PARTICIPANT]
+            if header[event_archive.F_COUNTERPARTY] != contract:
+                continue
+            if header[event_archive.F_FLAGS] & event_archive.FLAG_FAILED:
+                continue
+            if not self.analyze_all_wallets and wallet is not None and sender != wallet:
+                continue
+            if excluded is not None and sender == excluded:
+                continue
+
+            fields = decode_archive_header(header)
+            results.append(self.classify_transaction(
+                fields["timestamp"],
+                fields["tx_hash"],
+                fields["wallet"],
+                method_name(fields["method_id"]),
+                fields["gas_used"],
+                fields["gas_price"],
+                fields["eth_price_usd"],
+                decode_archive_events(records),
+            ))
+
+        if verbose:
+            print(f"  {len(results)} transactions re-analyzed from archive")
+
+        return results
+
+    def resolve_block_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        verbose: bool = False,
+    ) -> tuple[int, int]:
+        """Resolve a date range into (start_block, end_block)."""
+        start_timestamp = int(start_date.timestamp())
+        end_timestamp = int(end_date.timestamp())
+
+        if verbose:
+            print(f"Fetching block numbers for date range...")
+            print(f"  Start: {start_date.isoformat()} (timestamp: {start_timestamp})")
+            print(f"  End: {end_date.isoformat()} (timestamp: {end_timestamp})")
+
+        start_block = self.arbiscan.get_block_by_timestamp(start_timestamp, "after")
+        if start_block == 0:
+            # Fallback to Alchemy
+            if verbose:
+                print("  Using Alchemy for block lookup (Arbiscan API unavailable)...")
+            start_block = self.alchemy.get_block_by_timestamp(start_timestamp, "after")
+        
+        end_block = self.arbiscan.get_block_by_timestamp(end_timestamp, "before")
+        if end_block == 0:
+            end_block = self.alchemy.get_block_by_timestamp(end_timestamp, "before")
+
+        if verbose:
+            print(f"  Block range: {start_block} - {end_block}")
+
+        return start_block, end_block
+
+    def iter_transactions(self, start_block: int, end_block: int) -> Iterator[TxRecord]:
+        """
+        Page through Arbiscan txlist for the configured mode.
+
+        All-wallets mode walks the contract's incoming transactions; otherwise the
+        market maker wallet's transactions are returned (not yet filtered to the
+        futures contract - see select_transactions). Each row is projected into
+        a TxRecord as its page arrives, so raw pages are dropped one at a time.
+        With tx_scan="bloom" the transactions come from scan_bloom_transactions.
+        """
+        if self.tx_scan == "bloom":
+            yield from self.scan_bloom_transactions(start_block, end_block)
+            return
+        addresses = self.addresses
+        # Subgraph closures are placed by the order calls in each transaction's calldata
+        order_calls = self.subgraph is not None
+        page = 1
+        while True:
+            if self.analyze_all_wallets:
+                txs = self.arbiscan.get_transactions_to_contract(
+                    self.futures_contract,
+                    start_block=start_block,
+                    end_block=end_block,
+                    page=page,
+                    offset=TXLIST_PAGE_SIZE,
+                )
+            else:
+                txs = self.arbiscan.get_transactions(
+                    self.market_maker_wallet,
+                    start_block=start_block,
+                    end_block=end_block,
+                    page=page,
+                    offset=TXLIST_PAGE_SIZE,
+                )
+            if not txs:
+                break
+            yield from (TxRecord.from_txlist(row, addresses, order_calls) for row in txs)
+            if len(txs) < TXLIST_PAGE_SIZE:
+                break
+            page += 1
+
+    def scan_bloom_transactions(self, start_block: int, end_block: int) -> Iterator[TxRecord]:
+        """
+        Find the range's futures transactions from block headers instead of txlist.
+
+        Each block's logsBloom is tested for the futures contract (as a log
+        address, or as an indexed address topic of a wUSDC transfer) together
+        with one of event_topics(). Only blocks that may match are fetched with
+        their transactions, and receipts only for transactions to the contract
+        from the wallets in scope; those receipts are kept for
+        analyze_transaction, so none is fetched twice. Transactions that emit
+        no logs never show up in a bloom. Counts are left in bloom_stats.
+        """
+        contract = bytes.fromhex(self.futures_contract[2:])
+        address_masks = (bloom_mask(contract), bloom_mask(contract.rjust(32, b"\x00")))
+        topic_masks = [bloom_mask(bytes.fromhex(topic[2:])) for topic in event_topics().values()]
+        self.bloom_stats = {"blocks": 0, "candidates": 0, "matched": 0}
+
+        candidates = []
+        for number, bloom in self.alchemy.iter_block_blooms(start_block, end_block):
+            self.bloom_stats["blocks"] += 1
+            if any(bloom_contains(bloom, mask) for mask in address_masks) and any(
+                bloom_contains(bloom, mask) for mask in topic_masks
+            ):
+                candidates.append(number)
+                if len(candidates) == RPC_BATCH_SIZE:
+                    yield from self._scan_candidate_blocks(candidates)
+                    candidates = []
+        if candidates:
+            yield from self._scan_candidate_blocks(candidates)
+
+    def _scan_candidate_blocks(self, numbers: list[int]) -> Iterator[TxRecord]:
+        """TxRecords (with prefetched receipts) for the in-scope futures transactions of bloom candidates."""
+        contract = self.futures_contract.lower()
+        wallet = self.market_maker_wallet.lower() if not self.analyze_all_wallets else None
+        excluded = self.exclude_wallet.lower() if self.exclude_wallet else None
+
+        selected = []
+        matched = set()
+        for block in self.alchemy.rpc_batch([("eth_getBlockByNumber", [hex(number), True]) for number in numbers]):
+            for tx in (block or {}).get("transactions", []):
+                sender = (tx.get("from") or "").lower()
+                if (tx.get("to") or "").lower() != contract or sender == excluded:
+                    continue
+                if wallet is not None and sender != wallet:
+                    continue
+                selected.append((block, tx))
+                matched.add(block["number"])
+        self.bloom_stats["candidates"] += len(numbers)
+        self.bloom_stats["matched"] += len(matched)
+
+        receipts = self.alchemy.rpc_batch([("eth_getTransactionReceipt", [tx["hash"]]) for _, tx in selected])
+        self.receipts_fetched += len(selected)
+        cache = self.alchemy.cache
+        for (block, tx), receipt in zip(selected, receipts):
+            if not receipt:
+                continue
+            if cache is not None:
+                cache.put("receipt", tx["hash"].lower(), receipt, block=_to_int(block["number"]))
+            record = TxRecord.from_txlist(
+                txlist_row(tx["hash"], tx, receipt, block), self.addresses, self.subgraph is not None
+            )
+            self.prefetched_receipts[record.tx_hash] = receipt
+            yield record
+
+    def select_transactions(
+        self,
+        txs: Iterable[TxRecord],
+        filters: Optional[Callable[[TxRecord], bool]] = None,
+    ) -> Iterator[TxRecord]:
+        """Keep transactions to the futures contract, minus the excluded wallet and anything `filters` rejects."""
+        contract = self._contract
+        excluded = self._excluded
+        for tx in txs:
+            if tx.to != contract:
+                continue
+            if excluded is not None and tx.sender == excluded:
+                continue
+            if filters is not None and not filters(tx):
+                self.filtered_out += 1
+                continue
+            yield tx
+
+    def iter_analyses(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        filters: Optional[Callable[[TxRecord], bool]] = None,
+        verbose: bool = False,
+        block_range: Optional[tuple[int, int]] = None,
+    ) -> Iterator[TransactionAnalysis]:
+        """
+        Lazily yield a TransactionAnalysis for every relevant transaction in a date range.
+
+        `filters` (see build_tx_filter) is an optional predicate over TxRecords,
+        evaluated before any receipt is fetched; `block_range` skips the block
+        lookup. Nothing is printed unless `verbose`, and nothing is written to
+        disk beyond the analyzer's journal and archive.
+        """
+        if block_range is None:
+            block_range = self.resolve_block_range(start_date, end_date, verbose=verbose)
+        self.block_range = block_range
+        start_block, end_block = block_range
+
+        if verbose:
+            if self.analyze_all_wallets:
+                print(f"\nFetching ALL transactions to contract {self.futures_contract}...")
+            else:
+                print(f"\nFetching transactions for wallet {self.market_maker_wallet}...")
+
+        # Progress output needs the counts up front; otherwise records stream through
+        all_txs = self.iter_transactions(start_block, end_block)
+        if verbose:
+            all_txs = list(all_txs)
+        txs = self.select_transactions(all_txs, filters)
+        if verbose:
+            txs = list(txs)
+        self.load_event_sources(start_date, end_date, verbose=verbose)
+
+        if verbose:
+            if self.exclude_wallet:
+                excluded_count = sum(1 for tx in all_txs if tx.to == self._contract and tx.sender == self._excluded)
+                print(f"  Excluded {excluded_count} transactions from {self.exclude_wallet[:10]}...")
+            if self.bloom_stats is not None:
+                stats = self.bloom_stats
+                hit_rate = stats["candidates"] / stats["blocks"] if stats["blocks"] else 0.0
+                print(
+                    f"  Bloom scan: {stats['blocks']:,d} blocks, {stats['candidates']:,d} may match "
+                    f"({hit_rate:.2%}), {stats['matched']:,d} with transactions in scope"
+                )
+            print(f"  Found {len(all_txs)} total transactions")
+            if filters is not None:
+                print(f"  {self.filtered_out} transactions filtered out before fetching receipts")
+            print(f"  {len(txs)} transactions to futures contract")
+            if self.analyze_all_wallets:
+                unique_wallets = len({tx.sender for tx in txs})
+                print(f"  {unique_wallets} unique wallets")
+
+        if self.sample is not None:
+            txs = self.sample.select(txs)
+            if verbose:
+                print(
+                    f"  Sampling {len(txs)} transactions from {len(self.sample.strata)} strata "
+                    f"(method x hour, rate {self.sample.rate:g})"
+                )
+
+        if verbose:
+            if self.journal is not None and len(self.journal):
+                print(f"  Resuming: {len(self.journal)} transactions already in journal {self.journal.path}")
+            print(f"\nAnalyzing transactions...")
+
+        try:
+            for i, tx in enumerate(txs):
+                if verbose:
+                    print(f"  [{i+1}/{len(txs)}] {tx.hash[:16]}...", end=" ")
+                analysis = self.analyze_journaled(tx)
+                if analysis:
+                    if self.sample is not None:
+                        analysis.weight = self.sample.weight(tx)
+                    if verbose:
+                        print(f"✓ {analysis.method}: {analysis.action} | ${analysis.usdc_fees:.2f} fees")
+                    yield analysis
+                elif verbose:
+                    print("✗ skipped (failed or non-relevant)")
+        finally:
+            # Receipts of transactions the filters or the sample left out (or that an
+            # abandoned iteration never reached)
+            self.prefetched_receipts.clear()
+            if self.archive is not None:
+                self.archive.flush()
+
+    def analyze_date_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        verbose: bool = True,
+        block_range: Optional[tuple[int, int]] = None,
+        filters: Optional[Callable[[TxRecord], bool]] = None,
+    ) -> list[TransactionAnalysis]:
+        """Analyze all transactions in a date range (iter_analyses, with progress and a receipt summary)."""
+        results = list(self.iter_analyses(start_date, end_date, filters, verbose=verbose, block_range=block_range))
+
+        if verbose and self.subgraph_events is not None:
+            print(f"  Receipts: {self.receipts_fetched} fetched, {self.receipts_saved} served from tokentx + subgraph")
+            unplaced = sum(len(closures) for closures in self.subgraph_closures.values())
+            if unplaced:
+                print(f"  [Warning] {unplaced} order closures could not be placed in a transaction")
+        elif verbose and self.token_transfers is not None:
+            print(f"  Receipts: {self.receipts_fetched} fetched, {self.receipts_saved} served from tokentx transfers")
+
+        return results
+
+
+def analyze_deployments(
+    analyzers: list[MarketMakerAnalyzer],
+    start_date: datetime,
+    end_date: datetime,
+    verbose: bool = True,
+    from_archive: bool = False,
+    filters: Optional[Callable[[TxRecord], bool]] = None,
+) -> list[TransactionAnalysis]:
+    """
+    Analyze several deployments concurrently over one date range.
+
+    The block range is resolved once and shared; analyzers should come from
+    MarketMakerAnalyzer.for_deployment so they also share clients and caches.
+    Results are merged in timestamp order.
+    """
+    block_range = None
+    if not from_archive:
+        block_range = analyzers[0].resolve_block_range(start_date, end_date, verbose=verbose)
+
+    def run(analyzer: MarketMakerAnalyzer) -> list[TransactionAnalysis]:
+        if from_archive:
+            return analyzer.analyze_archive(start_date, end_date, verbose=False)
+        return analyzer.analyze_date_range(
+            start_date, end_date, verbose=False, block_range=block_range, filters=filters
+        )
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=len(analyzers)) as pool:
+        per_deployment = list(pool.map(run, analyzers))
+
+    if verbose:
+        print()
+        for analyzer, results in zip(analyzers, per_deployment):
+            filtered = f", {analyzer.filtered_out} filtered out before receipts" if filters is not None else ""
+            print(f"  {analyzer.label}: {len(results)} transactions analyzed{filtered}")
+
+    return sorted((r for results in per_deployment for r in results), key=lambda r: r.timestamp)
+
+
+# ============================================================================
+# AGGREGATION
+# ============================================================================
+
+
+# Percentiles reported when quantile sketches are enabled
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Wallets tracked for the top-wallets breakdown when HyperLogLog counting is enabled
+TOP_WALLETS_CAPACITY = 200
+
+
+def _weight(r: TransactionAnalysis) -> Union[int, float]:
+    """Transactions a record stands for; counts stay ints unless the run was sampled."""
+    return 1 if r.weight == 1 else r.weight
+
+
+def _count(value: Union[int, float]) -> int:
+    """Whole-number output for counts that sampled runs estimate as floats."""
+    return value if isinstance(value, int) else round(value)
+
+
+def _tdigest() -> "TDigest":
+    # sketches is only needed with --quantiles / --hll
+    from sketches import TDigest
+
+    return TDigest()
+
+
+def _hyperloglog() -> "HyperLogLog":
+    from sketches import HyperLogLog
+
+    return HyperLogLog()
+
+
+@dataclass
+class CostSketches:
+    """Per-transaction cost distributions (gas USD, order fees, orders created)."""
+
+    gas_usd: "TDigest" = field(default_factory=_tdigest)
+    usdc_fees: "TDigest" = field(default_factory=_tdigest)
+    orders: "TDigest" = field(default_factory=_tdigest)
+
+    def add(self, r: TransactionAnalysis):
+        self.gas_usd.add(r.gas_fee_usd, r.weight)
+        self.usdc_fees.add(r.usdc_fees, r.weight)
+        self.orders.add(r.orders_created, r.weight)
+
+    def merge(self, other: "CostSketches"):
+        self.gas_usd.merge(other.gas_usd)
+        self.usdc_fees.merge(other.usdc_fees)
+        self.orders.merge(other.orders)
+
+    def percentiles(self, metric: str) -> list[Optional[float]]:
+        digest = getattr(self, metric)
+        return [digest.quantile(q) for q in QUANTILES]
+
+    def to_dict(self) -> dict:
+        return {
+            "gas_usd": self.gas_usd.to_dict(),
+            "usdc_fees": self.usdc_fees.to_dict(),
+            "orders": self.orders.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "CostSketches":
+        from sketches import TDigest
+
+        return cls(**{metric: TDigest.from_dict(state[metric]) for metric in ("gas_usd", "usdc_fees", "orders")})
+
+
+# Trailing windows: (label, slots, slot width in seconds). 1h rolls over minutes, the rest over hours.
+ROLLING_WINDOWS = (("1h", 60, 60), ("24h", 24, 3600), ("7d", 168, 3600))
+
+# Per-transaction values summed in each trailing window
+ROLLING_METRICS = ("transactions", "gas_usd", "usdc_fees", "orders_created", "trades", "trade_gas_usd")
+
+
+class RollingWindow:
+    """
+    Trailing sums over a ring buffer of fixed-width time slots.
+
+    Adding a value and moving the window forward are O(1) per slot: the sums
+    are kept running, and a slot is subtracted when the window leaves it.
+    Values older than the window are dropped. The first slot it is moved to
+    marks where the data starts: until the window spans that far it is partial.
+    """
+
+    __slots__ = ("slots", "slot_seconds", "_ring", "_sums", "_head", "_first")
+
+    def __init__(self, slots: int, slot_seconds: int, width: int):
+        self.slots = slots
+        self.slot_seconds = slot_seconds
+        self._ring = [[0.0] * width for _ in range(slots)]
+        self._sums = [0.0] * width
+        self._head: Optional[int] = None  # Absolute index of the newest slot
+        self._first: Optional[int] = None  # Absolute index of the first slot with data behind it
+
+    def advance(self, timestamp: int):
+        """Move the window's end to the slot holding `timestamp` (never backwards)."""
+        slot = timestamp // self.slot_seconds
+        if self._head is None:
+            self._head = self._first = slot
+            return
+        if slot <= self._head:
+            return
+        # Slots the window leaves are reused for the new ones; a gap longer than the window clears them all
+        for expired in range(self._head + 1, min(slot, self._head + self.slots) + 1):
+            values = self._ring[expired % self.slots]
+            for i, value in enumerate(values):
+                if value:
+                    self._sums[i] -= value
+                    values[i] = 0.0
+        self._head = slot
+
+    def add(self, timestamp: int, values: tuple[float, ...]):
+        self.advance(timestamp)
+        slot = timestamp // self.slot_seconds
+        if self._head - slot >= self.slots:
+            return
+        bucket = self._ring[slot % self.slots]
+        for i, value in enumerate(values):
+            bucket[i] += value
+            self._sums[i] += value
+
+    def sums(self) -> list[float]:
+        # Running subtraction can leave float dust where a window emptied
+        return [value if abs(value) > 1e-9 else 0.0 for value in self._sums]
 
-def write_csv(results: list[TransactionAnalysis], output_file: str):
-    """Write results to CSV file."""
+    @property
+    def partial(self) -> bool:
+        """True while the window reaches back before the first slot it saw."""
+        return self._head is None or self._head - self._first + 1 < self.slots
+
+
+class RollingMetrics:
+    """
+    Trailing 1h / 24h / 7d totals (ROLLING_METRICS), updated per transaction.
+
+    Library use: add() analyses in time order (e.g. from iter_analyses) and
+    read snapshot() whenever needed - after advance() to report a window
+    ending at a later time with no new transactions.
+
+    Windows hold only what was added, so until a window spans back to `start`
+    (where the data begins; default the first analysis) it is partial(). To
+    report full windows from the first hour, add() up to 7 days of analyses
+    before the reporting range first.
+    """
+
+    def __init__(
+        self, windows: tuple[tuple[str, int, int], ...] = ROLLING_WINDOWS, start: Optional[datetime] = None
+    ):
+        self.windows = {
+            label: RollingWindow(slots, slot_seconds, len(ROLLING_METRICS))
+            for label, slots, slot_seconds in windows
+        }
+        if start is not None:
+            self.advance(start)
+
+    def add(self, r: TransactionAnalysis):
+        n = _weight(r)
+        trade = n if r.method == "multicall" else 0
+        values = (n, r.gas_fee_usd * n, r.usdc_fees * n, r.orders_created * n, trade, r.gas_fee_usd * trade)
+        timestamp = int(r.timestamp.timestamp())
+        for window in self.windows.values():
+            window.add(timestamp, values)
+
+    def advance(self, when: datetime):
+        timestamp = int(when.timestamp())
+        for window in self.windows.values():
+            window.advance(timestamp)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        """Window label -> metric -> trailing total."""
+        return {label: dict(zip(ROLLING_METRICS, window.sums())) for label, window in self.windows.items()}
+
+    def partial(self) -> tuple[str, ...]:
+        """Labels of the windows that still reach back before the data starts."""
+        return tuple(label for label, window in self.windows.items() if window.partial)
+
+
+@dataclass
+class AggregateBucket:
+    """Running totals for a set of transactions (one hour, or a whole run)."""
+
+    start: Optional[datetime] = None  # Start of the hour (None for run totals)
+    transactions: int = 0
+    unique_wallets: Union[set, "HyperLogLog"] = field(default_factory=set)
+    usdc_deposits: float = 0.0
+    usdc_withdrawals: float = 0.0
+    usdc_fees: float = 0.0
+    gas_eth: float = 0.0
+    gas_usd: float = 0.0
+    orders_created: int = 0
+    buy_orders: int = 0
+    sell_orders: int = 0
+    orders_closed: int = 0
+    multicalls: int = 0
+    add_margins: int = 0
+    remove_margins: int = 0
+    create_orders: int = 0
+    sketches: Optional[CostSketches] = None  # Set when quantile sketches are enabled
+    rolling: Optional[dict[str, dict[str, float]]] = None  # Trailing windows at the end of the hour
+    rolling_partial: tuple[str, ...] = ()  # Those of them that reach back before the data starts
+
+    def add(self, r: TransactionAnalysis):
+        n = _weight(r)
+        self.transactions += n
+        self.unique_wallets.add(r.wallet)
+        self.usdc_deposits += r.usdc_deposit * n
+        self.usdc_withdrawals += r.usdc_withdrawal * n
+        self.usdc_fees += r.usdc_fees * n
+        self.gas_eth += r.gas_fee_eth * n
+        self.gas_usd += r.gas_fee_usd * n
+        self.orders_created += r.orders_created * n
+        self.buy_orders += r.buy_orders * n
+        self.sell_orders += r.sell_orders * n
+        self.orders_closed += r.orders_closed * n
+        # Count by method type
+        if r.method == "multicall":
+            self.multicalls += n
+        elif r.method == "addMargin":
+            self.add_margins += n
+        elif r.method == "removeMargin":
+            self.remove_margins += n
+        elif r.method == "createOrder":
+            self.create_orders += n
+        if self.sketches is not None:
+            self.sketches.add(r)
+
+
+@dataclass
+class MethodStats:
+    """Per-method transaction count and costs."""
+
+    count: int = 0
+    gas_usd: float = 0.0
+    usdc_fees: float = 0.0
+
+
+@dataclass
+class WalletStats:
+    """Per-wallet activity (used for the top-wallets breakdown)."""
+
+    txs: int = 0
+    gas: float = 0.0
+    orders: int = 0
+    deposits: float = 0.0
+
+
+@dataclass
+class CohortRow:
+    """Orders, fills and the costs they absorbed for one delivery date and price."""
+
+    delivery_date: datetime
+    price_per_day: float  # USD
+    orders: float  # Orders created (resting on the book)
+    fills: float  # Positions created by matching an order
+    usdc_fees: float
+    gas_usd: float
+
+
+class CohortColumns:
+    """
+    Orders and fills by delivery date and price tick, kept as compact typed
+    columns while records are aggregated and grouped once at the end.
+
+    A transaction's order fees and gas are split over the orders and fills it
+    produced by their share of the fees paid: each createOrder call pays one
+    fee after its orders and fills, which split it evenly (with no fees paid,
+    the whole transaction is split evenly). Transactions without orders or
+    fills (margin moves, closes) are not part of any cohort.
+    """
+
+    def __init__(self):
+        from array import array
+
+        self.delivery_at = array("q")
+        self.price = array("q")
+        self.filled = array("b")
+        self.weight = array("d")
+        self.usdc_fees = array("d")
+        self.gas_usd = array("d")
+
+    def add(self, r: TransactionAnalysis):
+        if not r.cohorts:
+            return
+        for delivery_at, price, filled, share in r.cohorts:
+            self.delivery_at.append(delivery_at)
+            self.price.append(price)
+            self.filled.append(filled)
+            self.weight.append(r.weight)
+            self.usdc_fees.append(r.usdc_fees * share * r.weight)
+            self.gas_usd.append(r.gas_fee_usd * share * r.weight)
+
+    def table(self) -> list[CohortRow]:
+        """One row per (delivery date, price), by date then price (np.unique + weighted bincount)."""
+        # numpy is only needed for cohort tables
+        import numpy as np
+
+        if not self.price:
+            return []
+        day = np.frombuffer(self.delivery_at, dtype=np.int64) // 86400
+        price = np.frombuffer(self.price, dtype=np.int64)
+        keys, group = np.unique(np.column_stack([day, price]), axis=0, return_inverse=True)
+        group = group.reshape(-1)
+        weight = np.frombuffer(self.weight, dtype=np.float64)
+        filled = np.frombuffer(self.filled, dtype=np.int8).astype(bool)
+
+        def total(values):
+            return np.bincount(group, weights=values, minlength=len(keys)).tolist()
+
+        columns = zip(
+            total(weight * ~filled),
+            total(weight * filled),
+            total(np.frombuffer(self.usdc_fees, dtype=np.float64)),
+            total(np.frombuffer(self.gas_usd, dtype=np.float64)),
+        )
+        return [
+            CohortRow(
+                delivery_date=datetime.fromtimestamp(int(day_key) * 86400, tz=timezone.utc),
+                price_per_day=int(price_key) / 10**USDC_DECIMALS,
+                orders=orders,
+                fills=fills,
+                usdc_fees=fees,
+                gas_usd=gas,
+            )
+            for (day_key, price_key), (orders, fills, fees, gas) in zip(keys.tolist(), columns)
+        ]
+
+
+class Aggregator:
+    """
+    Incremental aggregation of TransactionAnalysis records.
+
+    Keeps run totals, per-method and per-wallet stats and hourly buckets. When a
+    date range is given every hour in it gets a bucket up front (no gaps in
+    time-series output) and records outside the range are left out of the
+    hourly view.
+
+    With `quantiles` the run totals, every hour and every method also keep
+    t-digest sketches of per-transaction costs, which stay bounded in size and
+    can be saved and merged across runs (sketch_state / merge_sketch_state).
+
+    With `hll` unique wallets are counted in HyperLogLog registers instead of
+    sets, and the per-wallet stats keep only the heaviest TOP_WALLETS_CAPACITY
+    wallets (space-saving: an evicted wallet's transaction count is inherited
+    by its replacement, so counts are upper bounds).
+
+    With `rolling` every hourly bucket also gets the trailing 1h / 24h / 7d
+    totals at the end of its hour (RollingMetrics, fed as records arrive, so
+    records must come in time order across hours; an analysis for an hour
+    already snapshotted raises ValueError). Windows start empty at start_date
+    (or the first analysis), and hours whose windows reach back before it
+    list them in rolling_partial.
+
+    With `cohorts` orders, fills and their costs are collected by delivery
+    date and price tick (CohortColumns; see cohort_table).
+    """
+
+    def __init__(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        quantiles: bool = False,
+        hll: bool = False,
+        rolling: bool = False,
+        cohorts: bool = False,
+    ):
+        self.quantiles = quantiles
+        self.hll = hll
+        self.rolling = RollingMetrics(start=start_date) if rolling else None
+        self.cohorts = CohortColumns() if cohorts else None
+        self._rolled_through: Optional[datetime] = None  # Last hour whose windows are snapshotted
+        self.totals = self._bucket()
+        self.method_sketches: dict[str, CostSketches] = {}
+        self.methods: dict[str, MethodStats] = {}
+        self.wallets: dict[str, WalletStats] = {}
+        self.hours: dict[datetime, AggregateBucket] = {}
+        self.fixed_range = start_date is not None and end_date is not None
+
+        if self.fixed_range:
+            current_hour = start_date.replace(minute=0, second=0, microsecond=0)
+            end_hour = end_date.replace(minute=0, second=0, microsecond=0)
+            while current_hour <= end_hour:
+                self.hours[current_hour] = self._bucket(current_hour)
+                current_hour += timedelta(hours=1)
+
+    def _bucket(self, start: Optional[datetime] = None) -> AggregateBucket:
+        return AggregateBucket(
+            start=start,
+            unique_wallets=_hyperloglog() if self.hll else set(),
+            sketches=CostSketches() if self.quantiles else None,
+        )
+
+    def _wallet_stats(self, wallet: str) -> WalletStats:
+        stats = self.wallets.get(wallet)
+        if stats is None:
+            stats = WalletStats()
+            if self.hll and len(self.wallets) >= TOP_WALLETS_CAPACITY:
+                evicted = min(self.wallets, key=lambda w: self.wallets[w].txs)
+                stats.txs = self.wallets.pop(evicted).txs
+            self.wallets[wallet] = stats
+        return stats
+
+    def _roll_to(self, hour: datetime):
+        """Snapshot the trailing windows of every bucket before `hour`."""
+        if self._rolled_through is None:
+            self._rolled_through = min(self.hours, default=hour) - timedelta(hours=1)
+        current = self._rolled_through + timedelta(hours=1)
+        while current < hour:
+            bucket = self.hours.get(current)
+            if bucket is not None:
+                self.rolling.advance(current + timedelta(hours=1, seconds=-1))
+                bucket.rolling = self.rolling.snapshot()
+                bucket.rolling_partial = self.rolling.partial()
+            self._rolled_through = current
+            current += timedelta(hours=1)
+
+    def add(self, r: TransactionAnalysis):
+        hour = r.timestamp.replace(minute=0, second=0, microsecond=0)
+        if self.rolling is not None:
+            if self._rolled_through is not None and hour <= self._rolled_through:
+                raise ValueError(
+                    f"Rolling windows need analyses in time order: {r.tx_hash} at {r.timestamp:%Y-%m-%d %H:%M} "
+                    f"is in an hour already reported"
+                )
+            self._roll_to(hour)
+            self.rolling.add(r)
+        self.totals.add(r)
+        if self.quantiles:
+            self.method_sketches.setdefault(r.method, CostSketches()).add(r)
+        if self.cohorts is not None:
+            self.cohorts.add(r)
+
+        n = _weight(r)
+        method = self.methods.setdefault(r.method, MethodStats())
+        method.count += n
+        method.gas_usd += r.gas_fee_usd * n
+        method.usdc_fees += r.usdc_fees * n
+
+        wallet = self._wallet_stats(r.wallet)
+        wallet.txs += n
+        wallet.gas += r.gas_fee_usd * n
+        wallet.orders += r.orders_created * n
+        wallet.deposits += r.usdc_deposit * n
+
+        bucket = self.hours.get(hour)
+        if bucket is None:
+            if self.fixed_range:
+                return
+            bucket = self.hours[hour] = self._bucket(hour)
+        bucket.add(r)
+
+    def cohort_table(self) -> list[CohortRow]:
+        """Delivery-date / price cohorts of the run (empty unless aggregated with `cohorts`)."""
+        return self.cohorts.table() if self.cohorts is not None else []
+
+    def hourly(self) -> list[AggregateBucket]:
+        """Hourly buckets in chronological order."""
+        if self.rolling is not None and self.hours:
+            self._roll_to(max(self.hours) + timedelta(hours=1))
+        return [self.hours[hour] for hour in sorted(self.hours)]
+
+    def unique_wallets(self, period: str = "day") -> dict[datetime, Union[set, "HyperLogLog"]]:
+        """Unique wallets per 'day' or 'week' (starting Monday), merged from the hourly buckets."""
+        rollup: dict[datetime, Union[set, "HyperLogLog"]] = {}
+        for hour in sorted(self.hours):
+            start = hour.replace(hour=0)
+            if period == "week":
+                start -= timedelta(days=start.weekday())
+            wallets = self.hours[hour].unique_wallets
+            if start not in rollup:
+                rollup[start] = _hyperloglog() if self.hll else set()
+            if self.hll:
+                rollup[start].merge(wallets)
+            else:
+                rollup[start] |= wallets
+        return rollup
+
+    def sketch_state(self) -> dict:
+        """JSON-serializable sketches (quantiles and/or HyperLogLog) for the run, methods and hours."""
+        state = {"version": 1}
+        if self.quantiles:
+            state["totals"] = self.totals.sketches.to_dict()
+            state["methods"] = {method: sketches.to_dict() for method, sketches in self.method_sketches.items()}
+            state["hours"] = {
+                hour.strftime("%Y-%m-%dT%H"): bucket.sketches.to_dict()
+                for hour, bucket in self.hours.items()
+                if bucket.sketches.gas_usd.count
+            }
+        if self.hll:
+            state["wallets"] = self.totals.unique_wallets.to_dict()
+            state["wallet_hours"] = {
+                hour.strftime("%Y-%m-%dT%H"): bucket.unique_wallets.to_dict()
+                for hour, bucket in self.hours.items()
+                if bucket.transactions
+            }
+        return state
+
+    def _merge_hour(self, key: str) -> Optional[AggregateBucket]:
+        hour = datetime.strptime(key, "%Y-%m-%dT%H").replace(tzinfo=timezone.utc)
+        bucket = self.hours.get(hour)
+        if bucket is None and not self.fixed_range:
+            bucket = self.hours[hour] = self._bucket(hour)
+        return bucket
+
+    def merge_sketch_state(self, state: dict):
+        """
+        Merge sketches saved by another run (or shard) into this aggregator.
+
+        Only percentiles and unique-wallet counts change - counters and sums
+        stay those of this run. Sketch kinds this aggregator does not keep, and
+        hours outside a fixed date range, are ignored.
+        """
+        if self.quantiles and "totals" in state:
+            self.totals.sketches.merge(CostSketches.from_dict(state["totals"]))
+            for method, sketches in state.get("methods", {}).items():
+                self.method_sketches.setdefault(method, CostSketches()).merge(CostSketches.from_dict(sketches))
+            for key, sketches in state.get("hours", {}).items():
+                bucket = self._merge_hour(key)
+                if bucket is not None:
+                    bucket.sketches.merge(CostSketches.from_dict(sketches))
+        if self.hll and "wallets" in state:
+            from sketches import HyperLogLog
+
+            self.totals.unique_wallets.merge(HyperLogLog.from_dict(state["wallets"]))
+            for key, registers in state.get("wallet_hours", {}).items():
+                bucket = self._merge_hour(key)
+                if bucket is not None:
+                    bucket.unique_wallets.merge(HyperLogLog.from_dict(registers))
+
+
+def aggregate(
+    analyses: Iterable[TransactionAnalysis],
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    quantiles: bool = False,
+    hll: bool = False,
+    rolling: bool = False,
+    cohorts: bool = False,
+) -> Aggregator:
+    """
+    Consume analyses (a list or a lazy iterator) into an Aggregator. With
+    `rolling` a list is put in time order first (merged deployments, --tx-file
+    order); an iterator must already be in order.
+    """
+    if rolling and isinstance(analyses, list):
+        analyses = sorted(analyses, key=lambda r: r.timestamp)
+    aggregator = Aggregator(start_date, end_date, quantiles=quantiles, hll=hll, rolling=rolling, cohorts=cohorts)
+    for r in analyses:
+        aggregator.add(r)
+    return aggregator
+
+
+# ============================================================================
+# GAS ATTRIBUTION
+# ============================================================================
+
+
+MULTICALL_SELECTOR = int(METHOD_IDS["multicall"], 16)
+
+# Names for traced subcalls: every function in the ABIs plus METHOD_NAMES (built on
+# first use - hashing every ABI signature would slow down startup)
+_subcall_names: Optional[dict[int, str]] = None
+
+# Subcall label for the gas a multicall uses outside its subcalls: intrinsic and
+# calldata gas, the multicall loop and proxy hop, and any L1 component in gasUsed
+OVERHEAD_SUBCALL = "(overhead)"
+
+
+@dataclass
+class SubcallGas:
+    """Gas used by one decoded multicall subcall (from its callTracer frame)."""
+
+    method: str
+    gas_used: int
+    positions: int = 0  # PositionCreated events inside the subcall (orders it matched)
+
+
+@dataclass
+class SubcallStats:
+    """Calls, gas and positions created for one subcall type."""
+
+    count: int = 0
+    gas_used: int = 0
+    gas_usd: float = 0.0
+    positions: int = 0
+
+
+def subcall_name(frame: dict) -> str:
+    """Function name of a call frame's input (the 0x selector if no ABI has it)."""
+    global _subcall_names
+    if _subcall_names is None:
+        _subcall_names = {**load_function_names(DEFAULT_CONFIG["FUTURES_ABI_DIR"] or None), **METHOD_NAMES}
+    selector = _method_id(frame.get("input") or "0x")
+    return _subcall_names.get(selector, f"0x{selector:08x}")
+
+
+def _positions_created(frame: dict) -> int:
+    """PositionCreated logs emitted in a frame and the frames below it."""
+    topic = event_topics()["PositionCreated"]
+    own = sum(1 for log in frame.get("logs") or [] if (log.get("topics") or [""])[0].lower() == topic)
+    return own + sum(_positions_created(call) for call in frame.get("calls") or [])
+
+
+def attribute_trace(trace: dict) -> list[SubcallGas]:
+    """
+    Split a transaction's callTracer trace into gas per decoded subcall.
+
+    Proxy hops (frames that forward their exact input to one inner frame) are
+    followed down to the multicall, whose direct calls are its subcalls; each
+    subcall's gasUsed includes its own proxy hop. Whatever the transaction used
+    outside them is returned as OVERHEAD_SUBCALL, so the parts add up to the
+    trace's gasUsed. A trace that is not a multicall is a single subcall.
+    """
+    total = _to_int(trace.get("gasUsed") or 0)
+    frame = trace
+    while len(frame.get("calls") or []) == 1 and frame["calls"][0].get("input") == frame.get("input"):
+        frame = frame["calls"][0]
+    if _method_id(frame.get("input") or "0x") != MULTICALL_SELECTOR:
+        return [SubcallGas(subcall_name(frame), total, _positions_created(frame))]
+
+    subcalls = [
+        SubcallGas(subcall_name(call), _to_int(call.get("gasUsed") or 0), _positions_created(call))
+        for call in frame.get("calls") or []
+    ]
+    subcalls.append(SubcallGas(OVERHEAD_SUBCALL, max(total - sum(s.gas_used for s in subcalls), 0)))
+    return subcalls
+
+
+class GasAttribution:
+    """
+    Gas of traced multicalls by subcall type, and by subcall type split by
+    whether the subcall matched an order (created a position).
+
+    USD is each transaction's gas fee split in proportion to gas used, so a
+    transaction's subcalls and overhead add up to its Gas Fee (USD).
+    """
+
+    def __init__(self):
+        self.subcalls: dict[str, SubcallStats] = {}
+        self.matched: dict[tuple[str, bool], SubcallStats] = {}  # (method, created a position)
+        self.transactions = 0
+        self.untraced = 0  # Multicalls without a trace
+
+    def add(self, r: TransactionAnalysis, subcalls: list[SubcallGas]):
+        n = _weight(r)
+        total = sum(s.gas_used for s in subcalls)
+        usd_per_gas = r.gas_fee_usd / total if total else 0.0
+        self.transactions += n
+        for s in subcalls:
+            views = [self.subcalls.setdefault(s.method, SubcallStats())]
+            if s.method != OVERHEAD_SUBCALL:
+                views.append(self.matched.setdefault((s.method, s.positions > 0), SubcallStats()))
+            for stats in views:
+                stats.count += n
+                stats.gas_used += s.gas_used * n
+                stats.gas_usd += s.gas_used * usd_per_gas * n
+                stats.positions += s.positions * n
+
+    @property
+    def gas_used(self) -> int:
+        return sum(stats.gas_used for stats in self.subcalls.values())
+
+
+def read_recorded_traces(path: str) -> dict[str, dict]:
+    """Recorded traces from a JSON Lines file of {"hash": ..., "trace": ...} (missing file: none)."""
+    traces: dict[str, dict] = {}
+    if not os.path.exists(path):
+        return traces
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                traces[entry["hash"].lower()] = entry["trace"]
+    return traces
+
+
+def trace_gas(
+    results: list[TransactionAnalysis],
+    tracer: Optional[AlchemyClient] = None,
+    traces_path: Optional[str] = None,
+    verbose: bool = True,
+) -> GasAttribution:
+    """
+    Attribute the gas of every multicall in `results` to its subcalls.
+
+    Traces come from `traces_path` (recorded traces) first, then from the
+    tracer node's debug_traceTransaction in batches; newly fetched traces
+    are appended to `traces_path`, so a run can be replayed offline.
+    """
+    multicalls = [r for r in results if r.method == "multicall"]
+    traces = read_recorded_traces(traces_path) if traces_path else {}
+    missing = [r.tx_hash.lower() for r in multicalls if r.tx_hash.lower() not in traces]
+    if verbose:
+        print(f"\nTracing {len(multicalls)} multicalls ({len(multicalls) - len(missing)} recorded)...")
+
+    if missing and tracer is not None:
+        fetched = tracer.trace_transactions(missing)
+        traces.update(fetched)
+        if traces_path and fetched:
+            with open(traces_path, "a") as f:
+                for tx_hash, trace in fetched.items():
+                    f.write(json.dumps({"hash": tx_hash, "trace": trace}, separators=(",", ":")) + "\n")
+
+    attribution = GasAttribution()
+    for r in multicalls:
+        trace = traces.get(r.tx_hash.lower())
+        if trace is None:
+            attribution.untraced += _weight(r)
+            continue
+        attribution.add(r, attribute_trace(trace))
+    if verbose and attribution.untraced:
+        print(f"  [Warning] {_count(attribution.untraced)} multicalls have no trace and are left out")
+    return attribution
+
+
+# ============================================================================
+# BATCH EFFICIENCY
+# ============================================================================
+
+
+# Multicalls a batch size needs before its observed cost per order is reported as the best
+BATCH_CURVE_MIN_TXS = 5
+
+
+@dataclass
+class BatchCurve:
+    """
+    Multicall cost by batch size n (orders created + closed in the multicall).
+
+    Gas and order fees per multicall are each fitted as
+    fixed + per_created * created + per_closed * closed + growth * n^2, so
+    fees can follow createOrder alone while gas may grow faster than
+    linearly with the batch. Curves over n use the run's created share.
+    """
+
+    sizes: list[int]
+    txs: list[float]  # Multicalls per batch size
+    gas_usd: list[float]  # Mean gas USD per multicall
+    usdc_fees: list[float]  # Mean order fees per multicall
+    gas_fit: tuple[float, float, float, float]  # (fixed, per_created, per_closed, growth) in USD
+    fee_fit: tuple[float, float, float, float]
+    created_share: float  # Created orders / all orders in the batched multicalls
+    unbatched: float = 0.0  # Multicalls without orders (left out of the curve)
+
+    def _per_order(self, fit: tuple[float, float, float, float]) -> float:
+        return fit[1] * self.created_share + fit[2] * (1 - self.created_share)
+
+    def fitted(self, n: float) -> tuple[float, float]:
+        """Fitted (gas, fees) per multicall of n orders."""
+        return tuple(fit[0] + self._per_order(fit) * n + fit[3] * n * n for fit in (self.gas_fit, self.fee_fit))
+
+    def marginal(self, n: float) -> tuple[float, float]:
+        """Fitted (gas, fees) of one more order in a multicall of n orders."""
+        return tuple(self._per_order(fit) + fit[3] * (2 * n + 1) for fit in (self.gas_fit, self.fee_fit))
+
+    def best_size(self) -> int:
+        """Batch size in the observed range with the lowest fitted cost per order."""
+        return min(range(self.sizes[0], self.sizes[-1] + 1), key=lambda n: sum(self.fitted(n)) / n)
+
+    def observed_best(self) -> Optional[int]:
+        """Observed batch size (with at least BATCH_CURVE_MIN_TXS multicalls) with the lowest mean cost per order."""
+        candidates = [i for i, txs in enumerate(self.txs) if txs >= BATCH_CURVE_MIN_TXS]
+        if not candidates:
+            return None
+        best = min(candidates, key=lambda i: (self.gas_usd[i] + self.usdc_fees[i]) / self.sizes[i])
+        return self.sizes[best]
+
+
+def batch_curve(results: Iterable[TransactionAnalysis]) -> Optional[BatchCurve]:
+    """
+    Group multicalls by batch size and fit their gas and fee cost per multicall.
+
+    The group-by (np.unique + weighted bincount) and the weighted least-squares
+    fits run over column arrays of the results; sampled runs are weighted by
+    their sample weights. The per-order terms need two distinct batch sizes
+    and the growth term three; with fewer they are fixed at zero. Returns
+    None without multicalls that created or closed orders.
+    """
+    # numpy is only needed for batch curves
+    import numpy as np
+
+    multicalls = [r for r in results if r.method == "multicall"]
+    created = np.array([r.orders_created for r in multicalls], dtype=float)
+    closed = np.array([r.orders_closed for r in multicalls], dtype=float)
+    weight = np.array([r.weight for r in multicalls], dtype=float)
+    gas = np.array([r.gas_fee_usd for r in multicalls], dtype=float)
+    fees = np.array([r.usdc_fees for r in multicalls], dtype=float)
+    size = created + closed
+
+    batched = size > 0
+    unbatched = float(weight[~batched].sum())
+    created, closed, size, weight, gas, fees = (
+        column[batched] for column in (created, closed, size, weight, gas, fees)
+    )
+    if not size.size:
+        return None
+
+    sizes, group = np.unique(size.astype(np.int64), return_inverse=True)
+    txs = np.bincount(group, weights=weight)
+    mean_gas = np.bincount(group, weights=weight * gas) / txs
+    mean_fees = np.bincount(group, weights=weight * fees) / txs
+
+    terms = np.column_stack([np.ones_like(size), created, closed, size * size])
+    used = [True, len(sizes) > 1, len(sizes) > 1, len(sizes) > 2]
+    scale = np.sqrt(weight)
+    design = terms[:, used] * scale[:, None]
+
+    def fit(values) -> tuple[float, float, float, float]:
+        coefficients = iter(np.linalg.lstsq(design, values * scale, rcond=None)[0])
+        # Rounded so that exact zeros (fees of closeOrder) don't print as -0.0000
+        return tuple(round(float(next(coefficients)), 12) + 0.0 if use else 0.0 for use in used)
+
+    return BatchCurve(
+        sizes=sizes.tolist(),
+        txs=txs.tolist(),
+        gas_usd=mean_gas.tolist(),
+        usdc_fees=mean_fees.tolist(),
+        gas_fit=fit(gas),
+        fee_fit=fit(fees),
+        created_share=float((weight * created).sum() / (weight * size).sum()),
+        unbatched=unbatched,
+    )
+
+
+# ============================================================================
+# OUTPUT FUNCTIONS
+# ============================================================================
+
+
+def write_csv(
+    results: Iterable[TransactionAnalysis],
+    output_file: str,
+    include_contract: bool = False,
+    include_weight: bool = False,
+):
+    """Write results to CSV file (with a Contract column when several deployments are analyzed,
+    and a Sample Weight column for sampled runs)."""
     with open(output_file, "w", newline="") as f:
         writer = csv.writer(f)
 
         # Header - optimized for pivot tables
-        writer.writerow(
-            [
-                "Date",
-                "Hour",
-                "Minute",
-                "Transaction ID",
-                "Wallet",
-                "Method",
-                "Action Summary",
-                "wUSDC Deposit ($)",
-                "wUSDC Withdrawal ($)",
-                "wUSDC Fees ($)",
-                "Gas Fee (ETH)",
-                "Gas Fee (USD)",
-                "ETH Price (USD)",
-                "Orders Created",
-                "Buy Orders",
-                "Sell Orders",
-                "Orders Closed",
-            ]
-        )
+        header = [
+            "Date",
+            "Hour",
+            "Minute",
+            "Transaction ID",
+            "Wallet",
+            "Method",
+            "Action Summary",
+            "wUSDC Deposit ($)",
+            "wUSDC Withdrawal ($)",
+            "wUSDC Fees ($)",
+            "Gas Fee (ETH)",
+            "Gas Fee (USD)",
+            "ETH Price (USD)",
+            "Orders Created",
+            "Buy Orders",
+            "Sell Orders",
+            "Orders Closed",
+        ]
+        if include_contract:
+            header.insert(4, "Contract")
+        if include_weight:
+            header.append("Sample Weight")
+        writer.writerow(header)
 
         # Data rows
         for r in results:
-            writer.writerow(
-                [
-                    r.timestamp.strftime("%Y-%m-%d"),  # Date only
-                    r.timestamp.strftime("%H"),  # Hour (24h format)
-                    r.timestamp.strftime("%M"),  # Minute
-                    r.tx_hash,
-                    r.wallet,
-                    r.method,  # Filterable method name
-                    r.action,  # Free text summary
-                    f"{r.usdc_deposit:.6f}",
-                    f"{r.usdc_withdrawal:.6f}",
-                    f"{r.usdc_fees:.6f}",
-                    f"{r.gas_fee_eth:.10f}",
-                    f"{r.gas_fee_usd:.4f}",
-                    f"{r.eth_price_usd:.2f}",
-                    r.orders_created,
-                    r.buy_orders,
-                    r.sell_orders,
-                    r.orders_closed,
-                ]
-            )
+            row = [
+                r.timestamp.strftime("%Y-%m-%d"),  # Date only
+                r.timestamp.strftime("%H"),  # Hour (24h format)
+                r.timestamp.strftime("%M"),  # Minute
+                r.tx_hash,
+                r.wallet,
+                r.method,  # Filterable method name
+                r.action,  # Free text summary
+                f"{r.usdc_deposit:.6f}",
+                f"{r.usdc_withdrawal:.6f}",
+                f"{r.usdc_fees:.6f}",
+                f"{r.gas_fee_eth:.10f}",
+                f"{r.gas_fee_usd:.4f}",
+                f"{r.eth_price_usd:.2f}",
+                r.orders_created,
+                r.buy_orders,
+                r.sell_orders,
+                r.orders_closed,
+            ]
+            if include_contract:
+                row.insert(4, r.contract)
+            if include_weight:
+                row.append(f"{r.weight:.4f}")
+            writer.writerow(row)
+
 
+# Hourly CSV columns that get a ±95% companion in sampled runs: (label, SAMPLED_METRICS entry)
+SAMPLE_CSV_COLUMNS = (
+    ("wUSDC Deposits ($)", "usdc_deposit"),
+    ("wUSDC Withdrawals ($)", "usdc_withdrawal"),
+    ("wUSDC Fees ($)", "usdc_fees"),
+    ("Gas Fee (USD)", "gas_fee_usd"),
+    ("Orders Created", "orders_created"),
+    ("Orders Closed", "orders_closed"),
+)
 
-def write_hourly_csv(results: list[TransactionAnalysis], output_file: str, start_date: datetime, end_date: datetime):
+
+def write_hourly_csv(
+    results: Union[Iterable[TransactionAnalysis], Aggregator],
+    output_file: str,
+    start_date: datetime,
+    end_date: datetime,
+    contracts: Optional[list[str]] = None,
+    quantiles: bool = False,
+    hll: bool = False,
+    snapshots: Optional[dict[str, dict[datetime, StateSnapshot]]] = None,
+    sample: Optional[SampleEstimate] = None,
+    rolling: bool = False,
+):
     """Write hourly aggregated results to CSV file.
     
     Creates a row for every hour in the date range, even if no transactions occurred.
-    This ensures no gaps in time-series data for graphing.
+    This ensures no gaps in time-series data for graphing. Accepts raw results or
+    an Aggregator built over the same date range. With `contracts` (deployment
+    labels) there is one row per hour and contract, with a Contract column.
+    With `quantiles` (or an Aggregator that keeps sketches) p50/p95/p99 columns
+    for gas, fees and orders per transaction are appended. With `hll` the
+    Unique Wallets column is a HyperLogLog estimate. `snapshots` ({contract
+    label, or "" for a single deployment: {hour: StateSnapshot}}) appends the
+    on-chain state read at the end of each hour. With `sample` (a sampled
+    run) the totals are scaled estimates and ±95% columns are appended.
+    With `rolling` (or an Aggregator that keeps them) trailing 1h / 24h / 7d
+    gas, fees, orders and gas per trade at the end of each hour are appended.
     """
-    # Build hourly buckets for the entire date range
-    hourly_data = {}
-    
-    # Initialize all hours in range with zeros
-    current_hour = start_date.replace(minute=0, second=0, microsecond=0)
-    end_hour = end_date.replace(minute=0, second=0, microsecond=0)
-    
-    while current_hour <= end_hour:
-        hour_key = current_hour.strftime("%Y-%m-%d %H:00")
-        hourly_data[hour_key] = {
-            "datetime": current_hour,
-            "transactions": 0,
-            "unique_wallets": set(),
-            "usdc_deposits": 0.0,
-            "usdc_withdrawals": 0.0,
-            "usdc_fees": 0.0,
-            "gas_eth": 0.0,
-            "gas_usd": 0.0,
-            "orders_created": 0,
-            "buy_orders": 0,
-            "sell_orders": 0,
-            "orders_closed": 0,
-            "multicalls": 0,
-            "add_margins": 0,
-            "remove_margins": 0,
-            "create_orders": 0,
+    if isinstance(results, Aggregator):
+        quantiles = results.quantiles
+        rolling = results.rolling is not None
+    if contracts:
+        results = list(results)
+        aggregators = {
+            label: aggregate(
+                (r for r in results if r.contract == label), start_date, end_date, quantiles, hll, rolling
+            )
+            for label in contracts
+        }
+    else:
+        aggregators = {
+            "": results
+            if isinstance(results, Aggregator)
+            else aggregate(results, start_date, end_date, quantiles, hll, rolling)
         }
-        current_hour += timedelta(hours=1)
-    
-    # Aggregate results into hourly buckets
-    for r in results:
-        hour_key = r.timestamp.strftime("%Y-%m-%d %H:00")
-        if hour_key in hourly_data:
-            bucket = hourly_data[hour_key]
-            bucket["transactions"] += 1
-            bucket["unique_wallets"].add(r.wallet)
-            bucket["usdc_deposits"] += r.usdc_deposit
-            bucket["usdc_withdrawals"] += r.usdc_withdrawal
-            bucket["usdc_fees"] += r.usdc_fees
-            bucket["gas_eth"] += r.gas_fee_eth
-            bucket["gas_usd"] += r.gas_fee_usd
-            bucket["orders_created"] += r.orders_created
-            bucket["buy_orders"] += r.buy_orders
-            bucket["sell_orders"] += r.sell_orders
-            bucket["orders_closed"] += r.orders_closed
-            # Count by method type
-            if r.method == "multicall":
-                bucket["multicalls"] += 1
-            elif r.method == "addMargin":
-                bucket["add_margins"] += 1
-            elif r.method == "removeMargin":
-                bucket["remove_margins"] += 1
-            elif r.method == "createOrder":
-                bucket["create_orders"] += 1
     
     # Write to CSV
     with open(output_file, "w", newline="") as f:
         writer = csv.writer(f)
         
         # Header
-        writer.writerow([
+        header = [
             "Date",
             "Hour",
             "Transactions",
@@ -841,96 +3811,320 @@ def write_hourly_csv(results: list[TransactionAnalysis], output_file: str, start
             "wUSDC Deposits ($)",
             "wUSDC Withdrawals ($)",
             "wUSDC Fees ($)",
-            "Gas Fee (ETH)",
+            "Gas Fee (ETH)",
+            "Gas Fee (USD)",
+            "Orders Created",
+            "Buy Orders",
+            "Sell Orders",
+            "Orders Closed",
+            "Multicalls",
+            "AddMargins",
+            "RemoveMargins",
+            "CreateOrders",
+        ]
+        if contracts:
+            header.insert(2, "Contract")
+        if quantiles:
+            for label in ("Gas USD", "wUSDC Fees", "Orders/Tx"):
+                header.extend(f"{label} p{round(q * 100)}" for q in QUANTILES)
+        if snapshots is not None:
+            header.extend([
+                "Snapshot Block",
+                "Market Price ($/day)",
+                "Margin Balance ($)",
+                "Min Margin ($)",
+                "Collateral Deficit ($)",
+            ])
+        if sample is not None:
+            header.extend(f"{label} ±95%" for label, _ in SAMPLE_CSV_COLUMNS)
+        if rolling:
+            for window, _, _ in ROLLING_WINDOWS:
+                header.extend([
+                    f"Gas USD {window}",
+                    f"wUSDC Fees {window}",
+                    f"Orders Created {window}",
+                    f"Gas/Trade {window}",
+                ])
+            header.append("Partial Windows")
+        writer.writerow(header)
+        
+        # Data rows - sorted by datetime (every aggregator covers the same hours)
+        labels = list(aggregators)
+        for buckets in zip(*(aggregator.hourly() for aggregator in aggregators.values())):
+            for label, bucket in zip(labels, buckets):
+                dt = bucket.start
+                row = [
+                    dt.strftime("%Y-%m-%d"),
+                    dt.strftime("%H"),
+                    _count(bucket.transactions),
+                    len(bucket.unique_wallets),
+                    f"{bucket.usdc_deposits:.2f}",
+                    f"{bucket.usdc_withdrawals:.2f}",
+                    f"{bucket.usdc_fees:.2f}",
+                    f"{bucket.gas_eth:.6f}",
+                    f"{bucket.gas_usd:.2f}",
+                    _count(bucket.orders_created),
+                    _count(bucket.buy_orders),
+                    _count(bucket.sell_orders),
+                    _count(bucket.orders_closed),
+                    _count(bucket.multicalls),
+                    _count(bucket.add_margins),
+                    _count(bucket.remove_margins),
+                    _count(bucket.create_orders),
+                ]
+                if contracts:
+                    row.insert(2, label)
+                if quantiles:
+                    for metric, fmt in (("gas_usd", ".4f"), ("usdc_fees", ".4f"), ("orders", ".1f")):
+                        row.extend(
+                            "" if value is None else f"{value:{fmt}}"
+                            for value in bucket.sketches.percentiles(metric)
+                        )
+                if snapshots is not None:
+                    snapshot = snapshots.get(label, {}).get(dt)
+                    if snapshot is None:
+                        row.extend([""] * 5)
+                    else:
+                        row.append(snapshot.block)
+                        row.extend(
+                            "" if value is None else f"{value:.2f}"
+                            for value in (
+                                snapshot.market_price,
+                                snapshot.total("margin_balance"),
+                                snapshot.total("min_margin"),
+                                snapshot.total("collateral_deficit"),
+                            )
+                        )
+                if sample is not None:
+                    intervals = sample.hours.get(dt, {})
+                    row.extend(
+                        f"{intervals[metric][1]:.2f}" if metric in intervals else "0.00"
+                        for _, metric in SAMPLE_CSV_COLUMNS
+                    )
+                if rolling:
+                    for window, _, _ in ROLLING_WINDOWS:
+                        totals = bucket.rolling[window]
+                        trades = totals["trades"]
+                        row.extend([
+                            f"{totals['gas_usd']:.2f}",
+                            f"{totals['usdc_fees']:.2f}",
+                            _count(totals["orders_created"]),
+                            f"{totals['trade_gas_usd'] / trades:.4f}" if trades else "",
+                        ])
+                    row.append(" ".join(bucket.rolling_partial))
+                writer.writerow(row)
+
+
+# Metrics sink series (--emit-metrics): (metric name, CloudWatch unit, AggregateBucket attribute)
+METRIC_SERIES = (
+    ("Transactions", "Count", "transactions"),
+    ("OrderFeesUSD", "None", "usdc_fees"),
+    ("GasUSD", "None", "gas_usd"),
+    ("OrdersCreated", "Count", "orders_created"),
+    ("OrdersClosed", "Count", "orders_closed"),
+)
+# Wallet dimension values kept per run (by transactions); the rest are reported as Wallet=other
+METRICS_TOP_WALLETS = 20
+
+# --emit-metrics format -> default file extension
+METRICS_EXTENSIONS = {"emf": ".jsonl", "statsd": ".statsd", "prom": ".prom"}
+
+
+def hourly_metric_points(
+    results: Iterable[TransactionAnalysis],
+    start_date: datetime,
+    end_date: datetime,
+    top_wallets: int = METRICS_TOP_WALLETS,
+) -> list["MetricPoint"]:
+    """
+    METRIC_SERIES points per hour for the metrics sink.
+
+    Every hour in the range gets a run-total point per series (no dimensions,
+    so dashboards see no gaps); hours with activity also get per-Method and
+    per-Wallet points. Only the busiest `top_wallets` wallets keep their own
+    Wallet value to bound the series count. Results of several deployments
+    add a Contract dimension to every point.
+    """
+    from metrics_sink import MetricPoint
+
+    results = list(results)
+    wallet_counts: dict[str, int] = {}
+    for r in results:
+        wallet_counts[r.wallet.lower()] = wallet_counts.get(r.wallet.lower(), 0) + 1
+    top = set(sorted(wallet_counts, key=lambda wallet: -wallet_counts[wallet])[:top_wallets])
+
+    buckets: dict[tuple[datetime, tuple], AggregateBucket] = {}
+    current_hour = start_date.replace(minute=0, second=0, microsecond=0)
+    end_hour = end_date.replace(minute=0, second=0, microsecond=0)
+    while current_hour <= end_hour:
+        for contract in sorted({r.contract for r in results}) or [""]:
+            dimensions = (("Contract", contract),) if contract else ()
+            buckets[(current_hour, dimensions)] = AggregateBucket(start=current_hour)
+        current_hour += timedelta(hours=1)
+
+    for r in results:
+        hour = r.timestamp.replace(minute=0, second=0, microsecond=0)
+        base = (("Contract", r.contract),) if r.contract else ()
+        wallet = r.wallet.lower() if r.wallet.lower() in top else "other"
+        for dimensions in (base, base + (("Method", r.method),), base + (("Wallet", wallet),)):
+            bucket = buckets.get((hour, dimensions))
+            if bucket is None:
+                bucket = buckets[(hour, dimensions)] = AggregateBucket(start=hour)
+            bucket.add(r)
+
+    points = []
+    for (hour, dimensions), bucket in sorted(buckets.items(), key=lambda item: item[0]):
+        timestamp = int(hour.timestamp())
+        for name, unit, attribute in METRIC_SERIES:
+            value = float(getattr(bucket, attribute))
+            points.append(MetricPoint(name, round(value, 6), timestamp, dict(dimensions), unit))
+    return points
+
+
+def write_gas_attribution_csv(attribution: GasAttribution, output_file: str):
+    """Write gas per subcall type, split by whether the subcall created a position (overhead last)."""
+    total = attribution.gas_used
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            "Subcall",
+            "Created Position",
+            "Calls",
+            "Positions Created",
+            "Gas Used",
+            "Avg Gas",
+            "Gas Fee (USD)",
+            "Share of Gas (%)",
+        ])
+        rows = sorted(attribution.matched.items(), key=lambda item: -item[1].gas_used)
+        overhead = attribution.subcalls.get(OVERHEAD_SUBCALL)
+        if overhead is not None:
+            rows.append(((OVERHEAD_SUBCALL, None), overhead))
+        for (method, created), stats in rows:
+            writer.writerow([
+                method,
+                "" if created is None else ("yes" if created else "no"),
+                _count(stats.count),
+                _count(stats.positions),
+                _count(stats.gas_used),
+                f"{stats.gas_used / stats.count:.0f}" if stats.count else "",
+                f"{stats.gas_usd:.4f}",
+                f"{100 * stats.gas_used / total:.2f}" if total else "",
+            ])
+
+
+def write_cohort_csv(rows: list[CohortRow], output_file: str):
+    """Write one row per delivery date and price tick."""
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            "Delivery Date",
+            "Price Per Day ($)",
+            "Orders Created",
+            "Positions Created",
+            "wUSDC Fees ($)",
             "Gas Fee (USD)",
-            "Orders Created",
-            "Buy Orders",
-            "Sell Orders",
-            "Orders Closed",
-            "Multicalls",
-            "AddMargins",
-            "RemoveMargins",
-            "CreateOrders",
         ])
-        
-        # Data rows - sorted by datetime
-        for hour_key in sorted(hourly_data.keys()):
-            bucket = hourly_data[hour_key]
-            dt = bucket["datetime"]
+        for row in rows:
             writer.writerow([
-                dt.strftime("%Y-%m-%d"),
-                dt.strftime("%H"),
-                bucket["transactions"],
-                len(bucket["unique_wallets"]),
-                f"{bucket['usdc_deposits']:.2f}",
-                f"{bucket['usdc_withdrawals']:.2f}",
-                f"{bucket['usdc_fees']:.2f}",
-                f"{bucket['gas_eth']:.6f}",
-                f"{bucket['gas_usd']:.2f}",
-                bucket["orders_created"],
-                bucket["buy_orders"],
-                bucket["sell_orders"],
-                bucket["orders_closed"],
-                bucket["multicalls"],
-                bucket["add_margins"],
-                bucket["remove_margins"],
-                bucket["create_orders"],
+                row.delivery_date.strftime("%Y-%m-%d"),
+                f"{row.price_per_day:.6f}",
+                _count(row.orders),
+                _count(row.fills),
+                f"{row.usdc_fees:.6f}",
+                f"{row.gas_usd:.4f}",
             ])
 
 
-def print_summary(results: list[TransactionAnalysis], show_wallet_breakdown: bool = False, wallet_address: Optional[str] = None):
-    """Print summary statistics."""
-    if not results:
+def print_sample_estimate(sample: SampleEstimate):
+    """Scaled totals of a sampled run with their 95% confidence intervals."""
+    print(f"\n🎲 SAMPLED ESTIMATE: {sample.sampled:,d} of {sample.population:,d} transactions analyzed (rate {sample.rate:g})")
+    print("-" * 70)
+    print(f"  Totals below are scaled from {sample.strata:,d} method x hour strata; 95% confidence intervals:")
+    for label, metric in (
+        ("Order Fees (wUSDC)", "usdc_fees"),
+        ("Gas Fees (USD)", "gas_fee_usd"),
+        ("Deposits", "usdc_deposit"),
+        ("Withdrawals", "usdc_withdrawal"),
+    ):
+        estimate, half_width = sample.totals[metric]
+        print(f"  {label + ':':21s}${estimate:>12,.2f} ± ${half_width:,.2f}")
+    for label, metric in (("Orders Created", "orders_created"), ("Orders Closed", "orders_closed")):
+        estimate, half_width = sample.totals[metric]
+        print(f"  {label + ':':21s} {estimate:>12,.0f} ± {half_width:,.0f}")
+
+
+def print_summary(
+    results: Union[Iterable[TransactionAnalysis], Aggregator],
+    show_wallet_breakdown: bool = False,
+    wallet_address: Optional[str] = None,
+    quantiles: bool = False,
+    hll: bool = False,
+    sample: Optional[SampleEstimate] = None,
+    rolling: bool = False,
+    gas_attribution: Optional[GasAttribution] = None,
+    batches: Optional[BatchCurve] = None,
+):
+    """
+    Print summary statistics (from raw results or an Aggregator); `sample` adds
+    confidence intervals, `gas_attribution` the gas per multicall subcall and
+    `batches` the cost by multicall batch size.
+    """
+    aggregator = (
+        results if isinstance(results, Aggregator)
+        else aggregate(results, quantiles=quantiles, hll=hll, rolling=rolling)
+    )
+    totals = aggregator.totals
+    if totals.transactions == 0:
         print("\nNo transactions found in the specified date range.")
         return
 
     # Calculate totals
-    total_usdc_fees = sum(r.usdc_fees for r in results)
-    total_usdc_deposits = sum(r.usdc_deposit for r in results)
-    total_usdc_withdrawals = sum(r.usdc_withdrawal for r in results)
+    total_usdc_fees = totals.usdc_fees
+    total_usdc_deposits = totals.usdc_deposits
+    total_usdc_withdrawals = totals.usdc_withdrawals
     net_account_change = total_usdc_deposits - total_usdc_withdrawals
-    total_gas_eth = sum(r.gas_fee_eth for r in results)
-    total_gas_usd = sum(r.gas_fee_usd for r in results)
-    total_orders_created = sum(r.orders_created for r in results)
-    total_orders_closed = sum(r.orders_closed for r in results)
-    total_buy_orders = sum(r.buy_orders for r in results)
-    total_sell_orders = sum(r.sell_orders for r in results)
+    total_gas_eth = totals.gas_eth
+    total_gas_usd = totals.gas_usd
+    total_orders_created = totals.orders_created
+    total_orders_closed = totals.orders_closed
+    total_buy_orders = totals.buy_orders
+    total_sell_orders = totals.sell_orders
     total_trading_cost = total_usdc_fees + total_gas_usd
     
     # Count by method type
-    method_counts = {}
-    method_gas = {}
-    for r in results:
-        method_counts[r.method] = method_counts.get(r.method, 0) + 1
-        method_gas[r.method] = method_gas.get(r.method, 0.0) + r.gas_fee_usd
+    method_counts = {method: stats.count for method, stats in aggregator.methods.items()}
+    method_gas = {method: stats.gas_usd for method, stats in aggregator.methods.items()}
     
-    # Filter for multicall transactions only (for per-tx averages)
-    multicall_results = [r for r in results if r.method == "multicall"]
-    multicall_count = len(multicall_results)
-    multicall_fees = sum(r.usdc_fees for r in multicall_results) if multicall_count > 0 else 0
-    multicall_gas = sum(r.gas_fee_usd for r in multicall_results) if multicall_count > 0 else 0
+    # Multicall transactions only (for per-tx averages)
+    multicall_stats = aggregator.methods.get("multicall", MethodStats())
+    multicall_count = multicall_stats.count
+    multicall_fees = multicall_stats.usdc_fees
+    multicall_gas = multicall_stats.gas_usd
     avg_cost_per_trade = (multicall_fees + multicall_gas) / multicall_count if multicall_count > 0 else 0
     
     # Wallet breakdown (for --all mode)
-    wallet_stats = {}
-    for r in results:
-        wallet = r.wallet
-        if wallet not in wallet_stats:
-            wallet_stats[wallet] = {"txs": 0, "gas": 0.0, "orders": 0, "deposits": 0.0}
-        wallet_stats[wallet]["txs"] += 1
-        wallet_stats[wallet]["gas"] += r.gas_fee_usd
-        wallet_stats[wallet]["orders"] += r.orders_created
-        wallet_stats[wallet]["deposits"] += r.usdc_deposit
+    wallet_stats = aggregator.wallets
+
+    def order_count(value: Union[int, float], metric: Optional[str] = None) -> str:
+        """An order count: exact in full runs, a ~estimate (± 95% CI where known) in sampled ones."""
+        if sample is None:
+            return f"{value:,d}"
+        estimate = f"~{_count(value):,d}"
+        return f"{estimate} ± {sample.totals[metric][1]:,.0f}" if metric else estimate
 
     print("\n" + "=" * 70)
     if show_wallet_breakdown:
-        unique_wallets = len(wallet_stats)
-        print(f"SUMMARY ({unique_wallets} wallets)")
+        unique_wallets = len(totals.unique_wallets)
+        print(f"SUMMARY ({'~' if aggregator.hll else ''}{unique_wallets} wallets)")
     elif wallet_address:
         print(f"SUMMARY: {wallet_address}")
     else:
         print("SUMMARY")
     print("=" * 70)
+
+    if sample is not None:
+        print_sample_estimate(sample)
     
     if show_wallet_breakdown:
         # ORDER FOR ALL WALLETS MODE:
@@ -943,11 +4137,11 @@ def print_summary(results: list[TransactionAnalysis], show_wallet_breakdown: boo
         
         # 1. Top Wallets
         if len(wallet_stats) > 1:
-            print(f"\n🏆 TOP WALLETS BY TRANSACTIONS:")
+            print(f"\n🏆 TOP WALLETS BY TRANSACTIONS{' (estimated from the sample)' if sample else ''}:")
             print("-" * 70)
-            sorted_wallets = sorted(wallet_stats.items(), key=lambda x: -x[1]["txs"])[:10]
+            sorted_wallets = sorted(wallet_stats.items(), key=lambda x: -x[1].txs)[:10]
             for wallet, stats in sorted_wallets:
-                print(f"  {wallet[:10]}...{wallet[-6:]}  {stats['txs']:5d} txs  {stats['orders']:6d} orders  ${stats['gas']:,.2f} gas")
+                print(f"  {wallet[:10]}...{wallet[-6:]}  {_count(stats.txs):5d} txs  {_count(stats.orders):6d} orders  ${stats.gas:,.2f} gas")
         
         # 2. Account Activity
         print(f"\n💰 ACCOUNT ACTIVITY: ${net_account_change:,.2f} net")
@@ -956,17 +4150,21 @@ def print_summary(results: list[TransactionAnalysis], show_wallet_breakdown: boo
         print(f"  Withdrawals (removeMargin): ${total_usdc_withdrawals:>12,.2f}")
         
         # 3. Trading Activity
-        print(f"\n📈 TRADING ACTIVITY: {total_orders_created:,d} created | {total_orders_closed:,d} closed")
+        print(
+            f"\n📈 TRADING ACTIVITY: {order_count(total_orders_created, 'orders_created')} created"
+            f" | {order_count(total_orders_closed, 'orders_closed')} closed"
+        )
         print("-" * 70)
-        print(f"  Buy Orders:    {total_buy_orders:,d}")
-        print(f"  Sell Orders:   {total_sell_orders:,d}")
+        print(f"  Buy Orders:    {order_count(total_buy_orders)}")
+        print(f"  Sell Orders:   {order_count(total_sell_orders)}")
         
         # 4. Transactions by Type
-        print(f"\n📊 TRANSACTIONS BY TYPE: {len(results)} txs | ${total_gas_usd:,.2f} gas")
+        # Exact in sampled runs too: the strata are per method, so their weights add back up
+        print(f"\n📊 TRANSACTIONS BY TYPE: {_count(totals.transactions)} txs | ${total_gas_usd:,.2f} gas")
         print("-" * 70)
-        for method, count in sorted(method_counts.items(), key=lambda x: -x[1]):
+        for method, txs in sorted(method_counts.items(), key=lambda x: -x[1]):
             gas = method_gas.get(method, 0)
-            print(f"  {method:20s}  {count:6d} txs    ${gas:,.2f} gas")
+            print(f"  {method:20s}  {_count(txs):6d} txs    ${gas:,.2f} gas")
         
         # 5. Costs
         print(f"\n💸 COSTS: ${total_trading_cost:,.2f} total")
@@ -997,17 +4195,21 @@ def print_summary(results: list[TransactionAnalysis], show_wallet_breakdown: boo
         print(f"  Withdrawals (removeMargin): ${total_usdc_withdrawals:>12,.2f}")
         
         # 2. Trading Activity
-        print(f"\n📈 TRADING ACTIVITY: {total_orders_created:,d} created | {total_orders_closed:,d} closed")
+        print(
+            f"\n📈 TRADING ACTIVITY: {order_count(total_orders_created, 'orders_created')} created"
+            f" | {order_count(total_orders_closed, 'orders_closed')} closed"
+        )
         print("-" * 70)
-        print(f"  Buy Orders:    {total_buy_orders:,d}")
-        print(f"  Sell Orders:   {total_sell_orders:,d}")
+        print(f"  Buy Orders:    {order_count(total_buy_orders)}")
+        print(f"  Sell Orders:   {order_count(total_sell_orders)}")
         
         # 3. Transactions by Type
-        print(f"\n📊 TRANSACTIONS BY TYPE: {len(results)} txs | ${total_gas_usd:,.2f} gas")
+        # Exact in sampled runs too: the strata are per method, so their weights add back up
+        print(f"\n📊 TRANSACTIONS BY TYPE: {_count(totals.transactions)} txs | ${total_gas_usd:,.2f} gas")
         print("-" * 70)
-        for method, count in sorted(method_counts.items(), key=lambda x: -x[1]):
+        for method, txs in sorted(method_counts.items(), key=lambda x: -x[1]):
             gas = method_gas.get(method, 0)
-            print(f"  {method:20s}  {count:6d} txs    ${gas:,.2f} gas")
+            print(f"  {method:20s}  {_count(txs):6d} txs    ${gas:,.2f} gas")
         
         # 4. Costs
         print(f"\n💸 COSTS: ${total_trading_cost:,.2f} total")
@@ -1022,16 +4224,281 @@ def print_summary(results: list[TransactionAnalysis], show_wallet_breakdown: boo
             print("-" * 70)
             print(f"  Avg Order Fees:   ${multicall_fees/multicall_count:,.4f}")
             print(f"  Avg Gas:          ${multicall_gas/multicall_count:,.4f}")
+
+    # Per-transaction percentiles (only when the aggregator keeps sketches)
+    if aggregator.quantiles:
+        print_quantiles(aggregator)
+
+    # Trailing windows at the end of the run (only when the aggregator keeps them)
+    if aggregator.rolling is not None:
+        print_rolling(aggregator)
+
+    # Delivery-date cohorts (only when the aggregator collects them)
+    if aggregator.cohorts is not None:
+        print_cohorts(aggregator.cohort_table())
+
+    # Unique wallets by day and week (HyperLogLog rollups of the hourly counters)
+    if aggregator.hll:
+        error = totals.unique_wallets.relative_error
+        daily = aggregator.unique_wallets("day")
+        weekly = aggregator.unique_wallets("week")
+        print(f"\n👥 UNIQUE WALLETS (HyperLogLog, ±{error:.1%}): ~{len(totals.unique_wallets):,d}")
+        print("-" * 70)
+        if daily:
+            busiest_day = max(daily, key=lambda day: len(daily[day]))
+            average = sum(len(wallets) for wallets in daily.values()) / len(daily)
+            print(f"  Per day:    ~{average:,.1f} avg   ~{len(daily[busiest_day]):,d} peak ({busiest_day.date()})")
+        if weekly:
+            busiest_week = max(weekly, key=lambda week: len(weekly[week]))
+            print(f"  Per week:   ~{len(weekly[busiest_week]):,d} peak (week of {busiest_week.date()})")
+
+    # Gas per multicall subcall (only for --trace-gas runs)
+    if gas_attribution is not None and gas_attribution.transactions:
+        print_gas_attribution(gas_attribution)
+
+    # Cost by multicall batch size (only for --batch-curve runs)
+    if batches is not None:
+        print_batch_curve(batches)
     
     print("=" * 70)
 
 
+def print_quantiles(aggregator: Aggregator):
+    """Print p50/p95/p99 of gas, order fees and orders per transaction, by method."""
+    labels = " / ".join(f"p{round(q * 100)}" for q in QUANTILES)
+    print(f"\n📐 PER-TX PERCENTILES ({labels}):")
+    print("-" * 70)
+    rows = sorted(aggregator.method_sketches.items(), key=lambda x: -x[1].gas_usd.count)
+    rows.append(("all", aggregator.totals.sketches))
+    for method, sketches in rows:
+        gas = " / ".join(f"${value:,.4f}" for value in sketches.percentiles("gas_usd"))
+        print(f"  {method:20s}  gas     {gas}")
+        if sketches.usdc_fees.max > 0:
+            fees = " / ".join(f"${value:,.4f}" for value in sketches.percentiles("usdc_fees"))
+            print(f"  {'':20s}  fees    {fees}")
+        if sketches.orders.max > 0:
+            orders = " / ".join(f"{value:,.1f}" for value in sketches.percentiles("orders"))
+            print(f"  {'':20s}  orders  {orders}")
+
+
+def print_rolling(aggregator: Aggregator):
+    """Print the trailing 1h / 24h / 7d windows at the end of the last hour."""
+    aggregator.hourly()  # Snapshots every hour, the last one included
+    print(f"\n⏱️  TRAILING WINDOWS (at end of range):")
+    print("-" * 70)
+    partial = aggregator.rolling.partial()
+    for label, totals in aggregator.rolling.snapshot().items():
+        trades = totals["trades"]
+        per_trade = f"${totals['trade_gas_usd'] / trades:,.4f}/trade" if trades else "no trades"
+        note = "  (partial: the range is shorter)" if label in partial else ""
+        print(
+            f"  {label:>4s}  ${totals['gas_usd']:>10,.2f} gas  ${totals['usdc_fees']:>10,.2f} fees  "
+            f"{totals['orders_created']:>7,.0f} orders  {per_trade}{note}"
+        )
+
+
+def print_gas_attribution(attribution: GasAttribution):
+    """Print gas per multicall subcall type and per order-matching subcall."""
+    total = attribution.gas_used
+    untraced = f" ({_count(attribution.untraced):,d} without a trace)" if attribution.untraced else ""
+    print(f"\n⛽ GAS BY MULTICALL SUBCALL: {attribution.transactions:,.0f} traced{untraced} | {total:,.0f} gas")
+    print("-" * 70)
+    for method, stats in sorted(attribution.subcalls.items(), key=lambda x: -x[1].gas_used):
+        share = stats.gas_used / total if total else 0.0
+        print(
+            f"  {method:20s}  {stats.count:7,.0f} calls  avg {stats.gas_used / stats.count:>9,.0f} gas  "
+            f"${stats.gas_usd:>10,.2f}  {share:6.1%}"
+        )
+    for created, title in ((True, "Matched an order (created a position)"), (False, "Did not create a position")):
+        rows = sorted(
+            ((method, stats) for (method, matched), stats in attribution.matched.items() if matched == created),
+            key=lambda x: -x[1].gas_used,
+        )
+        # Only subcall types that created a position somewhere are worth splitting
+        rows = [(method, stats) for method, stats in rows if (method, True) in attribution.matched]
+        if not rows:
+            continue
+        print(f"  {title}:")
+        for method, stats in rows:
+            per_position = f"  ${stats.gas_usd / stats.positions:,.4f}/position" if stats.positions else ""
+            print(
+                f"    {method:18s}  {stats.count:7,.0f} calls  avg {stats.gas_used / stats.count:>9,.0f} gas  "
+                f"${stats.gas_usd:>10,.2f}{per_position}"
+            )
+
+
+def print_batch_curve(curve: BatchCurve):
+    """Print cost per multicall and per order by batch size, the fixed / marginal split and the best size."""
+    unbatched = f", {curve.unbatched:,.0f} without orders left out" if curve.unbatched else ""
+    print(f"\n📦 BATCH SIZE (orders created + closed per multicall): {sum(curve.txs):,.0f} multicalls{unbatched}")
+    print("-" * 70)
+    for label, index in (("Fixed per multicall", 0), ("Per created order", 1), ("Per closed order", 2)):
+        print(f"  {label + ':':22s} ${curve.gas_fit[index]:>8,.4f} gas   ${curve.fee_fit[index]:>8,.4f} fees")
+    first, last = curve.sizes[0], curve.sizes[-1]
+    print(
+        f"  Marginal order cost:   ${sum(curve.marginal(first)):,.4f} at {first} → ${sum(curve.marginal(last)):,.4f} "
+        f"at {last} orders ({curve.created_share:.0%} created)"
+    )
+    print(f"  {'Orders':>6s}  {'Txs':>7s}  {'Avg Gas':>9s}  {'Avg Fees':>9s}  {'Cost/Order':>10s}  {'Fitted':>9s}")
+    for n, txs, gas, fees in zip(curve.sizes, curve.txs, curve.gas_usd, curve.usdc_fees):
+        fitted = sum(curve.fitted(n)) / n
+        print(f"  {n:6d}  {txs:7,.0f}  ${gas:8,.4f}  ${fees:8,.4f}  ${(gas + fees) / n:9,.4f}  ${fitted:8,.4f}")
+    best = curve.best_size()
+    line = f"  Lowest cost per order: {best} per multicall (${sum(curve.fitted(best)) / best:,.4f}/order fitted)"
+    observed = curve.observed_best()
+    if observed is not None:
+        i = curve.sizes.index(observed)
+        line += f"; observed {observed} (${(curve.gas_usd[i] + curve.usdc_fees[i]) / observed:,.4f}/order)"
+    print(line)
+
+
+def print_cohorts(rows: list[CohortRow]):
+    """Print orders, fills and the fees and gas they absorbed per delivery date."""
+    by_date: dict[datetime, list[float]] = {}
+    for row in rows:
+        totals = by_date.setdefault(row.delivery_date, [0, 0, 0.0, 0.0])
+        totals[0] += row.orders
+        totals[1] += row.fills
+        totals[2] += row.usdc_fees
+        totals[3] += row.gas_usd
+    cost = sum(fees + gas for _, _, fees, gas in by_date.values())
+    print(f"\n🗓️  COHORTS BY DELIVERY DATE: {len(by_date)} dates, {len(rows)} date/price cohorts")
+    print("-" * 70)
+    for date in sorted(by_date):
+        orders, fills, fees, gas = by_date[date]
+        share = (fees + gas) / cost if cost else 0.0
+        print(
+            f"  {date.date()}  {orders:7,.0f} orders  {fills:6,.0f} fills  "
+            f"${fees:>10,.2f} fees  ${gas:>8,.2f} gas  {share:6.1%}"
+        )
+
+
 # ============================================================================
 # MAIN
 # ============================================================================
 
 
+def read_state_snapshots(
+    args: argparse.Namespace,
+    analyzers: list[MarketMakerAnalyzer],
+    deployments: list[Deployment],
+    start_date: datetime,
+    end_date: datetime,
+) -> dict[str, dict[datetime, StateSnapshot]]:
+    """Hourly state snapshots per deployment label ("" for a single deployment)."""
+    first_hour = start_date.replace(minute=0, second=0, microsecond=0)
+    hours = [first_hour + timedelta(hours=i) for i in range(int((end_date - first_hour).total_seconds() // 3600) + 1)]
+    block_range = next((a.block_range for a in analyzers if a.block_range), None)
+    if block_range is None:
+        block_range = analyzers[0].resolve_block_range(start_date, end_date)
+
+    snapshots = {}
+    for analyzer, deployment in zip(analyzers, deployments):
+        wallet = deployment.wallet or args.market_maker_wallet
+        wallets = args.snapshot_wallets or ([wallet] if wallet else [])
+        if not args.quiet:
+            print(f"Reading {len(hours)} hourly state snapshots for {deployment.label} "
+                  f"({len(wallets)} wallet{'s' if len(wallets) != 1 else ''})...")
+        try:
+            by_hour = analyzer.state_snapshots(hours, block_range, wallets)
+        except Exception as e:
+            print(f"  [Warning] State snapshots failed for {deployment.label}: {e}")
+            by_hour = {}
+        snapshots[deployment.label if len(analyzers) > 1 else ""] = by_hour
+    return snapshots
+
+
+def _split_s3_location(location: str) -> tuple[str, str]:
+    bucket, _, key = location[len("s3://"):].partition("/")
+    if not bucket or not key:
+        raise ValueError(f"Invalid S3 location: {location} (expected s3://bucket/key)")
+    return bucket, key
+
+
+def _s3_client():
+    # boto3 is only needed for s3:// locations; AWS_ENDPOINT_URL points it at a stand-in store
+    import boto3
+
+    return boto3.client("s3")
+
+
+def cache_main(argv: list[str]):
+    """`cache export` / `cache import`: move response-cache snapshots between runners."""
+    from response_cache import SNAPSHOT_NAMESPACES, ResponseCache, SnapshotError
+
+    parser = argparse.ArgumentParser(
+        prog="analyze_market_maker_fees.py cache",
+        description="Export or import response-cache snapshots (local path or s3://bucket/key)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=DEFAULT_CONFIG["ANALYZER_CACHE_DIR"],
+        help="Directory of the response cache (or ANALYZER_CACHE_DIR env var)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Pack cached chain data for a block range into one artifact")
+    export_parser.add_argument("location", help="Artifact path or s3://bucket/key (gzip'd JSONL)")
+    export_parser.add_argument("--from-block", type=int, help="First block to include (default: all)")
+    export_parser.add_argument("--to-block", type=int, help="Last block to include (default: all)")
+    export_parser.add_argument(
+        "--namespaces",
+        nargs="+",
+        choices=SNAPSHOT_NAMESPACES,
+        default=list(SNAPSHOT_NAMESPACES),
+        help="Cache namespaces to include (default: all immutable ones)",
+    )
+    import_parser = commands.add_parser("import", help="Merge artifacts into the cache (existing entries are kept)")
+    import_parser.add_argument("locations", nargs="+", help="Artifact paths or s3://bucket/key")
+    args = parser.parse_args(argv)
+
+    if not args.cache_dir:
+        print("Error: A cache directory is required. Set via --cache-dir or ANALYZER_CACHE_DIR env var.")
+        sys.exit(1)
+    cache = ResponseCache(args.cache_dir)
+    try:
+        if args.command == "export":
+            location = args.location
+            if location.startswith("s3://"):
+                import tempfile
+
+                bucket, key = _split_s3_location(location)
+                with tempfile.TemporaryFile() as f:
+                    count = cache.export_snapshot(f, args.namespaces, args.from_block, args.to_block)
+                    f.seek(0)
+                    _s3_client().upload_fileobj(f, bucket, key)
+            else:
+                # Write beside the target and rename, so a reader never sees a partial artifact
+                partial = f"{location}.partial"
+                with open(partial, "wb") as f:
+                    count = cache.export_snapshot(f, args.namespaces, args.from_block, args.to_block)
+                os.replace(partial, location)
+            print(f"Exported {count} cache entries to {location}")
+        else:
+            for location in args.locations:
+                if location.startswith("s3://"):
+                    import tempfile
+
+                    bucket, key = _split_s3_location(location)
+                    with tempfile.TemporaryFile() as f:
+                        _s3_client().download_fileobj(bucket, key, f)
+                        f.seek(0)
+                        read, added = cache.import_snapshot(f)
+                else:
+                    with open(location, "rb") as f:
+                        read, added = cache.import_snapshot(f)
+                print(f"Imported {location}: {read} entries, {added} new")
+    except (OSError, ValueError, SnapshotError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        cache.close()
+
+
 def main():
+    if sys.argv[1:2] == ["cache"]:
+        return cache_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser(
         description="Analyze market maker fees on futures contract",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -1043,23 +4510,103 @@ Examples:
   # Analyze specific transaction
   python analyze_market_maker_fees.py --tx 0x468ee2cb8644517607602f24e7bd647a3a0491c46843f5f271469d69f97ce268
 
-  # Use environment variables for API keys
+  # Compare deployments in one run (shared clients/cache, adds a Contract column)
+  python analyze_market_maker_fees.py -a --futures-contract dev=0xDEV... stg=0xSTG... lmn=0x8464...:0xc1e1...
+
+  # Several bot wallets in one pass (per-wallet CSVs plus the combined output)
+  python analyze_market_maker_fees.py --start-date 2026-01-09 --wallets mm=0xc1e1... hedge=0x7a3f... -H
+  python analyze_market_maker_fees.py --start-date 2026-01-09 --wallets bots.txt
+
+  # Analyze a list of transactions (deduplicated, fetched in JSON-RPC batches)
+  python analyze_market_maker_fees.py --tx-file disputed.txt -H
+  cat disputed.txt | python analyze_market_maker_fees.py --tx-file -
+
+  # Warm start an ephemeral runner from last night's cache snapshot, then refresh it
+  python analyze_market_maker_fees.py cache --cache-dir ./.cache import s3://bucket/analyzer/cache.jsonl.gz
+  python analyze_market_maker_fees.py --cache-dir ./.cache -a --start-date 2026-01-09
+  python analyze_market_maker_fees.py cache --cache-dir ./.cache export s3://bucket/analyzer/cache.jsonl.gz
+
+  # Archive decoded events while analyzing, then re-aggregate offline
+  python analyze_market_maker_fees.py --start-date 2026-01-01 --archive ./event-archive
+  python analyze_market_maker_fees.py --start-date 2026-01-01 --archive ./event-archive --from-archive
+
+  # Hourly market price and margin state of the MM wallet (one Multicall3 call per hour)
+  python analyze_market_maker_fees.py --start-date 2026-01-09 --state-snapshots hourly
+
+  # Hourly cost metrics for CloudWatch dashboards (EMF), or StatsD / OpenMetrics
+  python analyze_market_maker_fees.py -a --start-date 2026-01-09 --emit-metrics emf --metrics-target cloudwatch://analyzer/costs
+  python analyze_market_maker_fees.py -a --start-date 2026-01-09 --emit-metrics prom
+
+  # Gas per multicall subcall (createOrder / closeOrder / matched orders) from call traces
+  python analyze_market_maker_fees.py --start-date 2026-01-09 --trace-gas --traces traces.jsonl
+  python analyze_market_maker_fees.py --start-date 2026-01-09 --trace-gas --trace-url http://localhost:8547
+
+  # Fixed vs marginal cost per order and the cheapest multicall batch size (needs numpy)
+  python analyze_market_maker_fees.py --start-date 2026-01-01 --batch-curve
+
+  # Orders, fills, fees and gas by delivery date and price tick (needs numpy)
+  python analyze_market_maker_fees.py -a --start-date 2026-01-01 --cohorts
+
+  # History scan from block headers: receipts only for blocks whose logsBloom may match
+  python analyze_market_maker_fees.py -a --start-date 2025-06-01 --scan bloom
+
+  # Trailing 1h/24h/7d gas, fees, orders and gas per trade as extra hourly CSV columns
+  python analyze_market_maker_fees.py -a --start-date 2026-01-01 --rolling
+
+  # Quick cost estimate from a 5% stratified sample, with 95% confidence intervals
+  python analyze_market_maker_fees.py -a --start-date 2026-01-01 --sample 0.05 -H
+
+  # Order events from the project's subgraph, transfers from tokentx - no receipts
+  python analyze_market_maker_fees.py -a --start-date 2026-01-09 --source subgraph --subgraph-url http://localhost:8000/subgraphs/name/futures
+
+  # Narrow questions only fetch the receipts they need
+  python analyze_market_maker_fees.py -a --methods addMargin removeMargin --min-value 1000
+  python analyze_market_maker_fees.py -a --exclude-wallets 0xBOT1... 0xBOT2... --min-gas 500000
+
+  # Bulk token transfers instead of one receipt per margin transaction
+  python analyze_market_maker_fees.py -a --start-date 2026-01-01 --transfers tokentx
+
+  # Long backfill that can be resumed after a crash or network loss
+  python analyze_market_maker_fees.py -a --start-date 2025-01-01 --journal backfill.journal
+  python analyze_market_maker_fees.py -a --start-date 2025-01-01 --journal backfill.journal --resume
+
+  # Per-trade cost percentiles, saved so later runs can merge them
+  python analyze_market_maker_fees.py --start-date 2026-01-01 -H --quantiles --save-sketches jan.sketch.json
+  python analyze_market_maker_fees.py --start-date 2026-02-01 --merge-sketches jan.sketch.json
+
+  # Bounded-memory unique-wallet counts for long all-wallet runs
+  python analyze_market_maker_fees.py -a -H --hll --start-date 2025-01-01
+
+  # Use environment variables for API keys (a comma-separated pool spreads Arbiscan requests over keys)
   export ARBISCAN_API_KEY="your_key"
+  export ARBISCAN_API_KEYS="key1,key2,paid_key@10"
   export ALCHEMY_URL="https://arb-mainnet.g.alchemy.com/v2/your_key"
   python analyze_market_maker_fees.py --start-date 2026-01-01
 
 Environment Variables:
   ARBISCAN_API_KEY      Arbiscan/Etherscan API key
+  ARBISCAN_API_KEYS     Comma-separated Arbiscan key pool (takes precedence over ARBISCAN_API_KEY)
   ALCHEMY_URL           Alchemy node URL for Arbitrum
   FUTURES_CONTRACT      Futures contract address
   MARKET_MAKER_WALLET   Market maker wallet address
+  EVENT_ARCHIVE_DIR     Decoded-event archive directory
+  ANALYZER_CACHE_DIR    Response cache directory
+  METRICS_NAMESPACE     Namespace for --emit-metrics (default FuturesMarketplace/analyzer)
+  TRACE_RPC_URL         Node with debug_traceTransaction for --trace-gas (default ALCHEMY_URL)
         """,
     )
 
     parser.add_argument(
         "--arbiscan-api-key",
         default=DEFAULT_CONFIG["ARBISCAN_API_KEY"],
-        help="Arbiscan API key",
+        help="Arbiscan API key, or a comma-separated pool (KEY@RATE sets a key's calls per second; "
+        "or ARBISCAN_API_KEYS env var)",
+    )
+    parser.add_argument(
+        "--arbiscan-key-selection",
+        choices=ArbiscanClient.SELECTIONS,
+        default="round-robin",
+        help="How requests are spread over a pool of Arbiscan keys (default: round-robin)",
     )
     parser.add_argument(
         "--alchemy-url",
@@ -1068,8 +4615,11 @@ Environment Variables:
     )
     parser.add_argument(
         "--futures-contract",
-        default=DEFAULT_CONFIG["FUTURES_CONTRACT"],
-        help="Futures contract address",
+        nargs="+",
+        default=[DEFAULT_CONFIG["FUTURES_CONTRACT"]],
+        metavar="[LABEL=]ADDRESS[:WALLET]",
+        help="Futures contract address. Several deployments are analyzed in one run "
+        "(shared clients, cache and block range) and get a Contract column",
     )
     parser.add_argument(
         "--market-maker-wallet",
@@ -1110,6 +4660,11 @@ Environment Variables:
         type=str,
         help="Analyze a single transaction by hash",
     )
+    parser.add_argument(
+        "--tx-file",
+        type=str,
+        help="Analyze a list of transaction hashes (one per line, '-' for stdin), fetched in batches",
+    )
     parser.add_argument(
         "--output",
         "-o",
@@ -1123,31 +4678,354 @@ Environment Variables:
         action="store_true",
         help="Suppress verbose output",
     )
+    parser.add_argument(
+        "--archive",
+        type=str,
+        default=DEFAULT_CONFIG["EVENT_ARCHIVE_DIR"],
+        help="Directory of the decoded-event archive; analyzed transactions are appended to it",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=DEFAULT_CONFIG["ANALYZER_CACHE_DIR"],
+        help="Directory for the response cache (transactions, receipts, blocks, ETH price)",
+    )
+    parser.add_argument(
+        "--from-archive",
+        action="store_true",
+        help="Re-analyze the date range from the event archive only (offline, no API calls)",
+    )
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        metavar="METHOD",
+        help=f"Only analyze these methods (names: {', '.join(METHOD_IDS)}; or 0x selectors)",
+    )
+    parser.add_argument(
+        "--wallets",
+        nargs="+",
+        metavar="[LABEL=]ADDRESS|FILE",
+        help="Analyze a set of wallets in one pass over the contract's transactions; writes per-wallet "
+        "and combined outputs (arguments are addresses or files with one address per line)",
+    )
+    parser.add_argument(
+        "--include-wallets",
+        nargs="+",
+        metavar="ADDRESS",
+        help="Only analyze transactions sent by these wallets",
+    )
+    parser.add_argument(
+        "--exclude-wallets",
+        nargs="+",
+        metavar="ADDRESS",
+        help="Skip transactions sent by these wallets",
+    )
+    parser.add_argument(
+        "--min-gas",
+        type=int,
+        help="Only analyze transactions that used at least this much gas",
+    )
+    parser.add_argument(
+        "--min-value",
+        type=float,
+        metavar="USD",
+        help="Only analyze addMargin/removeMargin moving at least this many USD (from calldata)",
+    )
+    parser.add_argument(
+        "--sample",
+        type=float,
+        metavar="RATE",
+        help="Analyze a deterministic stratified sample (by method and hour) of this fraction of the "
+        "transactions and report scaled totals with 95%% confidence intervals",
+    )
+    parser.add_argument(
+        "--scan",
+        choices=["txlist", "bloom"],
+        default="txlist",
+        help="How date-range runs find transactions: Arbiscan txlist, or block headers whose logsBloom may "
+        "hold futures events (receipts only for matching blocks; transactions without logs are not seen)",
+    )
+    parser.add_argument(
+        "--transfers",
+        choices=["receipts", "tokentx"],
+        default="receipts",
+        help="Where wUSDC / fee transfers come from in date-range runs: per-transaction receipts, or "
+        "Arbiscan tokentx in bulk (receipts are then only fetched for transactions that can emit order events)",
+    )
+    parser.add_argument(
+        "--source",
+        choices=["receipts", "subgraph"],
+        default="receipts",
+        help="Where order events come from in date-range runs: per-transaction receipts, or the project's "
+        "subgraph in bulk (with tokentx transfers, so no receipts are fetched)",
+    )
+    parser.add_argument(
+        "--subgraph-url",
+        type=str,
+        default=DEFAULT_CONFIG["SUBGRAPH_URL"],
+        help="GraphQL endpoint of the futures subgraph for --source subgraph (or SUBGRAPH_URL env var)",
+    )
+    parser.add_argument(
+        "--state-snapshots",
+        choices=["hourly"],
+        help="Read market price and wallet margin state at the end of every hour via Multicall3 "
+        "and add it to the hourly CSV (implies --hourly)",
+    )
+    parser.add_argument(
+        "--snapshot-wallets",
+        nargs="+",
+        metavar="ADDRESS",
+        help="Wallets whose margin state is snapshotted (default: the market maker wallet); "
+        "the hourly CSV shows their sum",
+    )
+    parser.add_argument(
+        "--emit-metrics",
+        choices=METRICS_EXTENSIONS,
+        help="Write hourly fees, gas, orders and transactions (total, per method, per wallet) as CloudWatch "
+        "EMF, StatsD or OpenMetrics for monitoring",
+    )
+    parser.add_argument(
+        "--metrics-target",
+        type=str,
+        metavar="TARGET",
+        help="Where --emit-metrics writes: a file (default: <output>_metrics.jsonl/.statsd/.prom), '-' for "
+        "stdout, cloudwatch://LOG_GROUP/LOG_STREAM (emf, needs boto3) or udp://HOST:PORT (statsd)",
+    )
+    parser.add_argument(
+        "--metrics-namespace",
+        type=str,
+        default=DEFAULT_CONFIG["METRICS_NAMESPACE"],
+        help="CloudWatch namespace (and StatsD/OpenMetrics prefix) for --emit-metrics (or METRICS_NAMESPACE env var)",
+    )
+    parser.add_argument(
+        "--trace-gas",
+        action="store_true",
+        help="Trace every multicall (debug_traceTransaction callTracer, in batches) and attribute its gas to "
+        "createOrder / closeOrder / ... subcalls, with matched orders shown separately; writes <output>_subcalls.csv",
+    )
+    parser.add_argument(
+        "--trace-url",
+        type=str,
+        default=DEFAULT_CONFIG["TRACE_RPC_URL"],
+        help="Node with the debug API for --trace-gas, e.g. a local node (default: --alchemy-url; "
+        "or TRACE_RPC_URL env var)",
+    )
+    parser.add_argument(
+        "--traces",
+        type=str,
+        metavar="FILE",
+        help="Recorded traces for --trace-gas (JSON Lines of hash and callTracer result): recorded "
+        "transactions are not traced again and new traces are appended",
+    )
+    parser.add_argument(
+        "--batch-curve",
+        action="store_true",
+        help="Group multicalls by orders created + closed, fit fixed and marginal gas and fee cost per "
+        "order and report the batch size with the lowest cost per order (needs numpy)",
+    )
+    parser.add_argument(
+        "--cohorts",
+        action="store_true",
+        help="Group orders created, fills (positions created) and the fees and gas they absorbed by "
+        "delivery date and price tick; writes <output>_cohorts.csv (needs numpy)",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        metavar="FILE",
+        help="Write-ahead journal of analyzed transactions, flushed in batches during date-range runs",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume from --journal: journaled transactions are not re-analyzed and the journaled "
+        "ETH price is reused, so outputs match an uninterrupted run",
+    )
+    parser.add_argument(
+        "--quantiles",
+        action="store_true",
+        help="Report p50/p95/p99 of gas, fees and orders per transaction (summary and hourly CSV)",
+    )
+    parser.add_argument(
+        "--rolling",
+        action="store_true",
+        help="Add trailing 1h/24h/7d gas, fees, orders and gas per trade at the end of every hour to the "
+        "hourly CSV and summary (implies --hourly; windows start empty at --start-date, and rows whose windows "
+        "reach back before it list them in a Partial Windows column)",
+    )
+    parser.add_argument(
+        "--hll",
+        action="store_true",
+        help="Count unique wallets with fixed-size HyperLogLog registers (per hour, day, week and run) "
+        "and keep only the top wallets",
+    )
+    parser.add_argument(
+        "--save-sketches",
+        type=str,
+        metavar="FILE",
+        help="Save the quantile and/or HyperLogLog sketches to a JSON file (implies --quantiles without --hll)",
+    )
+    parser.add_argument(
+        "--merge-sketches",
+        nargs="+",
+        metavar="FILE",
+        help="Merge sketches saved by other runs into the percentiles and unique-wallet counts "
+        "(implies --quantiles without --hll)",
+    )
 
     args = parser.parse_args()
 
-    # Validate required parameters
-    if not args.arbiscan_api_key:
-        print("Error: Arbiscan API key is required. Set via --arbiscan-api-key or ARBISCAN_API_KEY env var.")
+    if args.from_archive and not args.archive:
+        print("Error: --from-archive requires --archive DIR or EVENT_ARCHIVE_DIR env var.")
+        sys.exit(1)
+
+    # Validate required parameters (re-analysis from the archive runs offline)
+    if not args.from_archive:
+        if not args.arbiscan_api_key:
+            print("Error: Arbiscan API key is required. Set via --arbiscan-api-key or ARBISCAN_API_KEY env var.")
+            sys.exit(1)
+
+        if not args.alchemy_url:
+            print("Error: Alchemy URL is required. Set via --alchemy-url or ALCHEMY_URL env var.")
+            sys.exit(1)
+
+    # Receipts and archived events are decoded with the layouts in the contract ABIs
+    if args.source != "subgraph":
+        missing = [str(path) for path in abi_paths(DEFAULT_CONFIG["FUTURES_ABI_DIR"] or None) if not path.is_file()]
+        if missing:
+            print(f"Error: Contract ABI not found: {', '.join(missing)}. "
+                  "Set FUTURES_ABI_DIR to the directory holding Futures.json and IERC20.json.")
+            sys.exit(1)
+
+    try:
+        arbiscan = ArbiscanClient(args.arbiscan_api_key, selection=args.arbiscan_key_selection)
+    except ValueError as e:
+        print(f"Error: {e}")
         sys.exit(1)
 
-    if not args.alchemy_url:
-        print("Error: Alchemy URL is required. Set via --alchemy-url or ALCHEMY_URL env var.")
+    try:
+        deployments = [Deployment.parse(spec) for spec in args.futures_contract]
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    multi_deployment = len(deployments) > 1
+    if multi_deployment and (args.tx or args.tx_file):
+        print("Error: Several --futures-contract deployments are only supported for date-range runs.")
+        sys.exit(1)
+    if deployments[0].wallet:
+        args.market_maker_wallet = deployments[0].wallet
+    if args.resume and not args.journal:
+        print("Error: --resume requires --journal FILE.")
+        sys.exit(1)
+    if args.journal and (args.tx or args.tx_file or args.from_archive):
+        print("Error: --journal is only supported for date-range runs.")
+        sys.exit(1)
+    wallet_set: dict[str, str] = {}
+    if args.wallets:
+        if args.tx or args.tx_file or args.from_archive:
+            print("Error: --wallets is only supported for date-range runs.")
+            sys.exit(1)
+        if args.include_wallets:
+            print("Error: --wallets and --include-wallets can't be combined.")
+            sys.exit(1)
+        if args.nomm:
+            print("Error: --wallets and --nomm can't be combined (leave the market maker out of the set instead).")
+            sys.exit(1)
+        try:
+            wallet_set = read_wallet_set(args.wallets)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if not wallet_set:
+            print("Error: No wallets to analyze")
+            sys.exit(1)
+        # One pass over the contract's stream, kept to the set by sender
+        args.all = True
+        args.include_wallets = list(wallet_set.values())
+        if not args.snapshot_wallets:
+            args.snapshot_wallets = list(wallet_set.values())
+    try:
+        tx_filter = build_tx_filter(
+            args.methods, args.include_wallets, args.exclude_wallets, args.min_gas, args.min_value
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if tx_filter is not None and (args.tx or args.tx_file or args.from_archive):
+        print("Error: Filter options only apply to date-range runs.")
+        sys.exit(1)
+    sample = None
+    if args.sample is not None:
+        if args.tx or args.tx_file or args.from_archive or multi_deployment:
+            print("Error: --sample only supports date-range runs of a single deployment.")
+            sys.exit(1)
+        try:
+            sample = StratifiedSample(args.sample)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    if args.state_snapshots:
+        if args.from_archive:
+            print("Error: --state-snapshots reads chain state and can't be combined with --from-archive.")
+            sys.exit(1)
+        args.hourly = True
+    if args.rolling:
+        args.hourly = True
+    if args.scan == "bloom":
+        if args.tx or args.tx_file or args.from_archive or multi_deployment:
+            print("Error: --scan bloom only supports date-range runs of a single deployment.")
+            sys.exit(1)
+        if args.transfers == "tokentx" or args.source == "subgraph":
+            print("Error: --scan bloom fetches the receipts of the blocks it matches; "
+                  "it can't be combined with --transfers tokentx or --source subgraph.")
+            sys.exit(1)
+    if (args.batch_curve or args.cohorts) and importlib.util.find_spec("numpy") is None:
+        print(f"Error: {'--batch-curve' if args.batch_curve else '--cohorts'} requires numpy (pip install numpy).")
+        sys.exit(1)
+    if args.traces and not args.trace_gas:
+        print("Error: --traces requires --trace-gas.")
         sys.exit(1)
+    if args.source == "subgraph":
+        if not args.subgraph_url:
+            print("Error: --source subgraph requires --subgraph-url or SUBGRAPH_URL env var.")
+            sys.exit(1)
+        if args.tx or args.tx_file or args.from_archive or multi_deployment:
+            print("Error: --source subgraph only supports date-range runs of a single deployment.")
+            sys.exit(1)
+        if args.archive:
+            print("Error: --source subgraph can't write the event archive (subgraph events have no log index).")
+            sys.exit(1)
 
-    # Initialize analyzer
+    # Initialize analyzer (one per deployment when several are analyzed)
     analyzer = MarketMakerAnalyzer(
-        arbiscan_api_key=args.arbiscan_api_key,
+        arbiscan=arbiscan,
         alchemy_url=args.alchemy_url,
-        futures_contract=args.futures_contract,
+        futures_contract=deployments[0].contract,
         market_maker_wallet=args.market_maker_wallet if not args.all else None,
         analyze_all_wallets=args.all,
         exclude_wallet=args.market_maker_wallet if args.nomm else None,
+        archive_dir=args.archive or None,
+        cache_dir=args.cache_dir or None,
+        transfer_source=args.transfers,
+        subgraph=SubgraphClient(args.subgraph_url) if args.source == "subgraph" else None,
+        sample=sample,
+        tx_scan=args.scan,
     )
+    analyzers = [analyzer.for_deployment(d) for d in deployments] if multi_deployment else [analyzer]
 
     results = []
+    start_date = end_date = None
 
-    if args.tx:
+    if args.tx_file:
+        # Analyze a list of transactions (file or stdin), fetched in batches
+        tx_hashes = ([args.tx] if args.tx else []) + read_tx_hashes(args.tx_file)
+        if not tx_hashes:
+            print("Error: No transaction hashes to analyze")
+            sys.exit(1)
+        if not args.quiet:
+            print(f"Analyzing {len(tx_hashes)} transactions from {'stdin' if args.tx_file == '-' else args.tx_file}")
+        results = analyzer.analyze_transaction_hashes(tx_hashes, verbose=not args.quiet)
+    elif args.tx:
         # Analyze single transaction
         if not args.quiet:
             print(f"Analyzing single transaction: {args.tx}")
@@ -1162,36 +5040,18 @@ Environment Variables:
                 sys.exit(1)
             
             # Get block details for timestamp
-            block_number = tx_details.get("blockNumber")
-            if hasattr(block_number, "real"):  # Handle AttributeDict
-                block_number = int(block_number)
-            block = analyzer.alchemy.web3.eth.get_block(block_number)
+            block = analyzer.alchemy.get_block(_to_int(tx_details.get("blockNumber")))
             
             # Build transaction dict compatible with our analyzer
-            gas_used = receipt.get("gasUsed", 0)
-            if hasattr(gas_used, "real"):
-                gas_used = int(gas_used)
-            
-            gas_price = tx_details.get("gasPrice", 0)
-            if hasattr(gas_price, "real"):
-                gas_price = int(gas_price)
-            
-            tx = {
-                "hash": args.tx,
-                "timeStamp": str(int(block.timestamp)),
-                "gasUsed": str(gas_used),
-                "gasPrice": str(gas_price),
-                "input": tx_details.get("input", "").hex() if hasattr(tx_details.get("input", ""), "hex") else tx_details.get("input", ""),
-                "to": str(tx_details.get("to", "")),
-                "from": str(tx_details.get("from", "")),
-            }
+            tx = txlist_row(args.tx, tx_details, receipt, block)
+            gas_used = int(tx["gasUsed"])
             
             if not args.quiet:
                 print(f"  From: {tx['from']}")
                 print(f"  To: {tx['to']}")
                 print(f"  Gas Used: {gas_used:,}")
 
-            analysis = analyzer.analyze_transaction(tx)
+            analysis = analyzer.analyze_transaction(tx, receipt=receipt)
             if analysis:
                 results.append(analysis)
             else:
@@ -1215,11 +5075,44 @@ Environment Variables:
             hour=23, minute=59, second=59, tzinfo=timezone.utc
         )
 
+        journal = None
+        if args.journal:
+            # The journal only replays into a run over the same data
+            params = {
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "contracts": [f"{d.label}={d.contract}:{d.wallet or ''}" for d in deployments],
+                "wallet": args.market_maker_wallet,
+                "all": args.all,
+                "nomm": args.nomm,
+                "filters": [args.methods, args.include_wallets, args.exclude_wallets, args.min_gas, args.min_value],
+            }
+            if sample is not None:
+                params["sample"] = sample.rate
+            from run_journal import JournalMismatch, RunJournal
+
+            try:
+                journal = RunJournal(args.journal, params, resume=args.resume)
+            except JournalMismatch as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            for journaled in {analyzer, *analyzers}:
+                journaled.journal = journal
+
         if not args.quiet:
             print(f"\nMarket Maker Fee Analyzer")
             print(f"=" * 40)
-            print(f"Futures Contract: {args.futures_contract}")
-            if args.all and args.nomm:
+            if multi_deployment:
+                for deployment in deployments:
+                    wallet_note = f" (wallet {deployment.wallet})" if deployment.wallet else ""
+                    print(f"Futures Contract: {deployment.label} {deployment.contract}{wallet_note}")
+            else:
+                print(f"Futures Contract: {deployments[0].contract}")
+            if wallet_set:
+                print(f"Mode:             WALLET SET ({len(wallet_set)} wallets)")
+                for label, address in wallet_set.items():
+                    print(f"                  {address}" + (f" ({label})" if label != address else ""))
+            elif args.all and args.nomm:
                 print(f"Mode:             ALL WALLETS (excluding MM)")
                 print(f"Excluded:         {args.market_maker_wallet}")
             elif args.all:
@@ -1227,13 +5120,76 @@ Environment Variables:
             else:
                 print(f"Market Maker:     {args.market_maker_wallet}")
             print(f"Date Range:       {start_date.date()} to {end_date.date()}")
+            if sample is not None:
+                print(f"Sample Rate:      {sample.rate:g} (stratified by method and hour)")
             print()
 
-        results = analyzer.analyze_date_range(start_date, end_date, verbose=not args.quiet)
+        try:
+            if multi_deployment:
+                results = analyze_deployments(
+                    analyzers, start_date, end_date, verbose=not args.quiet,
+                    from_archive=args.from_archive, filters=tx_filter,
+                )
+            elif args.from_archive:
+                results = analyzer.analyze_archive(start_date, end_date, verbose=not args.quiet)
+            else:
+                results = analyzer.analyze_date_range(
+                    start_date, end_date, verbose=not args.quiet, filters=tx_filter
+                )
+        finally:
+            # Flush what was analyzed even if the run is dying
+            if journal is not None:
+                journal.close()
+            if analyzer.archive is not None:
+                analyzer.archive.close()
+
+    if analyzer.archive is not None:
+        analyzer.archive.close()
+
+    # Transaction lookups have no date range - use the span of the results
+    if results and start_date is None:
+        start_date = min(r.timestamp for r in results).replace(minute=0, second=0, microsecond=0)
+        end_date = max(r.timestamp for r in results)
+
+    # Sampled runs: scaled totals with confidence intervals
+    estimate = sample.estimate(results) if sample is not None and results else None
+
+    # Gas per multicall subcall, from recorded and/or freshly fetched call traces
+    gas_attribution = None
+    if args.trace_gas and results:
+        trace_url = args.trace_url or args.alchemy_url
+        tracer = AlchemyClient(trace_url, cache=analyzer.cache) if trace_url else None
+        try:
+            gas_attribution = trace_gas(results, tracer, args.traces, verbose=not args.quiet)
+        except Exception as e:
+            print(f"  [Warning] Gas tracing failed: {e}")
+
+    # Cost by multicall batch size (numpy group-by over the result columns)
+    batches = batch_curve(results) if args.batch_curve and results else None
+
+    # Sketches: one aggregator over the run, plus sketches saved by other runs
+    quantiles = args.quantiles or (bool(args.save_sketches or args.merge_sketches) and not args.hll)
+    report = None
+    if quantiles or args.hll or args.rolling or args.cohorts:
+        report = aggregate(
+            results, start_date, end_date,
+            quantiles=quantiles, hll=args.hll, rolling=args.rolling, cohorts=args.cohorts,
+        )
+        for path in args.merge_sketches or []:
+            try:
+                with open(path) as f:
+                    report.merge_sketch_state(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"  [Warning] Could not merge sketches from {path}: {e}")
+        if args.save_sketches:
+            with open(args.save_sketches, "w") as f:
+                json.dump(report.sketch_state(), f, separators=(",", ":"))
+            if not args.quiet:
+                print(f"\nSketches written to: {args.save_sketches}")
 
     # Write CSV output
     if results:
-        write_csv(results, args.output)
+        write_csv(results, args.output, include_contract=multi_deployment, include_weight=sample is not None)
         if not args.quiet:
             print(f"\nResults written to: {args.output}")
         
@@ -1242,18 +5198,110 @@ Environment Variables:
             # Generate hourly filename by inserting _hourly before extension
             base, ext = os.path.splitext(args.output)
             hourly_output = f"{base}_hourly{ext}"
-            write_hourly_csv(results, hourly_output, start_date, end_date)
+            snapshots = None
+            if args.state_snapshots:
+                snapshots = read_state_snapshots(args, analyzers, deployments, start_date, end_date)
+            write_hourly_csv(
+                report if report and not multi_deployment else results, hourly_output, start_date, end_date,
+                contracts=[d.label for d in deployments] if multi_deployment else None,
+                quantiles=quantiles,
+                hll=args.hll,
+                snapshots=snapshots,
+                sample=estimate,
+                rolling=args.rolling,
+            )
             if not args.quiet:
                 # Calculate expected hours
                 hours_in_range = int((end_date - start_date).total_seconds() / 3600) + 1
                 print(f"Hourly summary written to: {hourly_output} ({hours_in_range} hours)")
 
+        if args.cohorts:
+            base, ext = os.path.splitext(args.output)
+            cohorts_output = f"{base}_cohorts{ext}"
+            cohort_rows = report.cohort_table()
+            write_cohort_csv(cohort_rows, cohorts_output)
+            if not args.quiet:
+                print(f"Cohorts written to: {cohorts_output} ({len(cohort_rows)} delivery date/price cohorts)")
+
+        if gas_attribution is not None and gas_attribution.transactions:
+            base, ext = os.path.splitext(args.output)
+            subcalls_output = f"{base}_subcalls{ext}"
+            write_gas_attribution_csv(gas_attribution, subcalls_output)
+            if not args.quiet:
+                print(f"Subcall gas written to: {subcalls_output} ({gas_attribution.transactions:,.0f} multicalls)")
+
+        if args.emit_metrics:
+            base, ext = os.path.splitext(args.output)
+            metrics_target = args.metrics_target or f"{base}_metrics{METRICS_EXTENSIONS[args.emit_metrics]}"
+            points = hourly_metric_points(results, start_date, end_date)
+            try:
+                from metrics_sink import emit as emit_metrics
+
+                written = emit_metrics(points, args.emit_metrics, metrics_target, args.metrics_namespace)
+            except (ImportError, OSError, ValueError) as e:
+                print(f"  [Warning] Could not emit metrics to {metrics_target}: {e}")
+            else:
+                if not args.quiet and metrics_target != "-":
+                    unit = {"emf": "log events", "statsd": "datagrams", "prom": "lines"}[args.emit_metrics]
+                    if metrics_target.startswith("cloudwatch://"):
+                        unit = "PutLogEvents batches"
+                    print(f"Metrics written to: {metrics_target} ({len(points):,d} points, {written:,d} {unit})")
+
+    # Wallet-set runs: split the combined results by sender in one pass
+    by_wallet: dict[str, list[TransactionAnalysis]] = {}
+    if wallet_set:
+        for r in results:
+            by_wallet.setdefault(r.wallet.lower(), []).append(r)
+    if wallet_set and results:
+        base, ext = os.path.splitext(args.output)
+        file_labels = wallet_file_labels(wallet_set)
+        for label, address in wallet_set.items():
+            wallet_results = by_wallet.get(address, [])
+            write_csv(
+                wallet_results, f"{base}_{file_labels[label]}{ext}",
+                include_contract=multi_deployment, include_weight=sample is not None,
+            )
+            if args.hourly:
+                write_hourly_csv(
+                    wallet_results, f"{base}_{file_labels[label]}_hourly{ext}", start_date, end_date,
+                    contracts=[d.label for d in deployments] if multi_deployment else None,
+                    quantiles=quantiles,
+                    hll=args.hll,
+                    rolling=args.rolling,
+                )
+        if not args.quiet:
+            print(f"Per-wallet results written to: {base}_<wallet>{ext} ({len(wallet_set)} wallets)")
+
     # Print summary
     if not args.quiet:
+        show_wallet_breakdown = args.all or (bool(args.tx_file) and len({r.wallet.lower() for r in results}) > 1)
+        if wallet_set:
+            for label, address in wallet_set.items():
+                print(f"\nWALLET: {label}" + (f" ({address})" if label != address else ""))
+                print_summary(
+                    by_wallet.get(address, []), wallet_address=address,
+                    quantiles=quantiles, hll=args.hll, rolling=args.rolling,
+                )
+            print(f"\nALL WALLETS ({len(wallet_set)})")
+        elif multi_deployment:
+            for deployment in deployments:
+                print(f"\nDEPLOYMENT: {deployment.label} ({deployment.contract})")
+                print_summary(
+                    [r for r in results if r.contract == deployment.label],
+                    show_wallet_breakdown=show_wallet_breakdown,
+                    wallet_address=(deployment.wallet or args.market_maker_wallet) if not show_wallet_breakdown else None,
+                    quantiles=quantiles,
+                    hll=args.hll,
+                    rolling=args.rolling,
+                )
+            print("\nALL DEPLOYMENTS")
         print_summary(
-            results, 
-            show_wallet_breakdown=args.all,
-            wallet_address=args.market_maker_wallet if not args.all else None
+            report or results, 
+            show_wallet_breakdown=show_wallet_breakdown,
+            wallet_address=args.market_maker_wallet if not (show_wallet_breakdown or multi_deployment) else None,
+            sample=estimate,
+            gas_attribution=gas_attribution,
+            batches=batches,
         )
 
 
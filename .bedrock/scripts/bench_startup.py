@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for analyze_market_maker_fees.py
+
+Times fresh interpreter runs of the analyzer for the paths that should never
+load web3/requests:
+- importing the module
+- --help
+- a --tx lookup served entirely from a pre-seeded response cache
+
+Usage:
+    python bench_startup.py              # 10 runs per case, 200 ms target
+    python bench_startup.py -n 20 --target-ms 150
+
+Exits non-zero if the cached --tx lookup median exceeds the target.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+ANALYZER = SCRIPT_DIR / "analyze_market_maker_fees.py"
+
+sys.path.insert(0, str(SCRIPT_DIR))
+from response_cache import ResponseCache  # noqa: E402
+
+FUTURES_CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+WALLET = "0xc1e187e4a677da017ecfac011c9d381c3e7baee4"
+TX_HASH = "0x" + "11" * 32
+BLOCK = 420_000_000
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+def seed_cache(cache_dir: str):
+    """Store a synthetic addMargin transaction, its receipt, block and the ETH price."""
+    cache = ResponseCache(cache_dir)
+    cache.put("tx", TX_HASH, {
+        "hash": TX_HASH,
+        "blockNumber": BLOCK,
+        "from": WALLET,
+        "to": FUTURES_CONTRACT,
+        "gasPrice": 10_000_000,
+        "input": "0xa43be948" + f"{5_000_000:064x}",
+    }, block=BLOCK)
+    cache.put("receipt", TX_HASH, {
+        "blockNumber": BLOCK,
+        "transactionIndex": 1,
+        "gasUsed": 250_000,
+        "status": 1,
+        "logs": [{
+            "address": FUTURES_CONTRACT,
+            "logIndex": 0,
+            "topics": [TRANSFER_TOPIC, "0x" + WALLET[2:].rjust(64, "0"), "0x" + FUTURES_CONTRACT[2:].rjust(64, "0")],
+            "data": "0x" + f"{5_000_000:064x}",
+        }],
+    }, block=BLOCK)
+    cache.put("block", str(BLOCK), {"number": BLOCK, "timestamp": 1_767_225_600}, block=BLOCK)
+    cache.put("eth_price", "current", 3300.0)
+    cache.close()
+
+
+def time_runs(cmd: list[str], runs: int, env: dict) -> list[float]:
+    """Wall-clock milliseconds of each run."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analyzer startup time")
+    parser.add_argument("-n", "--runs", type=int, default=10, help="Runs per case")
+    parser.add_argument("--target-ms", type=float, default=200.0, help="Target median for the cached --tx lookup")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        seed_cache(cache_dir)
+
+        env = dict(os.environ)
+        env.update({
+            "ARBISCAN_API_KEY": "offline",
+            "ALCHEMY_URL": "http://127.0.0.1:9",  # unroutable - any network access fails loudly
+            "FUTURES_CONTRACT": FUTURES_CONTRACT,
+            "ANALYZER_CACHE_DIR": cache_dir,
+        })
+
+        python = sys.executable
+        cases = [
+            ("python startup (baseline)", [python, "-c", "pass"]),
+            ("import analyzer", [python, "-c", f"import sys; sys.path.insert(0, {str(SCRIPT_DIR)!r}); import analyze_market_maker_fees"]),
+            ("--help", [python, str(ANALYZER), "--help"]),
+            ("cached --tx lookup", [python, str(ANALYZER), "--tx", TX_HASH, "-q", "-o", os.path.join(tmp, "out.csv")]),
+        ]
+
+        print(f"{'case':30s} {'min':>9s} {'median':>9s} {'max':>9s}")
+        medians = {}
+        for name, cmd in cases:
+            timings = time_runs(cmd, args.runs, env)
+            medians[name] = statistics.median(timings)
+            print(f"{name:30s} {min(timings):7.1f}ms {medians[name]:7.1f}ms {max(timings):7.1f}ms")
+
+    lookup = medians["cached --tx lookup"]
+    if lookup > args.target_ms:
+        print(f"\nFAIL: cached --tx lookup median {lookup:.1f}ms exceeds {args.target_ms:.0f}ms target")
+        sys.exit(1)
+    print(f"\nOK: cached --tx lookup median {lookup:.1f}ms (target {args.target_ms:.0f}ms)")
+
+
+if __name__ == "__main__":
+    main()
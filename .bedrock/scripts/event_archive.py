@@ -0,0 +1,340 @@
+"""
+Decoded Event Archive
+
+Append-only, fixed-width binary archive of decoded futures-contract events.
+Every transaction the analyzer looks at is stored as one header record followed
+by one record per decoded log. Records are 128 bytes wide and grouped into
+segment files by block range, so a re-analysis can mmap the relevant segments
+and walk them with struct.iter_unpack instead of re-fetching receipts.
+
+Headers carry the number of event records that follow them, so a transaction
+torn by a crash mid-write is recognised as incomplete: it is not reported as
+archived, scans skip it, and the next append truncates it away. A transaction
+with more than COUNT_MAX event records is rejected.
+
+Record layout (little endian, 128 bytes):
+    block         uint64
+    timestamp     uint32
+    tx_index      uint32
+    log_index     uint32   (HEADER_LOG_INDEX for the transaction header)
+    kind          uint8    (KIND_* below)
+    flags         uint8    (FLAG_* below)
+    count         uint16   (header: event records that follow)
+    participant   20 bytes
+    counterparty  20 bytes
+    amount0..3    4 x uint64
+    ref           32 bytes (tx hash, order id, position id, ...)
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+RECORD = struct.Struct("<QIIIBBH20s20sQQQQ32s")
+RECORD_SIZE = RECORD.size  # 128
+
+# Field positions in an unpacked record tuple
+F_BLOCK = 0
+F_TIMESTAMP = 1
+F_TX_INDEX = 2
+F_LOG_INDEX = 3
+F_KIND = 4
+F_FLAGS = 5
+F_COUNT = 6
+F_PARTICIPANT = 7
+F_COUNTERPARTY = 8
+F_AMOUNT0 = 9
+F_AMOUNT1 = 10
+F_AMOUNT2 = 11
+F_AMOUNT3 = 12
+F_REF = 13
+
+# Blocks per segment file (~3 days of Arbitrum blocks)
+SEGMENT_BLOCKS = 1_000_000
+SEGMENT_SUFFIX = ".evt"
+
+# Transactions buffered before a flush + fsync
+DEFAULT_BATCH_SIZE = 100
+# Upper bound on how long a buffered transaction waits for its flush (seconds)
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+HEADER_LOG_INDEX = 0xFFFFFFFF
+UINT64_MAX = 2**64 - 1
+COUNT_MAX = 0xFFFF  # Event records per transaction (the header's count field)
+
+# Record kinds. Values are persisted - only ever append new kinds.
+KIND_TX = 0
+KIND_TRANSFER = 1
+KIND_ORDER_CREATED = 2
+KIND_ORDER_CLOSED = 3
+KIND_POSITION_CREATED = 4
+KIND_POSITION_EXITED = 5
+KIND_POSITION_CLOSED = 6
+KIND_POSITION_DELIVERY_CLOSED = 7
+KIND_POSITION_PAID = 8
+KIND_POSITION_PAYMENT_RECEIVED = 9
+KIND_ORDER_FEE_UPDATED = 10
+
+# Flag bits
+FLAG_IS_BUY = 0x01
+FLAG_FAILED = 0x02
+FLAG_NEGATIVE = 0x04  # amount0 holds the magnitude of a negative value (PositionExited pnl)
+FLAG_OVERFLOW = 0x80  # an amount did not fit in uint64 and was clamped
+
+ZERO_ADDRESS = b"\x00" * 20
+ZERO_REF = b"\x00" * 32
+
+
+def clamp_u64(value: int) -> tuple[int, bool]:
+    """Clamp an integer into the uint64 range, reporting whether it overflowed."""
+    if value < 0:
+        return 0, True
+    if value > UINT64_MAX:
+        return UINT64_MAX, True
+    return value, False
+
+
+def _complete(header: tuple, events: list[tuple]) -> bool:
+    """Whether a transaction's event records are all present."""
+    return len(events) == header[F_COUNT]
+
+
+def segment_start(block: int) -> int:
+    """First block of the segment that holds `block`."""
+    return block - (block % SEGMENT_BLOCKS)
+
+
+class EventArchive:
+    """
+    Directory of block-range segment files holding fixed-width event records.
+
+    Appended transactions are buffered and written with one fsync per segment
+    in batches (every `batch_size` transactions or `flush_interval` seconds,
+    and on flush/close), so a crash loses at most the unflushed batch.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # segment start -> set of tx hashes archived in that segment (written or buffered)
+        self._archived: dict[int, set[bytes]] = {}
+        # segment start -> byte offset where its last complete transaction ends
+        self._ends: dict[int, int] = {}
+        # segment start -> buffered (tx hash, records) not yet written
+        self._pending: dict[int, list[tuple[bytes, bytes]]] = {}
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+        # Analyzers for several deployments may share one archive across threads
+        self._lock = threading.Lock()
+
+    def segment_path(self, start: int) -> Path:
+        return self.directory / f"seg-{start:012d}{SEGMENT_SUFFIX}"
+
+    def segments(self, from_block: int = 0, to_block: Optional[int] = None) -> list[tuple[int, Path]]:
+        """Segment files overlapping the block range, ordered by start block."""
+        found = []
+        for path in self.directory.glob(f"seg-*{SEGMENT_SUFFIX}"):
+            try:
+                start = int(path.stem.split("-", 1)[1])
+            except ValueError:
+                continue
+            if start + SEGMENT_BLOCKS <= from_block:
+                continue
+            if to_block is not None and start > to_block:
+                continue
+            found.append((start, path))
+        return sorted(found)
+
+    def _load_segment(self, start: int) -> set[bytes]:
+        """Read a segment's complete tx hashes and where its complete data ends."""
+        hashes = set()
+        end = 0
+        for offset, header, events, complete in self._iter_transactions(self.segment_path(start)):
+            if complete:
+                hashes.add(header[F_REF])
+                end = offset + RECORD_SIZE * (len(events) + 1)
+        self._archived[start] = hashes
+        self._ends[start] = end
+        return hashes
+
+    def _archived_hashes(self, start: int) -> set[bytes]:
+        """Tx hashes present in a segment (loaded once per segment, then kept up to date)."""
+        hashes = self._archived.get(start)
+        return self._load_segment(start) if hashes is None else hashes
+
+    def contains(self, block: int, tx_hash: bytes) -> bool:
+        """Whether a transaction has already been archived."""
+        return tx_hash in self._archived_hashes(segment_start(block))
+
+    def append(self, header: tuple, events: list[tuple]) -> bool:
+        """
+        Append one transaction (header record + event records).
+
+        Records are plain tuples in RECORD field order; the header's count
+        field is filled in here. Transactions that are already archived are
+        skipped so re-running a range never duplicates data. The records are
+        buffered until the next flush.
+        Returns True if the transaction was added; raises ValueError for a
+        transaction with more event records than the count field holds.
+        """
+        block = header[F_BLOCK]
+        tx_hash = header[F_REF]
+        start = segment_start(block)
+        if len(events) > COUNT_MAX:
+            raise ValueError(f"0x{tx_hash.hex()} has {len(events)} events; the archive holds at most {COUNT_MAX}")
+        header = (*header[:F_COUNT], len(events), *header[F_COUNT + 1:])
+        payload = b"".join(RECORD.pack(*record) for record in [header, *events])
+
+        with self._lock:
+            hashes = self._archived_hashes(start)
+            if tx_hash in hashes:
+                return False
+            self._pending.setdefault(start, []).append((tx_hash, payload))
+            self._pending_count += 1
+            hashes.add(tx_hash)
+            if (
+                self._pending_count >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self._flush_locked()
+        return True
+
+    def _flush_locked(self):
+        for start, pending in self._pending.items():
+            with open(self.segment_path(start), "ab") as f:
+                if f.tell() != self._ends[start]:
+                    # Another writer appended since the segment was read, or a crash
+                    # left a torn transaction at the end: re-read, then cut the tail
+                    on_disk = self._load_segment(start)
+                    pending = [(tx_hash, payload) for tx_hash, payload in pending if tx_hash not in on_disk]
+                    self._archived[start] |= {tx_hash for tx_hash, _ in pending}
+                    f.truncate(self._ends[start])
+                    f.seek(0, os.SEEK_END)
+                payload = b"".join(payload for _, payload in pending)
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            self._ends[start] += len(payload)
+        self._pending = {}
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Write and fsync every buffered transaction."""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self.flush()
+
+    def block_bounds(self, start_timestamp: int, end_timestamp: Optional[int] = None) -> tuple[int, Optional[int]]:
+        """
+        A block range that holds every archived transaction in the time range.
+
+        Block timestamps never decrease, so the first record of each segment
+        (always a transaction header) bounds the range from both sides. Only
+        those records are read, and a scan with the returned blocks opens
+        the segments that can overlap the time range plus at most one on
+        either side.
+        """
+        self.flush()
+        from_block, to_block = 0, None
+        for _, path in self.segments():
+            with open(path, "rb") as f:
+                first = f.read(RECORD_SIZE)
+            if len(first) < RECORD_SIZE:
+                continue
+            record = RECORD.unpack(first)
+            if record[F_LOG_INDEX] != HEADER_LOG_INDEX:
+                continue
+            block, timestamp = record[F_BLOCK], record[F_TIMESTAMP]
+            if timestamp < start_timestamp:
+                from_block = max(from_block, block + 1)
+            if end_timestamp is not None and timestamp > end_timestamp:
+                to_block = block - 1 if to_block is None else min(to_block, block - 1)
+        return from_block, to_block
+
+    @staticmethod
+    def _iter_segment(path: Path) -> Iterator[tuple]:
+        """Iterate the complete records of a segment file through a read-only mmap."""
+        if not path.exists():
+            return
+        size = path.stat().st_size
+        usable = size - (size % RECORD_SIZE)
+        if usable == 0:
+            return
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                yield from RECORD.iter_unpack(view[:usable])
+            finally:
+                view.release()
+
+    @classmethod
+    def _iter_transactions(cls, path: Path) -> Iterator[tuple[int, tuple, list[tuple], bool]]:
+        """
+        (byte offset, header, events, complete) per transaction in file order.
+
+        Event records always directly follow their header, and a transaction
+        is complete once as many are present as its header counts.
+        """
+        current: Optional[tuple[int, tuple, list[tuple]]] = None
+        for index, record in enumerate(cls._iter_segment(path)):
+            if record[F_LOG_INDEX] == HEADER_LOG_INDEX:
+                if current is not None:
+                    yield (*current, _complete(current[1], current[2]))
+                current = (index * RECORD_SIZE, record, [])
+            elif current is not None:
+                current[2].append(record)
+        if current is not None:
+            yield (*current, _complete(current[1], current[2]))
+
+    def scan(
+        self,
+        from_block: int = 0,
+        to_block: Optional[int] = None,
+        start_timestamp: int = 0,
+        end_timestamp: Optional[int] = None,
+    ) -> Iterator[tuple[tuple, list[tuple]]]:
+        """
+        Yield (header, events) per archived transaction inside the block and time range.
+
+        Transactions come out ordered by (block, tx_index) regardless of the
+        order in which runs appended them. Incomplete (torn) transactions are skipped.
+        Buffered appends are flushed first.
+        """
+        self.flush()
+        for _, path in self.segments(from_block, to_block):
+            grouped: dict[bytes, tuple[tuple, list[tuple]]] = {}
+            for _, header, events, complete in self._iter_transactions(path):
+                block, timestamp = header[F_BLOCK], header[F_TIMESTAMP]
+                if not complete:
+                    continue
+                if block < from_block or (to_block is not None and block > to_block):
+                    continue
+                if timestamp < start_timestamp or (end_timestamp is not None and timestamp > end_timestamp):
+                    continue
+                grouped[header[F_REF]] = (header, events)
+            yield from sorted(grouped.values(), key=lambda item: (item[0][F_BLOCK], item[0][F_TX_INDEX]))
+
+    def stats(self) -> dict:
+        """Segment count, record count and size on disk (after flushing buffered appends)."""
+        self.flush()
+        segments = self.segments()
+        size = sum(path.stat().st_size for _, path in segments)
+        return {
+            "segments": len(segments),
+            "records": size // RECORD_SIZE,
+            "bytes": size,
+        }
@@ -0,0 +1,202 @@
+"""
+Event Registry
+
+Receipt log decoders generated from the contract ABIs in contracts/abi, so the
+ABI files stay the single source of truth for topic hashes and layouts (and
+for the function selectors that name decoded calls).
+
+Each event in the ABI becomes an EventDecoder with its topic0 and a
+precompiled layout: indexed arguments are read from the topics, and the
+static head of the data section is split by one prebuilt struct.Struct into
+32-byte words that per-field converters turn into values. Dynamic fields
+(string, bytes) follow their head offset. The registry maps topic0 to its
+decoder, so dispatching a log is a single dict lookup.
+
+Decoded arguments use snake_case names (orderId -> order_id, destURL ->
+dest_url), addresses and bytes32 values as lowercase 0x strings, and integers
+as raw ints.
+"""
+
+import json
+import re
+import struct
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from abi_codec import event_topic, function_selector
+
+_WORD = 32
+
+# Default ABI location: contracts/abi at the repository root
+ABI_DIR = Path(__file__).resolve().parents[2] / "contracts" / "abi"
+ABI_FILES = ("Futures.json", "IERC20.json")
+
+
+def snake_case(name: str) -> str:
+    """ABI argument name -> snake_case key (destURL -> dest_url)."""
+    return re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name).lower()
+
+
+def _canonical_type(param: dict) -> str:
+    """Canonical ABI type for signatures (tuples expanded to their components)."""
+    abi_type = param["type"]
+    if abi_type.startswith("tuple"):
+        return "(" + ",".join(_canonical_type(c) for c in param["components"]) + ")" + abi_type[5:]
+    return abi_type
+
+
+def _word_converter(abi_type: str) -> Callable[[bytes], object]:
+    """Converter from one 32-byte word to a Python value."""
+    if abi_type == "address":
+        return lambda word: "0x" + word[12:].hex()
+    if abi_type == "bool":
+        return lambda word: word[-1] == 1
+    if abi_type.startswith("uint"):
+        return lambda word: int.from_bytes(word, "big")
+    if abi_type.startswith("int"):
+        return lambda word: int.from_bytes(word, "big", signed=True)
+    if abi_type.startswith("bytes"):  # bytes1..bytes32 are left aligned
+        size = int(abi_type[5:])
+        return lambda word: "0x" + word[:size].hex()
+    raise ValueError(f"Unsupported static ABI type: {abi_type}")
+
+
+def _topic_converter(abi_type: str) -> Callable[[str], object]:
+    """Converter from an indexed topic (hex string) to a Python value."""
+    if abi_type == "address":
+        return lambda topic: "0x" + topic[-40:].lower()
+    if abi_type == "bool":
+        return lambda topic: int(topic, 16) == 1
+    if abi_type.startswith("uint"):
+        return lambda topic: int(topic, 16)
+    if abi_type.startswith("int"):
+        return lambda topic: int.from_bytes(bytes.fromhex(topic[2:]), "big", signed=True)
+    # bytesN, and the keccak hash that stands in for indexed dynamic values
+    return lambda topic: topic.lower()
+
+
+def _is_dynamic(abi_type: str) -> bool:
+    return abi_type in ("string", "bytes") or abi_type.endswith("[]")
+
+
+class EventDecoder:
+    """Precompiled decoder for one event signature."""
+
+    __slots__ = ("name", "signature", "topic", "_indexed", "_head", "_static", "_dynamic")
+
+    def __init__(self, abi_entry: dict):
+        inputs = abi_entry.get("inputs", [])
+        self.name = abi_entry["name"]
+        self.signature = f"{self.name}({','.join(_canonical_type(p) for p in inputs)})"
+        self.topic = event_topic(self.signature)
+
+        # (key, converter) per indexed argument, in topic order
+        self._indexed = [
+            (snake_case(p["name"]), _topic_converter(_canonical_type(p)))
+            for p in inputs if p.get("indexed")
+        ]
+        data_params = [p for p in inputs if not p.get("indexed")]
+        # One 32-byte slot per data argument in the head; dynamic ones hold an offset
+        self._head = struct.Struct(">" + f"{_WORD}s" * len(data_params))
+        self._static: list[tuple[int, str, Callable]] = []
+        self._dynamic: list[tuple[int, str, str]] = []
+        for slot, param in enumerate(data_params):
+            abi_type = _canonical_type(param)
+            key = snake_case(param["name"])
+            if _is_dynamic(abi_type):
+                if abi_type not in ("string", "bytes"):
+                    raise ValueError(f"Unsupported dynamic ABI type in {self.signature}: {abi_type}")
+                self._dynamic.append((slot, key, abi_type))
+            elif abi_type.startswith("("):
+                raise ValueError(f"Unsupported tuple argument in {self.signature}")
+            else:
+                self._static.append((slot, key, _word_converter(abi_type)))
+
+    def decode(self, topics: list[str], data: bytes) -> Optional[dict]:
+        """
+        Decode a log's topics (hex strings, topic0 first) and data bytes.
+
+        Returns None when the log carries fewer topics than the signature
+        indexes. A short data section is zero-padded, so missing static
+        fields decode as zero rather than failing the whole log.
+        """
+        if len(topics) <= len(self._indexed):
+            return None
+        args = {key: convert(topic) for (key, convert), topic in zip(self._indexed, topics[1:])}
+
+        head_size = self._head.size
+        if len(data) < head_size:
+            data = data.ljust(head_size, b"\x00")
+        words = self._head.unpack_from(data)
+        for slot, key, convert in self._static:
+            args[key] = convert(words[slot])
+        for slot, key, abi_type in self._dynamic:
+            start = int.from_bytes(words[slot], "big")
+            length = int.from_bytes(data[start:start + _WORD], "big") if start + _WORD <= len(data) else 0
+            raw = data[start + _WORD:start + _WORD + length]
+            args[key] = raw.decode("utf-8", errors="replace") if abi_type == "string" else "0x" + raw.hex()
+        return args
+
+
+class EventRegistry:
+    """topic0 -> EventDecoder for every event in a set of ABIs."""
+
+    def __init__(self, decoders: Iterable[EventDecoder] = ()):
+        self._by_topic: dict[str, EventDecoder] = {}
+        for decoder in decoders:
+            self.register(decoder)
+
+    @classmethod
+    def from_abi_files(cls, paths: Iterable[Path]) -> "EventRegistry":
+        """Build decoders for every event in the given ABI JSON files (list or {"abi": [...]})."""
+        registry = cls()
+        for path in paths:
+            abi = json.loads(Path(path).read_text())
+            if isinstance(abi, dict):
+                abi = abi.get("abi", [])
+            for entry in abi:
+                if entry.get("type") == "event" and not entry.get("anonymous"):
+                    registry.register(EventDecoder(entry))
+        return registry
+
+    def register(self, decoder: EventDecoder):
+        # The same signature in several ABIs (ERC20 Transfer) shares one decoder
+        self._by_topic.setdefault(decoder.topic, decoder)
+
+    def get(self, topic0: str) -> Optional[EventDecoder]:
+        return self._by_topic.get(topic0)
+
+    def __contains__(self, topic0: str) -> bool:
+        return topic0 in self._by_topic
+
+    def __len__(self) -> int:
+        return len(self._by_topic)
+
+    def topics(self) -> dict[str, str]:
+        """Event name -> topic0."""
+        return {decoder.name: topic for topic, decoder in self._by_topic.items()}
+
+
+def abi_paths(abi_dir: Optional[str] = None) -> list[Path]:
+    """The ABI_FILES in abi_dir (default ABI_DIR)."""
+    directory = Path(abi_dir) if abi_dir else ABI_DIR
+    return [directory / name for name in ABI_FILES]
+
+
+def load_registry(abi_dir: Optional[str] = None) -> EventRegistry:
+    """Registry for the futures contract and the ERC20 token it moves."""
+    return EventRegistry.from_abi_files(abi_paths(abi_dir))
+
+
+def load_function_names(abi_dir: Optional[str] = None) -> dict[int, str]:
+    """4-byte selector (as int) -> function name for the futures contract and the ERC20 it moves."""
+    names: dict[int, str] = {}
+    for path in abi_paths(abi_dir):
+        abi = json.loads(path.read_text())
+        if isinstance(abi, dict):
+            abi = abi.get("abi", [])
+        for entry in abi:
+            if entry.get("type") == "function":
+                signature = f"{entry['name']}({','.join(_canonical_type(p) for p in entry.get('inputs', []))})"
+                names.setdefault(int(function_selector(signature), 16), entry["name"])
+    return names
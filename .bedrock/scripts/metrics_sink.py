@@ -0,0 +1,236 @@
+"""
+Metrics Sink
+
+Structured metric output for the analyzer's hourly aggregates, so monitoring
+can ingest cost data without parsing CSV. Each MetricPoint is one value of a
+named metric for one hour and one set of dimensions (Method, Wallet, ...).
+
+Formats:
+    emf     CloudWatch Embedded Metric Format: one JSON document per hour and
+            dimension set, holding every metric of that hour. Written one per
+            line to a file or stdout (where the awslogs driver ships it), or
+            sent to cloudwatch://LOG_GROUP/LOG_STREAM in PutLogEvents batches
+            of up to 10,000 events / 1 MiB spanning at most 24 hours.
+    statsd  DogStatsD gauge lines with tags and timestamps, packed into
+            datagrams of up to STATSD_MAX_DATAGRAM bytes, sent to
+            udp://HOST:PORT or written to a file one datagram per line.
+    prom    OpenMetrics text with timestamps, written to a file, for
+            backfilling with `promtool tsdb create-blocks-from openmetrics`.
+
+Targets are a file path or "-" for stdout unless noted above.
+"""
+
+import json
+import re
+import socket
+import sys
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, TextIO
+
+FORMATS = ("emf", "statsd", "prom")
+
+# CloudWatch Logs PutLogEvents limits (per-event overhead counts toward the batch size)
+PUT_LOG_EVENTS_MAX_EVENTS = 10_000
+PUT_LOG_EVENTS_MAX_BYTES = 1_048_576
+PUT_LOG_EVENTS_EVENT_OVERHEAD = 26
+PUT_LOG_EVENTS_MAX_SPAN = 24 * 3600
+
+# EMF limits: dimensions per dimension set, metrics per directive
+EMF_MAX_DIMENSIONS = 30
+EMF_MAX_METRICS = 100
+
+# Stay under a typical path MTU so datagrams are not fragmented
+STATSD_MAX_DATAGRAM = 1432
+
+
+@dataclass
+class MetricPoint:
+    """One metric value for one hour and dimension set."""
+
+    name: str
+    value: float
+    timestamp: int  # Unix seconds (start of the hour)
+    dimensions: dict[str, str] = field(default_factory=dict)
+    unit: str = "None"  # CloudWatch unit ("Count", "None", ...)
+
+
+def _documents(points: Iterable[MetricPoint]) -> dict[tuple, list[MetricPoint]]:
+    """Group points by (timestamp, dimensions), keeping first-seen order."""
+    groups: dict[tuple, list[MetricPoint]] = {}
+    for point in points:
+        groups.setdefault((point.timestamp, tuple(sorted(point.dimensions.items()))), []).append(point)
+    return groups
+
+
+# ============================================================================
+# EMF
+# ============================================================================
+
+
+def emf_events(points: Iterable[MetricPoint], namespace: str) -> Iterator[tuple[int, str]]:
+    """(timestamp in ms, EMF JSON document) per hour and dimension set, in time order."""
+    for (timestamp, dimensions), group in sorted(_documents(points).items(), key=lambda item: item[0][0]):
+        if len(dimensions) > EMF_MAX_DIMENSIONS:
+            raise ValueError(f"EMF allows at most {EMF_MAX_DIMENSIONS} dimensions, got {len(dimensions)}")
+        for offset in range(0, len(group), EMF_MAX_METRICS):
+            chunk = group[offset:offset + EMF_MAX_METRICS]
+            document = {
+                "_aws": {
+                    "Timestamp": timestamp * 1000,
+                    "CloudWatchMetrics": [{
+                        "Namespace": namespace,
+                        "Dimensions": [[name for name, _ in dimensions]],
+                        "Metrics": [{"Name": point.name, "Unit": point.unit} for point in chunk],
+                    }],
+                },
+                **dict(dimensions),
+                **{point.name: point.value for point in chunk},
+            }
+            yield timestamp * 1000, json.dumps(document, separators=(",", ":"))
+
+
+def put_log_events_batches(events: Iterable[tuple[int, str]]) -> Iterator[list[dict]]:
+    """Split time-ordered (timestamp ms, message) events into PutLogEvents-sized batches."""
+    batch: list[dict] = []
+    size = 0
+    for timestamp, message in events:
+        event_size = len(message.encode()) + PUT_LOG_EVENTS_EVENT_OVERHEAD
+        if batch and (
+            len(batch) >= PUT_LOG_EVENTS_MAX_EVENTS
+            or size + event_size > PUT_LOG_EVENTS_MAX_BYTES
+            or timestamp - batch[0]["timestamp"] > PUT_LOG_EVENTS_MAX_SPAN * 1000
+        ):
+            yield batch
+            batch, size = [], 0
+        batch.append({"timestamp": timestamp, "message": message})
+        size += event_size
+    if batch:
+        yield batch
+
+
+# ============================================================================
+# STATSD / OPENMETRICS
+# ============================================================================
+
+
+def _snake(name: str) -> str:
+    return re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name).lower()
+
+
+def statsd_lines(points: Iterable[MetricPoint], prefix: str) -> Iterator[str]:
+    """DogStatsD gauge lines: prefix.metric:value|g|#tag:value,...|T<unix seconds>."""
+    for point in points:
+        tags = ",".join(f"{_snake(name)}:{value}" for name, value in sorted(point.dimensions.items()))
+        line = f"{prefix}.{_snake(point.name)}:{point.value:g}|g"
+        if tags:
+            line += f"|#{tags}"
+        yield f"{line}|T{point.timestamp}"
+
+
+def statsd_datagrams(lines: Iterable[str], max_bytes: int = STATSD_MAX_DATAGRAM) -> Iterator[str]:
+    """Pack newline-separated lines into datagrams of at most max_bytes."""
+    datagram = ""
+    for line in lines:
+        if datagram and len(datagram) + 1 + len(line) > max_bytes:
+            yield datagram
+            datagram = ""
+        datagram = f"{datagram}\n{line}" if datagram else line
+    if datagram:
+        yield datagram
+
+
+def _label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def openmetrics_text(points: Iterable[MetricPoint], prefix: str) -> Iterator[str]:
+    """OpenMetrics gauge families ending with # EOF (each series contiguous and in time order)."""
+    families: dict[str, list[MetricPoint]] = {}
+    for point in points:
+        families.setdefault(f"{prefix}_{_snake(point.name)}", []).append(point)
+    for name, samples in families.items():
+        yield f"# TYPE {name} gauge"
+        for point in sorted(samples, key=lambda point: (sorted(point.dimensions.items()), point.timestamp)):
+            labels = ",".join(
+                f'{_snake(key)}="{_label_value(value)}"' for key, value in sorted(point.dimensions.items())
+            )
+            series = f"{name}{{{labels}}}" if labels else name
+            yield f"{series} {point.value!r} {point.timestamp}"
+    yield "# EOF"
+
+
+# ============================================================================
+# SINKS
+# ============================================================================
+
+
+def _open_text(target: str) -> TextIO:
+    return sys.stdout if target == "-" else open(target, "w")
+
+
+def _write_lines(target: str, lines: Iterable[str]) -> int:
+    out = _open_text(target)
+    count = 0
+    try:
+        for line in lines:
+            out.write(line + "\n")
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return count
+
+
+def _put_cloudwatch(target: str, events: Iterable[tuple[int, str]]) -> int:
+    # boto3 is only needed for cloudwatch:// targets
+    import boto3
+
+    group, _, stream = target[len("cloudwatch://"):].partition("/")
+    if not group or not stream:
+        raise ValueError(f"Invalid CloudWatch Logs target: {target} (expected cloudwatch://LOG_GROUP/LOG_STREAM)")
+    logs = boto3.client("logs")
+    try:
+        logs.create_log_stream(logGroupName=group, logStreamName=stream)
+    except logs.exceptions.ResourceAlreadyExistsException:
+        pass
+    batches = 0
+    for batch in put_log_events_batches(events):
+        logs.put_log_events(logGroupName=group, logStreamName=stream, logEvents=batch)
+        batches += 1
+    return batches
+
+
+def _send_udp(target: str, datagrams: Iterable[str]) -> int:
+    host, _, port = target[len("udp://"):].rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid StatsD target: {target} (expected udp://HOST:PORT)")
+    count = 0
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for datagram in datagrams:
+            sock.sendto(datagram.encode(), (host, int(port)))
+            count += 1
+    return count
+
+
+def emit(points: list[MetricPoint], fmt: str, target: str, namespace: str) -> int:
+    """
+    Write points in `fmt` to `target`; returns the number of units written
+    (EMF events or PutLogEvents batches, StatsD datagrams, OpenMetrics lines).
+    `namespace` is the EMF namespace, and the StatsD / OpenMetrics prefix
+    after snake-casing ("FuturesMarketplace/lmn" -> "futures_marketplace_lmn").
+    """
+    if fmt == "emf":
+        events = emf_events(points, namespace)
+        if target.startswith("cloudwatch://"):
+            return _put_cloudwatch(target, events)
+        return _write_lines(target, (message for _, message in events))
+
+    prefix = re.sub(r"[^a-z0-9_]+", "_", _snake(namespace)).strip("_")
+    if fmt == "statsd":
+        datagrams = statsd_datagrams(statsd_lines(points, prefix))
+        if target.startswith("udp://"):
+            return _send_udp(target, datagrams)
+        return _write_lines(target, datagrams)
+    if fmt == "prom":
+        return _write_lines(target, openmetrics_text(points, prefix))
+    raise ValueError(f"Unknown metrics format {fmt!r} (choose from {', '.join(FORMATS)})")
@@ -0,0 +1,172 @@
+"""
+Response Cache
+
+SQLite-backed cache for immutable chain data (transactions, receipts, blocks)
+plus short-lived values such as the ETH price. Entries are JSON documents
+grouped by namespace and tagged with their block number where one applies.
+
+Snapshots carry the immutable namespaces between machines: a gzip'd JSONL
+artifact with a header line, one line per entry and a trailer holding the
+entry count and a sha256 over the entry lines. Importing verifies the trailer
+before committing and never overwrites existing entries, so several
+snapshots can be merged into one cache in any order.
+"""
+
+import gzip
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Optional
+
+CACHE_FILENAME = "cache.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    block INTEGER,
+    stored_at REAL NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_block ON entries (namespace, block);
+"""
+
+SNAPSHOT_VERSION = 1
+# Immutable chain data worth carrying between runs (eth_price is short-lived)
+SNAPSHOT_NAMESPACES = ("tx", "receipt", "block", "timestamp", "state")
+
+
+class SnapshotError(Exception):
+    """A cache snapshot is malformed, truncated or fails its integrity check."""
+
+
+class ResponseCache:
+    """Namespaced key/value cache stored in a single SQLite file."""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / CACHE_FILENAME
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def get(self, namespace: str, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        """Return a cached value, or None if missing (or older than max_age seconds)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, stored_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        if row is None:
+            return None
+        if max_age is not None and time.time() - row[1] > max_age:
+            return None
+        return json.loads(row[0])
+
+    def put(self, namespace: str, key: str, value: Any, block: Optional[int] = None):
+        """Store a JSON-serializable value."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, block, stored_at, value) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, block, time.time(), json.dumps(value, separators=(",", ":"))),
+            )
+
+    def export_snapshot(
+        self,
+        fileobj: BinaryIO,
+        namespaces: Iterable[str] = SNAPSHOT_NAMESPACES,
+        from_block: Optional[int] = None,
+        to_block: Optional[int] = None,
+    ) -> int:
+        """Write the entries of `namespaces` inside the block range as a snapshot; returns the entry count."""
+        namespaces = list(namespaces)
+        conditions = [f"namespace IN ({','.join('?' * len(namespaces))})"]
+        params: list[Any] = list(namespaces)
+        if from_block is not None:
+            conditions.append("block >= ?")
+            params.append(from_block)
+        if to_block is not None:
+            conditions.append("block <= ?")
+            params.append(to_block)
+        header = {
+            "type": "cache-snapshot",
+            "version": SNAPSHOT_VERSION,
+            "namespaces": namespaces,
+            "from_block": from_block,
+            "to_block": to_block,
+        }
+
+        digest = hashlib.sha256()
+        count = 0
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT namespace, key, block, stored_at, value FROM entries WHERE "
+                + " AND ".join(conditions) + " ORDER BY namespace, block, key",
+                params,
+            )
+            # No name or mtime in the gzip header: identical content gives identical artifacts
+            with gzip.GzipFile(filename="", fileobj=fileobj, mode="wb", mtime=0) as out:
+                out.write((json.dumps(header) + "\n").encode())
+                for row in rows:
+                    line = (json.dumps(row, separators=(",", ":")) + "\n").encode()
+                    digest.update(line)
+                    out.write(line)
+                    count += 1
+                out.write((json.dumps({"type": "end", "count": count, "sha256": digest.hexdigest()}) + "\n").encode())
+        return count
+
+    def import_snapshot(self, fileobj: BinaryIO) -> tuple[int, int]:
+        """
+        Merge a snapshot into the cache; returns (entries read, entries added).
+
+        Entries already present are kept as they are. The whole import is one
+        transaction that only commits once the trailer's count and sha256
+        match, so a corrupt or truncated artifact changes nothing.
+        """
+        digest = hashlib.sha256()
+        count = added = 0
+        trailer = None
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                with gzip.GzipFile(fileobj=fileobj, mode="rb") as f:
+                    header = json.loads(f.readline() or b"null")
+                    if not isinstance(header, dict) or header.get("type") != "cache-snapshot":
+                        raise SnapshotError("not a cache snapshot")
+                    if header.get("version") != SNAPSHOT_VERSION:
+                        raise SnapshotError(f"unsupported snapshot version {header.get('version')}")
+                    for line in f:
+                        record = json.loads(line)
+                        if isinstance(record, dict):
+                            trailer = record
+                            break
+                        digest.update(line)
+                        count += 1
+                        added += self._db.execute(
+                            "INSERT OR IGNORE INTO entries (namespace, key, block, stored_at, value) VALUES (?, ?, ?, ?, ?)",
+                            record,
+                        ).rowcount
+                if trailer is None or trailer.get("type") != "end":
+                    raise SnapshotError("snapshot is truncated (no trailer)")
+                if trailer.get("count") != count or trailer.get("sha256") != digest.hexdigest():
+                    raise SnapshotError("snapshot failed its integrity check")
+            except (OSError, EOFError, zlib.error, ValueError, TypeError, sqlite3.Error) as e:
+                self._db.execute("ROLLBACK")
+                raise SnapshotError(str(e)) from e
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        return count, added
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -13,6 +13,9 @@
 #   ./run_analyzer.sh --start-date 2026-01-01           # Custom start date
 #   ./run_analyzer.sh --start-date 2026-01-01 --end-date 2026-01-15  # Date range
 #   ./run_analyzer.sh --tx 0x468ee2...                  # Single transaction
+#   ./run_analyzer.sh -a --futures-contract dev=0x.. stg=0x.. lmn=0x..:0xWALLET  # Several deployments
+#   ./run_analyzer.sh --tx-file disputed.txt -H         # List of transactions (batched fetches)
+#   cat disputed.txt | ./run_analyzer.sh --tx-file -    # Transaction hashes on stdin
 #   ./run_analyzer.sh -o my_report.csv                  # Custom output file
 #   ./run_analyzer.sh -q                                # Quiet mode (summary only)
 #   ./run_analyzer.sh -a                                # Analyze ALL wallets on contract
@@ -21,6 +24,29 @@
 #   ./run_analyzer.sh -a -n -o others.csv              # Other traders only, save to file
 #   ./run_analyzer.sh -H -o mm_total.csv               # Also output mm_total_hourly.csv
 #   ./run_analyzer.sh --hourly --start-date 2026-01-01 # Hourly aggregated data (no gaps)
+#   ./run_analyzer.sh -H --quantiles                    # p50/p95/p99 per tx in summary and hourly CSV
+#   ./run_analyzer.sh --rolling                         # Trailing 1h/24h/7d columns in the hourly CSV
+#   ./run_analyzer.sh --state-snapshots hourly          # Hourly market price + MM margin state (Multicall3)
+#   ./run_analyzer.sh -a --emit-metrics emf             # Hourly cost metrics as CloudWatch EMF (file)
+#   ./run_analyzer.sh --trace-gas --traces traces.jsonl # Gas per multicall subcall (debug_traceTransaction)
+#   ./run_analyzer.sh --batch-curve                     # Fixed vs marginal cost per order, best batch size
+#   ./run_analyzer.sh -a --cohorts                      # Orders/fills/fees/gas by delivery date and price
+#   ./run_analyzer.sh --archive ./event-archive         # Also archive decoded events
+#   ./run_analyzer.sh --archive ./event-archive --from-archive  # Re-analyze offline from archive
+#   ./run_analyzer.sh --cache-dir ./.cache --tx 0x468ee2...     # Cache tx/receipt/block for repeat lookups
+#   ./run_analyzer.sh -a --journal run.journal --resume         # Resume an interrupted backfill
+#   ./run_analyzer.sh -a --methods addMargin removeMargin       # Margin flows only (no multicall receipts)
+#   ./run_analyzer.sh -a --scan bloom --start-date 2025-06-01  # Find txs via logsBloom headers, not txlist
+#   ./run_analyzer.sh --wallets mm=0xc1e1... hedge=0x7a3f...    # Several wallets in one pass
+#   ./run_analyzer.sh -a -H --sample 0.05                      # 5% stratified sample, totals with 95% CIs
+#   SUBGRAPH_URL=http://localhost:8000/subgraphs/name/futures ./run_analyzer.sh -a --source subgraph  # No receipts
+#   ./run_analyzer.sh cache --cache-dir ./.cache import snap.jsonl.gz     # Warm start from a cache snapshot
+#
+# Offline tests (no API keys or network needed):
+#   python3 -m pytest tests
+#
+# Startup benchmark (cached --tx lookup should stay well under 200 ms):
+#   python3 bench_startup.py
 #
 # First time setup:
 #   1. cd .bedrock/scripts
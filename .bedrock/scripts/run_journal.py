@@ -0,0 +1,155 @@
+"""
+Run Journal
+
+Write-ahead JSONL journal for long analyzer runs. Every analyzed transaction
+(or the fact that it was skipped) is appended as one line, buffered and
+flushed with fsync in batches, so a run that dies at transaction 18,000 of
+20,000 can be resumed from the journal instead of starting over.
+
+Layout, one JSON object per line:
+    {"type": "run", "version": 2, "params": {...}}      first line
+    {"type": "value", "key": "...", "value": ...}       run-wide values (ETH price)
+    {"type": "entry", "key": "...", "value": ... }      one per transaction
+
+A torn trailing line (crash mid-write) is dropped when the journal is opened.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+# Bumped whenever journaled values change shape (2: TransactionAnalysis.cohorts carry a share)
+JOURNAL_VERSION = 2
+
+# Lines buffered before a flush + fsync
+DEFAULT_BATCH_SIZE = 100
+# Upper bound on how long a buffered line waits for its flush (seconds)
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class JournalMismatch(Exception):
+    """The journal on disk belongs to a run with different parameters, or to another journal version."""
+
+
+class RunJournal:
+    """
+    Append-only journal of completed work, keyed by string.
+
+    Opening with resume=True replays an existing journal whose run parameters
+    match `params`; otherwise any existing file is replaced.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        params: dict,
+        resume: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        self.path = Path(path)
+        self.params = params
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.entries: dict[str, Any] = {}
+        self.values: dict[str, Any] = {}
+        self._pending: list[str] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+        valid_size = 0
+        if resume and self.path.exists():
+            valid_size = self._replay()
+        self._file = open(self.path, "r+b" if valid_size else "wb")
+        if valid_size:
+            # Drop a torn trailing line before appending
+            self._file.truncate(valid_size)
+            self._file.seek(valid_size)
+        else:
+            self._write_now({"type": "run", "version": JOURNAL_VERSION, "params": params})
+
+    def _replay(self) -> int:
+        """Load entries from disk; returns the byte length of the intact prefix (0 if empty)."""
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if valid_size == 0:
+                    if record.get("type") != "run":
+                        break
+                    if record.get("version") != JOURNAL_VERSION:
+                        raise JournalMismatch(
+                            f"{self.path} is a version {record.get('version')} journal "
+                            f"(this analyzer writes version {JOURNAL_VERSION}); rerun without resuming"
+                        )
+                    if record.get("params") != self.params:
+                        raise JournalMismatch(
+                            f"{self.path} was written by a run with different parameters: {record.get('params')}"
+                        )
+                elif record.get("type") == "entry":
+                    self.entries[record["key"]] = record["value"]
+                elif record.get("type") == "value":
+                    self.values[record["key"]] = record["value"]
+                valid_size += len(line)
+        return valid_size
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.entries.get(key)
+
+    def record(self, key: str, value: Any):
+        """Journal one completed unit of work."""
+        self._append({"type": "entry", "key": key, "value": value})
+        self.entries[key] = value
+
+    def set_value(self, key: str, value: Any):
+        """Journal a run-wide value (written through immediately)."""
+        self.values[key] = value
+        self._append({"type": "value", "key": key, "value": value}, flush=True)
+
+    def _append(self, record: dict, flush: bool = False):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._pending.append(line)
+            if (
+                flush
+                or len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self._flush_locked()
+
+    def _write_now(self, record: dict):
+        with self._lock:
+            self._pending.append(json.dumps(record, separators=(",", ":")) + "\n")
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._pending:
+            self._file.write("".join(self._pending).encode())
+            self._pending = []
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._flush_locked()
+                self._file.close()
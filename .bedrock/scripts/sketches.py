@@ -0,0 +1,285 @@
+"""
+Streaming Sketches
+
+Mergeable, bounded-memory summaries for distributions and distinct counts that
+are too large to keep value by value.
+
+TDigest is a merging t-digest (Dunning & Ertl): values are buffered, then
+compressed into at most ~compression centroids whose size limit follows the
+arcsine scale function, so the tails (p95/p99) stay sharp while the middle is
+summarized coarsely. Digests from separate runs merge by compressing their
+centroids together, and round-trip through plain dicts for JSON storage.
+
+HyperLogLog counts distinct items (wallets) in fixed-size registers.
+"""
+
+import hashlib
+import math
+from typing import Iterable, Optional
+
+DEFAULT_COMPRESSION = 100.0
+
+# Values buffered per unit of compression before the digest is compressed
+BUFFER_FACTOR = 5
+
+
+class TDigest:
+    """Merging t-digest for quantile estimates over a stream of floats."""
+
+    __slots__ = ("compression", "count", "min", "max", "_means", "_weights", "_buffer")
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._means: list[float] = []
+        self._weights: list[float] = []
+        self._buffer: list[tuple[float, float]] = []
+
+    def __len__(self) -> int:
+        return int(self.count)
+
+    def add(self, value: float, weight: float = 1.0):
+        """Add one observation."""
+        value = float(value)
+        self._buffer.append((value, weight))
+        self.count += weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self._buffer) >= BUFFER_FACTOR * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        """Fold another digest into this one."""
+        if not other.count:
+            return
+        self._buffer.extend(zip(other._means, other._weights))
+        self._buffer.extend(other._buffer)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q(self, k: float) -> float:
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        items = sorted([*zip(self._means, self._weights), *self._buffer])
+        self._buffer = []
+        total = self.count
+
+        means, weights = [], []
+        mean, weight = items[0]
+        weight_so_far = 0.0
+        q_limit = self._q(self._k(0.0) + 1)
+        for value, w in items[1:]:
+            if (weight_so_far + weight + w) / total <= q_limit:
+                # Fold into the current centroid (incremental weighted mean)
+                weight += w
+                mean += (value - mean) * w / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                weight_so_far += weight
+                q_limit = self._q(self._k(weight_so_far / total) + 1)
+                mean, weight = value, w
+        means.append(mean)
+        weights.append(weight)
+
+        self._means = means
+        self._weights = weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at quantile q (0..1), or None for an empty digest."""
+        if not self.count:
+            return None
+        self._compress()
+        if self.min == self.max:
+            return self.min
+
+        # Interpolate between centroid midpoints, anchored at the exact min and max
+        target = q * self.count
+        previous_position, previous_value = 0.0, self.min
+        cumulative = 0.0
+        for mean, weight in zip(self._means, self._weights):
+            position = cumulative + weight / 2
+            if target < position:
+                span = position - previous_position
+                fraction = (target - previous_position) / span if span else 0.0
+                return previous_value + (mean - previous_value) * fraction
+            previous_position, previous_value = position, mean
+            cumulative += weight
+        span = self.count - previous_position
+        fraction = (target - previous_position) / span if span else 1.0
+        return previous_value + (self.max - previous_value) * fraction
+
+    def to_dict(self) -> dict:
+        """JSON-serializable state (centroids only)."""
+        self._compress()
+        return {
+            "compression": self.compression,
+            "count": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "means": self._means,
+            "weights": self._weights,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "TDigest":
+        digest = cls(state.get("compression", DEFAULT_COMPRESSION))
+        digest.count = float(state.get("count", 0))
+        if digest.count:
+            digest.min = float(state["min"])
+            digest.max = float(state["max"])
+        digest._means = [float(m) for m in state.get("means", [])]
+        digest._weights = [float(w) for w in state.get("weights", [])]
+        return digest
+
+
+# ============================================================================
+# HYPERLOGLOG
+# ============================================================================
+
+DEFAULT_PRECISION = 12  # 4096 registers, ~1.6% standard error
+
+
+def _hash64(item: str) -> int:
+    return int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+
+
+def _sigma(x: float) -> float:
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x: float) -> float:
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter with lazily allocated registers.
+
+    Small sets keep a sparse {register: rank} dict, so the many quiet hours of
+    a long run cost a few bytes each; the dense 2^precision byte array is only
+    allocated once the sparse form would be larger. Both forms estimate
+    identically, and merging (register-wise max) is exact: the merge of hourly
+    counters equals the counter built over the whole day or week.
+    """
+
+    __slots__ = ("precision", "_sparse", "_registers")
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        self.precision = precision
+        self._sparse: Optional[dict[int, int]] = {}
+        self._registers: Optional[bytearray] = None
+
+    @property
+    def size(self) -> int:
+        return 1 << self.precision
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.size)
+
+    def _densify(self):
+        registers = bytearray(self.size)
+        for index, rank in self._sparse.items():
+            registers[index] = rank
+        self._registers = registers
+        self._sparse = None
+
+    def _set(self, index: int, rank: int):
+        if self._registers is not None:
+            if rank > self._registers[index]:
+                self._registers[index] = rank
+            return
+        if rank > self._sparse.get(index, 0):
+            self._sparse[index] = rank
+            if len(self._sparse) > self.size // 8:
+                self._densify()
+
+    def add(self, item: str):
+        h = _hash64(item)
+        suffix_bits = 64 - self.precision
+        suffix = h & ((1 << suffix_bits) - 1)
+        self._set(h >> suffix_bits, suffix_bits - suffix.bit_length() + 1)
+
+    def merge(self, other: "HyperLogLog"):
+        """Register-wise max with another counter of the same precision."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog counters of different precision")
+        if other._registers is not None:
+            for index, rank in enumerate(other._registers):
+                if rank:
+                    self._set(index, rank)
+        else:
+            for index, rank in other._sparse.items():
+                self._set(index, rank)
+
+    def estimate(self) -> float:
+        """
+        Cardinality estimate using Ertl's improved estimator, which stays
+        unbiased from empty to very large sets without bias tables or a
+        switch to linear counting.
+        """
+        m = self.size
+        q = 64 - self.precision
+        ranks: Iterable[int] = self._registers if self._registers is not None else self._sparse.values()
+        histogram = [0] * (q + 2)
+        for rank in ranks:
+            histogram[rank] += 1
+        histogram[0] += m - sum(histogram)  # registers absent from the sparse form
+
+        z = m * _tau(1 - histogram[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + histogram[k])
+        z += m * _sigma(histogram[0] / m)
+        return m * m / (2 * math.log(2) * z)
+
+    def __len__(self) -> int:
+        return round(self.estimate())
+
+    def to_dict(self) -> dict:
+        if self._registers is None:
+            return {"precision": self.precision, "sparse": {str(i): r for i, r in self._sparse.items()}}
+        return {"precision": self.precision, "registers": self._registers.hex()}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "HyperLogLog":
+        hll = cls(state.get("precision", DEFAULT_PRECISION))
+        if "registers" in state:
+            hll._registers = bytearray.fromhex(state["registers"])
+            hll._sparse = None
+        else:
+            for index, rank in state.get("sparse", {}).items():
+                hll._set(int(index), rank)
+        return hll
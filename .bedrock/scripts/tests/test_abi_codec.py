@@ -0,0 +1,107 @@
+"""keccak, checksums, blooms and ABI helpers."""
+
+import pytest
+
+from abi_codec import (
+    bloom_contains,
+    bloom_mask,
+    decode_aggregate3,
+    decode_int,
+    decode_uint,
+    encode_aggregate3,
+    encode_call,
+    event_topic,
+    function_selector,
+    keccak256,
+    to_checksum_address,
+)
+
+MULTICALL3 = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+
+def test_keccak256_known_digests():
+    assert keccak256(b"").hex() == "c5d2460186f7233c927e7db2dcc703c0e500b653ca82273b7bfad8045d85a470"
+    assert keccak256(b"abc").hex() == "4e03657aea45a94fc7d47ba826c8d667c0d1e6e33a64a036ec44f58fa12d6c45"
+    # Longer than one 136-byte block
+    assert keccak256(b"a" * 200) == keccak256(b"a" * 200)
+    assert keccak256(b"a" * 136) != keccak256(b"a" * 135)
+
+
+def test_signatures():
+    assert event_topic("Transfer(address,address,uint256)") == (
+        "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+    )
+    assert function_selector("transfer(address,uint256)") == "0xa9059cbb"
+    assert function_selector("multicall(bytes[])") == "0xac9650d8"
+
+
+@pytest.mark.parametrize("address", [
+    "0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed",
+    "0xfB6916095ca1df60bB79Ce92cE3Ea74c37c5d359",
+    "0xdbF03B407c01E7cD3CBea99509d93f8DDDC8C6FB",
+    "0xD1220A0cf47c7B9Be7A2E6BA89F429762e7b9aDb",
+])
+def test_eip55_checksums(address):
+    assert to_checksum_address(address.lower()) == address
+    assert to_checksum_address(address[2:].upper()) == address
+
+
+def test_checksum_rejects_malformed_addresses():
+    for address in ("0x1234", "0x" + "zz" * 20):
+        with pytest.raises(ValueError):
+            to_checksum_address(address)
+
+
+def test_bloom_has_no_false_negatives():
+    items = [bytes([i]) * 20 for i in range(1, 30)]
+    bloom = 0
+    for item in items:
+        bloom |= bloom_mask(item)
+    assert all(bloom_contains(bloom, bloom_mask(item)) for item in items)
+    assert bin(bloom_mask(items[0])).count("1") <= 3
+    assert not bloom_contains(0, bloom_mask(items[0]))
+
+
+def test_words_and_calls():
+    word = (2**256 - 5).to_bytes(32, "big")
+    assert decode_uint(word) == 2**256 - 5
+    assert decode_int(word) == -5
+    calldata = encode_call("balanceOf(address)", MULTICALL3)
+    assert calldata[:4].hex() == "70a08231"
+    assert decode_uint(calldata, 4) == int(MULTICALL3, 16)
+
+
+def _word(value: int) -> bytes:
+    return value.to_bytes(32, "big")
+
+
+def _encode_results(results: list[tuple[bool, bytes]]) -> bytes:
+    """ABI-encode aggregate3's (bool success, bytes returnData)[] return value."""
+    tails = [
+        _word(int(ok)) + _word(64) + _word(len(data)) + data + b"\x00" * (-len(data) % 32)
+        for ok, data in results
+    ]
+    offsets, position = [], len(results) * 32
+    for tail in tails:
+        offsets.append(_word(position))
+        position += len(tail)
+    return _word(32) + _word(len(results)) + b"".join(offsets) + b"".join(tails)
+
+
+def test_encode_aggregate3():
+    calls = [(MULTICALL3, True, b"\x01\x02\x03"), (MULTICALL3, False, b"")]
+    calldata = encode_aggregate3(calls)
+    assert calldata[:4].hex() == "82ad56cb"
+    body = calldata[4:]
+    array = decode_uint(body)
+    assert decode_uint(body, array) == 2
+    first = array + 32 + decode_uint(body, array + 32)
+    assert decode_uint(body, first) == int(MULTICALL3, 16)
+    assert decode_uint(body, first + 32) == 1
+    data_start = first + decode_uint(body, first + 64)
+    assert body[data_start + 32:data_start + 32 + decode_uint(body, data_start)] == b"\x01\x02\x03"
+
+
+def test_decode_aggregate3():
+    results = [(True, _word(7)), (False, b"revert"), (True, b"")]
+    assert decode_aggregate3(_encode_results(results)) == results
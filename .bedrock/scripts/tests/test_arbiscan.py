@@ -0,0 +1,63 @@
+"""ArbiscanClient key pool: retries on other keys, and failing once every key is exhausted."""
+
+import pytest
+
+import analyze_market_maker_fees
+from analyze_market_maker_fees import ArbiscanClient
+
+OK = {"status": "1", "message": "OK", "result": []}
+RATE_LIMITED = {"status": "0", "message": "NOTOK", "result": "Max rate limit reached"}
+INVALID_KEY = {"status": "0", "message": "NOTOK", "result": "Invalid API Key (#err2)|x"}
+
+
+class Response:
+    def __init__(self, data: dict, status_code: int = 200):
+        self.data = data
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self) -> dict:
+        return self.data
+
+
+class Session:
+    """Answers per API key: an HTTP status code, or a response body."""
+
+    def __init__(self, answers: dict):
+        self.answers = answers
+        self.keys: list[str] = []
+
+    def get(self, url, params, timeout):
+        self.keys.append(params["apikey"])
+        answer = self.answers[params["apikey"]]
+        return Response({}, answer) if isinstance(answer, int) else Response(answer)
+
+
+def client(keys: str, answers: dict, monkeypatch) -> ArbiscanClient:
+    monkeypatch.setattr(analyze_market_maker_fees.time, "sleep", lambda seconds: None)
+    arbiscan = ArbiscanClient(keys)
+    arbiscan._session = Session(answers)
+    return arbiscan
+
+
+def test_rate_limited_key_is_retried_on_another(monkeypatch):
+    arbiscan = client("aaaa,bbbb", {"aaaa": RATE_LIMITED, "bbbb": OK}, monkeypatch)
+    assert arbiscan._request({"module": "account"}) == OK
+    assert arbiscan._session.keys == ["aaaa", "bbbb"]
+
+
+@pytest.mark.parametrize("answer", [RATE_LIMITED, 429])
+def test_fails_once_every_key_is_rate_limited(answer, monkeypatch):
+    arbiscan = client("aaaa,bbbb", {"aaaa": answer, "bbbb": answer}, monkeypatch)
+    with pytest.raises(RuntimeError, match="all API keys rate-limited"):
+        arbiscan._request({"module": "account"})
+    assert len(arbiscan._session.keys) == 4
+
+
+def test_invalid_only_key_returns_the_error_response(monkeypatch, capsys):
+    arbiscan = client("only", {"only": INVALID_KEY}, monkeypatch)
+    assert arbiscan._request({"module": "account"}) == INVALID_KEY
+    assert "Invalid API Key" in capsys.readouterr().out
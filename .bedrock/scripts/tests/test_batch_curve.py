@@ -0,0 +1,79 @@
+"""--batch-curve: multicall cost grouped by batch size, and the fixed / per-order / growth fit."""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from analyze_market_maker_fees import TransactionAnalysis, batch_curve, print_batch_curve
+
+pytest.importorskip("numpy")
+
+# Exact cost model the fit should recover: gas and fees in USD per multicall
+FIXED, PER_CREATED, PER_CLOSED, GROWTH = 0.05, 0.01, 0.004, 0.0002
+FEE = 0.5  # Order fee, paid per created order only
+
+
+def multicall(created: int, closed: int, weight: float = 1.0, method: str = "multicall") -> TransactionAnalysis:
+    n = created + closed
+    return TransactionAnalysis(
+        timestamp=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        tx_hash="0x" + "00" * 32,
+        wallet="0x" + "aa" * 20,
+        action="",
+        method=method,
+        usdc_fees=FEE * created,
+        usdc_deposit=0.0,
+        usdc_withdrawal=0.0,
+        gas_fee_eth=0.0,
+        gas_fee_usd=(FIXED + PER_CREATED * created + PER_CLOSED * closed + GROWTH * n * n) if n else 0.02,
+        eth_price_usd=3000.0,
+        orders_created=created,
+        orders_closed=closed,
+        buy_orders=created,
+        sell_orders=0,
+        weight=weight,
+    )
+
+
+def results() -> list[TransactionAnalysis]:
+    runs = [multicall(0, 0), multicall(0, 0, method="addMargin")]
+    for n in range(1, 21):
+        runs += [multicall(n, 0), multicall(n - n // 2, n // 2)]
+    return runs
+
+
+def test_group_by_and_fit_recover_the_cost_model():
+    curve = batch_curve(results())
+
+    assert curve.sizes == list(range(1, 21))
+    assert curve.txs == [2.0] * 20
+    assert curve.unbatched == 1.0
+    assert curve.usdc_fees[3] == pytest.approx(FEE * (4 + 2) / 2)
+    assert curve.gas_fit == pytest.approx((FIXED, PER_CREATED, PER_CLOSED, GROWTH))
+    assert curve.fee_fit == pytest.approx((0.0, FEE, 0.0, 0.0), abs=1e-9)
+
+
+def test_best_size_balances_the_fixed_cost_against_growth():
+    curve = batch_curve(results())
+    # Fees are the same per created order at any size; gas per order is FIXED / n + per-order + GROWTH * n
+    assert curve.best_size() == 16
+    assert curve.marginal(10)[0] == pytest.approx(curve._per_order(curve.gas_fit) + GROWTH * 21)
+
+
+def test_sample_weights_count_as_multicalls():
+    curve = batch_curve([multicall(2, 0, weight=3.0), multicall(2, 0, weight=1.0), multicall(4, 0, weight=2.5)])
+    assert curve.txs == [4.0, 2.5]
+    # Two sizes: no growth term
+    assert curve.gas_fit[3] == 0.0
+    assert curve.observed_best() is None  # Neither size has BATCH_CURVE_MIN_TXS multicalls
+
+
+def test_no_batched_multicalls():
+    assert batch_curve([multicall(0, 0), multicall(3, 0, method="createOrder")]) is None
+
+
+def test_printed_report(capsys):
+    print_batch_curve(batch_curve(results()))
+    out = capsys.readouterr().out
+    assert "40 multicalls, 1 without orders left out" in out
+    assert "Lowest cost per order: 16 per multicall" in out
@@ -0,0 +1,111 @@
+"""--scan bloom: test block headers' logsBloom, then fetch only the blocks that may hold futures activity."""
+
+from datetime import datetime, timezone
+
+from abi_codec import bloom_mask, encode_call, event_topic
+from analyze_market_maker_fees import AlchemyClient, MarketMakerAnalyzer
+
+CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+OTHER = "0x" + "0d" * 20
+A, B = "0x" + "aa" * 20, "0x" + "bb" * 20
+T0 = 1_767_225_600
+BLOCKS = (0, 499)
+TRANSFER = event_topic("Transfer(address,address,uint256)")
+
+
+def bloom(*items: bytes) -> str:
+    value = 0
+    for item in items:
+        value |= bloom_mask(item)
+    return f"0x{value:0512x}"
+
+
+CONTRACT_LOG = (bytes.fromhex(CONTRACT[2:]), bytes.fromhex(TRANSFER[2:]))
+# block -> (logsBloom items, transactions as (sender, recipient))
+CHAIN = {
+    37: (CONTRACT_LOG, [(A, CONTRACT), (B, OTHER)]),
+    100: ((bytes.fromhex(CONTRACT[2:]),), []),  # The contract, but none of the futures events
+    250: (CONTRACT_LOG, [(B, CONTRACT)]),  # A candidate, but not from the wallet in scope
+    251: (CONTRACT_LOG, [(A, CONTRACT), (A, CONTRACT)]),
+    300: ((bytes.fromhex(OTHER[2:]), bytes.fromhex(TRANSFER[2:])), [(A, OTHER)]),
+}
+
+
+def tx_hash(block: int, index: int) -> str:
+    return f"0x{block:060x}{index:04x}"
+
+
+class FakeSession:
+    """JSON-RPC batches over CHAIN, recording every method called."""
+
+    def __init__(self):
+        self.methods: list[str] = []
+
+    def post(self, url, json, timeout):
+        self.methods.extend(call["method"] for call in json)
+        return FakeResponse([{"jsonrpc": "2.0", "id": call["id"], "result": self.result(call)} for call in json])
+
+    def result(self, call: dict):
+        if call["method"] == "eth_getTransactionReceipt":
+            block, index = int(call["params"][0][2:62], 16), int(call["params"][0][62:], 16)
+            sender, recipient = CHAIN[block][1][index]
+            return {"blockNumber": hex(block), "transactionIndex": hex(index), "gasUsed": hex(100_000), "status": "0x1",
+                    "logs": [{
+                        "address": CONTRACT, "logIndex": "0x0",
+                        "topics": [TRANSFER, "0x" + sender[2:].rjust(64, "0"), "0x" + recipient[2:].rjust(64, "0")],
+                        "data": f"0x{block * 10**6:064x}",
+                    }]}
+        number, full = int(call["params"][0], 16), call["params"][1]
+        items, txs = CHAIN.get(number, ((), []))
+        header = {"number": hex(number), "timestamp": hex(T0 + number), "logsBloom": bloom(*items)}
+        if full:
+            header["transactions"] = [
+                {"hash": tx_hash(number, i), "blockNumber": hex(number), "transactionIndex": hex(i), "from": sender,
+                 "to": recipient, "gasPrice": hex(10**7), "input": "0x" + encode_call("addMargin(uint256)", 1).hex()}
+                for i, (sender, recipient) in enumerate(txs)
+            ]
+        return header
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class FakeArbiscan:
+    def get_eth_price(self):
+        return 3000.0
+
+
+def test_headers_stream_in_block_order():
+    alchemy = AlchemyClient("http://127.0.0.1:9")
+    alchemy._session = FakeSession()
+    blooms = list(alchemy.iter_block_blooms(*BLOCKS))
+    assert [number for number, _ in blooms] == list(range(500))
+    assert blooms[37][1] == int(bloom(*CONTRACT_LOG), 16)
+
+
+def test_only_candidate_blocks_and_in_scope_receipts_are_fetched():
+    alchemy = AlchemyClient("http://127.0.0.1:9")
+    alchemy._session = session = FakeSession()
+    analyzer = MarketMakerAnalyzer(
+        futures_contract=CONTRACT, market_maker_wallet=A, arbiscan=FakeArbiscan(), alchemy=alchemy, tx_scan="bloom"
+    )
+    results = analyzer.analyze_date_range(
+        datetime.fromtimestamp(T0, tz=timezone.utc), datetime.fromtimestamp(T0 + 499, tz=timezone.utc),
+        verbose=False, block_range=BLOCKS,
+    )
+
+    assert [r.tx_hash for r in results] == [tx_hash(37, 0), tx_hash(251, 0), tx_hash(251, 1)]
+    assert [r.usdc_deposit for r in results] == [37.0, 251.0, 251.0]
+    assert analyzer.bloom_stats == {"blocks": 500, "candidates": 3, "matched": 2}
+    # Headers for the range, full blocks for the three candidates, receipts only for A's three transactions
+    assert session.methods.count("eth_getBlockByNumber") == 503
+    assert session.methods.count("eth_getTransactionReceipt") == 3
+    assert analyzer.prefetched_receipts == {}
@@ -0,0 +1,80 @@
+"""Delivery-date cohorts: each order's share of its transaction's fees and gas."""
+
+from dataclasses import replace
+from datetime import datetime, timezone
+
+import pytest
+
+from analyze_market_maker_fees import CohortColumns, DecodedEvent, MarketMakerAnalyzer
+
+pytest.importorskip("numpy")
+
+CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+WALLET = "0x" + "aa" * 20
+DAY_1, DAY_2 = 1_767_830_400, 1_767_916_800
+P1, P2 = 5_000_000, 5_100_000
+
+
+def analyzer() -> MarketMakerAnalyzer:
+    analyzer = MarketMakerAnalyzer.__new__(MarketMakerAnalyzer)
+    analyzer.futures_contract = CONTRACT
+    analyzer.label = ""
+    return analyzer
+
+
+def event(name: str, log_index: int, **args) -> DecodedEvent:
+    return DecodedEvent(name, log_index, CONTRACT, args)
+
+
+def fee(log_index: int, usdc: float) -> DecodedEvent:
+    return event("Transfer", log_index, **{"from": WALLET, "to": CONTRACT, "value": int(usdc * 10**6)})
+
+
+def classify(events: list[DecodedEvent]):
+    # 100k gas at 10 gwei and $3,000/ETH: $3 of gas
+    return analyzer().classify_transaction(
+        1_767_225_600, "0x" + "01" * 32, WALLET, "multicall", 100_000, 10**10, 3000.0, events
+    )
+
+
+def test_fees_and_gas_follow_the_createorder_call_that_paid_for_each_order():
+    r = classify([
+        # createOrder(qty=2): rests one order, fills another, then pays one fee
+        event("OrderCreated", 0, delivery_at=DAY_1, price_per_day=P1, is_buy=True),
+        event("OrderClosed", 1),
+        event("PositionCreated", 2, delivery_at=DAY_1, buy_price_per_day=P1),
+        fee(3, 1.0),
+        # createOrder(qty=1) at another date pays a fee of its own
+        event("OrderCreated", 4, delivery_at=DAY_2, price_per_day=P2, is_buy=False),
+        fee(5, 1.0),
+    ])
+    assert r.cohorts == [(DAY_1, P1, False, 0.25), (DAY_1, P1, True, 0.25), (DAY_2, P2, False, 0.5)]
+
+    columns = CohortColumns()
+    columns.add(r)
+    columns.add(replace(r, weight=2.0))
+    rows = columns.table()
+
+    assert [(row.delivery_date, row.price_per_day) for row in rows] == [
+        (datetime.fromtimestamp(DAY_1, tz=timezone.utc), 5.0),
+        (datetime.fromtimestamp(DAY_2, tz=timezone.utc), 5.1),
+    ]
+    assert [(row.orders, row.fills) for row in rows] == [(3.0, 3.0), (3.0, 0.0)]
+    assert [row.usdc_fees for row in rows] == pytest.approx([3.0, 3.0])
+    assert [row.gas_usd for row in rows] == pytest.approx([4.5, 4.5])
+    assert sum(row.usdc_fees for row in rows) == pytest.approx(3 * r.usdc_fees)
+    assert sum(row.gas_usd for row in rows) == pytest.approx(3 * r.gas_fee_usd)
+
+
+def test_without_fees_paid_the_transaction_is_split_evenly():
+    r = classify([
+        event("OrderCreated", 0, delivery_at=DAY_1, price_per_day=P1, is_buy=True),
+        event("OrderCreated", 1, delivery_at=DAY_1, price_per_day=P1, is_buy=True),
+        event("OrderCreated", 2, delivery_at=DAY_2, price_per_day=P2, is_buy=True),
+        event("OrderCreated", 3, delivery_at=DAY_2, price_per_day=P2, is_buy=True),
+    ])
+    assert [share for *_, share in r.cohorts] == [0.25] * 4
+
+    columns = CohortColumns()
+    columns.add(r)
+    assert [row.gas_usd for row in columns.table()] == pytest.approx([1.5, 1.5])
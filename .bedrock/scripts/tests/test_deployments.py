@@ -0,0 +1,99 @@
+"""Several futures deployments in one run: spec parsing, shared clients and the merged results."""
+
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from abi_codec import encode_call
+from analyze_market_maker_fees import Deployment, MarketMakerAnalyzer, analyze_deployments
+
+MAIN, TEST = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda", "0x" + "0c" * 20
+A, B = "0x" + "aa" * 20, "0x" + "bb" * 20
+T0 = 1_767_225_600
+START, END = datetime.fromtimestamp(T0, tz=timezone.utc), datetime.fromtimestamp(T0 + 86_399, tz=timezone.utc)
+TRANSFER = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+def row(n: int, sender: str, contract: str, minutes: int) -> dict:
+    return {
+        "blockNumber": str(100 + minutes), "timeStamp": str(T0 + 60 * minutes), "transactionIndex": "0",
+        "hash": f"0x{n:064x}", "from": sender, "to": contract,
+        "input": "0x" + encode_call("addMargin(uint256)", n * 10**6).hex(),
+        "gasUsed": "100000", "gasPrice": "10000000", "isError": "0", "txreceipt_status": "1",
+    }
+
+
+TXLIST = [row(1, A, MAIN, 30), row(2, A, TEST, 10), row(3, B, TEST, 20), row(4, B, MAIN, 40)]
+
+
+class FakeArbiscan:
+    def __init__(self):
+        self.block_lookups = 0
+        self._lock = threading.Lock()
+
+    def get_block_by_timestamp(self, timestamp, closest):
+        with self._lock:
+            self.block_lookups += 1
+        return 100 if closest == "after" else 2000
+
+    def get_transactions_to_contract(self, contract, start_block, end_block, page, offset):
+        return [tx for tx in TXLIST if tx["to"] == contract.lower()] if page == 1 else []
+
+    def get_transactions(self, address, start_block, end_block, page, offset):
+        return [tx for tx in TXLIST if tx["from"] == address.lower()] if page == 1 else []
+
+    def get_eth_price(self):
+        return 3000.0
+
+
+class FakeAlchemy:
+    def get_transaction_receipt(self, tx_hash: str) -> dict:
+        tx = next(tx for tx in TXLIST if tx["hash"] == tx_hash)
+        return {
+            "blockNumber": tx["blockNumber"], "transactionIndex": 0, "gasUsed": tx["gasUsed"], "status": 1,
+            "logs": [{
+                "address": tx["to"], "logIndex": 0,
+                "topics": [TRANSFER, "0x" + tx["from"][2:].rjust(64, "0"), "0x" + tx["to"][2:].rjust(64, "0")],
+                "data": "0x" + tx["input"][10:],
+            }],
+        }
+
+
+def test_deployment_specs():
+    assert Deployment.parse(MAIN) == Deployment(MAIN, None, MAIN)
+    assert Deployment.parse(f"testnet={TEST}:{B}") == Deployment(TEST, B, "testnet")
+    assert Deployment.parse(f" main = {MAIN} ") == Deployment(MAIN, None, "main")
+    with pytest.raises(ValueError):
+        Deployment.parse("main=0x1234")
+
+
+def analyzers(**mode) -> list[MarketMakerAnalyzer]:
+    base = MarketMakerAnalyzer(futures_contract=MAIN, arbiscan=FakeArbiscan(), alchemy=FakeAlchemy(), **mode)
+    return [base.for_deployment(Deployment(MAIN, label="main")), base.for_deployment(Deployment(TEST, label="test"))]
+
+
+def test_deployments_share_one_block_range_and_merge_in_time_order():
+    deployments = analyzers(analyze_all_wallets=True)
+    assert deployments[0].arbiscan is deployments[1].arbiscan
+    assert deployments[0].addresses is deployments[1].addresses
+
+    results = analyze_deployments(deployments, START, END, verbose=False)
+
+    assert deployments[0].arbiscan.block_lookups == 2
+    assert [(r.contract, r.tx_hash[-1], r.usdc_deposit) for r in results] == [
+        ("test", "2", 2.0), ("test", "3", 3.0), ("main", "1", 1.0), ("main", "4", 4.0),
+    ]
+
+
+def test_wallet_mode_carries_over_and_a_deployment_wallet_overrides_it():
+    main, test = analyzers(market_maker_wallet=A)
+    assert (main.market_maker_wallet.lower(), test.market_maker_wallet.lower()) == (A, A)
+    results = analyze_deployments([main, test], START, END, verbose=False)
+    assert [(r.contract, r.tx_hash[-1]) for r in results] == [("test", "2"), ("main", "1")]
+
+    base = MarketMakerAnalyzer(futures_contract=MAIN, exclude_wallet=A, analyze_all_wallets=True,
+                               arbiscan=FakeArbiscan(), alchemy=FakeAlchemy())
+    test = base.for_deployment(Deployment(TEST, wallet=B, label="test"))
+    assert (test.analyze_all_wallets, test.exclude_wallet.lower()) == (True, B)
+    assert [r.tx_hash[-1] for r in analyze_deployments([test], START, END, verbose=False)] == ["2"]
@@ -0,0 +1,162 @@
+"""EventArchive append, dedup and crash recovery."""
+
+import os
+
+import pytest
+
+import event_archive
+from event_archive import (
+    COUNT_MAX,
+    F_COUNT,
+    F_LOG_INDEX,
+    F_REF,
+    HEADER_LOG_INDEX,
+    KIND_TRANSFER,
+    KIND_TX,
+    RECORD,
+    RECORD_SIZE,
+    SEGMENT_BLOCKS,
+    EventArchive,
+)
+
+BLOCK = 420_000_123
+T0 = 1_767_225_600
+
+
+def header(tx: int, block: int = BLOCK, tx_index: int = 0, flags: int = 0, timestamp: int = T0) -> tuple:
+    return (block, timestamp, tx_index, HEADER_LOG_INDEX, KIND_TX, flags, 0,
+            b"\x01" * 20, b"\x02" * 20, 21_000, 10, 0, 0, tx.to_bytes(32, "big"))
+
+
+def event(log_index: int, block: int = BLOCK, tx_index: int = 0) -> tuple:
+    return (block, T0, tx_index, log_index, KIND_TRANSFER, 0, 0,
+            b"\x01" * 20, b"\x02" * 20, 5_000_000, 0, 0, 0, b"\x00" * 32)
+
+
+def segment(archive: EventArchive, block: int = BLOCK):
+    return archive.segment_path(event_archive.segment_start(block))
+
+
+def test_append_is_idempotent_and_stamps_the_event_count(tmp_path):
+    archive = EventArchive(tmp_path)
+    assert archive.append(header(1), [event(0), event(1)])
+    assert not archive.append(header(1), [event(0), event(1)])
+    archive.flush()
+    assert not EventArchive(tmp_path).append(header(1), [event(0), event(1)])
+
+    (written, events), = EventArchive(tmp_path).scan()
+    assert written[F_COUNT] == 2
+    assert [record[F_LOG_INDEX] for record in events] == [0, 1]
+    assert archive.stats()["records"] == 3
+
+
+def test_scan_orders_by_block_and_tx_index(tmp_path):
+    archive = EventArchive(tmp_path)
+    archive.append(header(2, tx_index=5), [event(3, tx_index=5)])
+    archive.append(header(1, tx_index=2), [])
+    archive.append(header(3, block=BLOCK - 1), [event(0, block=BLOCK - 1)])
+    assert [h[F_REF][-1] for h, _ in archive.scan()] == [3, 1, 2]
+    assert [h[F_REF][-1] for h, _ in archive.scan(from_block=BLOCK)] == [1, 2]
+
+
+def test_partial_trailing_record_is_realigned(tmp_path):
+    archive = EventArchive(tmp_path)
+    archive.append(header(1), [event(0)])
+    archive.close()
+    with open(segment(archive), "ab") as f:
+        f.write(b"\xff" * 50)
+
+    reopened = EventArchive(tmp_path)
+    assert reopened.contains(BLOCK, (1).to_bytes(32, "big"))
+    assert reopened.append(header(2), [event(0)])
+    reopened.flush()
+    assert os.path.getsize(segment(archive)) == 4 * RECORD_SIZE
+    assert len(list(reopened.scan())) == 2
+
+
+def test_torn_transaction_is_not_archived_and_is_rewritten(tmp_path):
+    archive = EventArchive(tmp_path)
+    archive.append(header(1), [event(0)])
+    archive.close()
+    # Simulate a crash after the header and one of three event records reached disk
+    torn = (*header(2)[:F_COUNT], 3, *header(2)[F_COUNT + 1:])
+    with open(segment(archive), "ab") as f:
+        f.write(RECORD.pack(*torn) + RECORD.pack(*event(0)))
+
+    reopened = EventArchive(tmp_path)
+    assert not reopened.contains(BLOCK, (2).to_bytes(32, "big"))
+    assert [h[F_REF][-1] for h, _ in reopened.scan()] == [1]
+
+    assert reopened.append(header(2), [event(0), event(1), event(2)])
+    reopened.flush()
+    assert os.path.getsize(segment(archive)) == 6 * RECORD_SIZE
+    scanned = {h[F_REF][-1]: len(events) for h, events in EventArchive(tmp_path).scan()}
+    assert scanned == {1: 1, 2: 3}
+
+
+def test_header_without_its_events_is_incomplete(tmp_path):
+    archive = EventArchive(tmp_path)
+    # Only the header of a one-event transaction reached disk
+    with open(segment(archive), "wb") as f:
+        f.write(RECORD.pack(*header(1)[:F_COUNT], 1, *header(1)[F_COUNT + 1:]))
+
+    assert not archive.contains(BLOCK, (1).to_bytes(32, "big"))
+    assert list(archive.scan()) == []
+
+
+def test_oversized_transactions_are_rejected(tmp_path):
+    archive = EventArchive(tmp_path)
+    with pytest.raises(ValueError):
+        archive.append(header(1), [event(i) for i in range(COUNT_MAX + 1)])
+    assert not segment(archive).exists()
+
+
+def test_appends_from_another_writer_are_kept(tmp_path):
+    first, second = EventArchive(tmp_path), EventArchive(tmp_path)
+    first.append(header(1), [event(0)])
+    first.flush()
+    second.append(header(2), [event(0)])
+    second.flush()
+    assert first.append(header(3), [])
+    # Buffered before first saw second's write: dropped when first flushes
+    assert first.append(header(2), [event(0)])
+    first.flush()
+    assert sorted(h[F_REF][-1] for h, _ in EventArchive(tmp_path).scan()) == [1, 2, 3]
+    assert first.stats()["records"] == 5
+
+
+def test_appends_are_buffered_until_a_batch_fills(tmp_path):
+    archive = EventArchive(tmp_path, batch_size=3, flush_interval=3600)
+    archive.append(header(1), [event(0)])
+    archive.append(header(2), [])
+    assert not segment(archive).exists()
+    assert archive.contains(BLOCK, (2).to_bytes(32, "big"))
+
+    archive.append(header(3), [event(0)])
+    assert os.path.getsize(segment(archive)) == 5 * RECORD_SIZE
+    archive.append(header(4), [])
+    archive.close()
+    assert os.path.getsize(segment(archive)) == 6 * RECORD_SIZE
+
+
+def test_time_range_scans_only_open_segments_that_can_hold_it(tmp_path, monkeypatch):
+    archive = EventArchive(tmp_path)
+    # One transaction an hour, ten segments a day apart
+    for day in range(10):
+        for hour in range(3):
+            block = BLOCK + day * SEGMENT_BLOCKS + hour * 1000
+            archive.append(header(day * 3 + hour, block=block, timestamp=T0 + day * 86_400 + hour * 3600), [])
+    archive.flush()
+
+    opened = []
+    iter_segment = EventArchive._iter_segment
+    monkeypatch.setattr(EventArchive, "_iter_segment", staticmethod(lambda p: opened.append(p) or iter_segment(p)))
+
+    start, end = T0 + 4 * 86_400 + 3600, T0 + 5 * 86_400 + 3600
+    from_block, to_block = archive.block_bounds(start, end)
+    scanned = [h[F_REF][-1] for h, _ in archive.scan(from_block, to_block, start, end)]
+
+    assert scanned == [13, 14, 15, 16]
+    # Days 4 and 5, plus day 6: its first transaction is past the segment's first block
+    assert [path.name for path in opened] == [segment(archive, BLOCK + d * SEGMENT_BLOCKS).name for d in (4, 5, 6)]
+    assert archive.block_bounds(0) == (0, None)
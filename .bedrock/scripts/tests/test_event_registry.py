@@ -0,0 +1,58 @@
+"""Event decoders generated from the contract ABIs."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from event_registry import ABI_FILES, load_registry
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent
+
+
+def word(value: int) -> str:
+    return f"{value:064x}"
+
+
+def test_topics_are_hashed_from_the_abi_signatures():
+    topics = load_registry().topics()
+    assert topics["Transfer"] == "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+    assert topics["PositionCreated"] == "0x4258e60eecf21b127496b52cfc5b7b5299721db725ba5620a55e2a7c84d43294"
+
+
+def test_decodes_indexed_static_and_dynamic_arguments():
+    registry = load_registry()
+    decoder = registry.get(registry.topics()["OrderCreated"])
+    order_id = "0x" + "ab" * 32
+    participant = "0x" + "c1" * 20
+    dest_url = b"stratum+tcp://pool"
+    # string offset, price_per_day, delivery_at, is_buy, then the string
+    data = bytes.fromhex(
+        word(4 * 32) + word(5_000_000) + word(1_767_225_600) + word(1)
+        + word(len(dest_url)) + dest_url.ljust(32, b"\x00").hex()
+    )
+    args = decoder.decode([decoder.topic, order_id, "0x" + participant[2:].rjust(64, "0")], data)
+    assert args == {
+        "order_id": order_id,
+        "participant": participant,
+        "dest_url": dest_url.decode(),
+        "price_per_day": 5_000_000,
+        "delivery_at": 1_767_225_600,
+        "is_buy": True,
+    }
+    assert decoder.decode([decoder.topic], data) is None
+
+
+def test_analyzer_imports_and_prints_help_without_the_abi_directory(tmp_path):
+    env = dict(os.environ, FUTURES_ABI_DIR=str(tmp_path / "missing"))
+    for args in (["-c", "import analyze_market_maker_fees"], ["analyze_market_maker_fees.py", "--help"]):
+        result = subprocess.run([sys.executable, *args], cwd=SCRIPT_DIR, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+    result = subprocess.run(
+        [sys.executable, "analyze_market_maker_fees.py", "--tx", "0x" + "11" * 32],
+        cwd=SCRIPT_DIR, env=dict(env, ARBISCAN_API_KEY="offline", ALCHEMY_URL="http://127.0.0.1:9"),
+        capture_output=True, text=True,
+    )
+    assert result.returncode == 1
+    assert "FUTURES_ABI_DIR" in result.stdout and ABI_FILES[0] in result.stdout
@@ -0,0 +1,104 @@
+"""AlchemyClient.get_logs: adaptive range splitting, throttling and result format."""
+
+import threading
+
+import pytest
+
+import analyze_market_maker_fees
+from analyze_market_maker_fees import AlchemyClient, RPCError, _is_log_range_error, _is_throttle_error
+
+pytest.importorskip("web3")
+
+CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+MAX_RANGE = 500
+
+
+class FakeProvider:
+    """eth_getLogs over one log per 7 blocks, rejecting ranges wider than MAX_RANGE."""
+
+    def __init__(self, throttle_first: int = 0):
+        self.throttle_left = throttle_first
+        self.ranges: list[tuple[int, int]] = []
+        self._lock = threading.Lock()
+
+    def rpc(self, method: str, params: list):
+        assert method == "eth_getLogs"
+        start, end = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+        with self._lock:
+            self.ranges.append((start, end))
+            if self.throttle_left:
+                self.throttle_left -= 1
+                raise RPCError(429, "Your app has exceeded its compute units per second capacity.")
+        if end - start + 1 > MAX_RANGE:
+            raise RPCError(-32602, "Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range")
+        return [
+            {
+                "address": CONTRACT,
+                "blockNumber": hex(block),
+                "blockHash": "0x" + f"{block:064x}",
+                "transactionHash": "0x" + f"{block:064x}",
+                "transactionIndex": "0x0",
+                "logIndex": "0x0",
+                "topics": ["0x" + "ab" * 32],
+                "data": "0x",
+            }
+            for block in range(start, end + 1) if block % 7 == 0
+        ]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(analyze_market_maker_fees.time, "sleep", lambda seconds: None)
+    return AlchemyClient("http://127.0.0.1:9")
+
+
+@pytest.mark.parametrize("message, code", [
+    ("Your app has exceeded its compute units per second capacity.", 429),
+    ("Too Many Requests", -32005),
+    ("daily request count exceeded, request rate limited", -32005),
+])
+def test_throttling_is_not_a_range_error(message, code):
+    error = RPCError(code, message)
+    assert _is_throttle_error(error) and not _is_log_range_error(error)
+
+
+@pytest.mark.parametrize("message", [
+    "query returned more than 10000 results",
+    "exceed maximum block range: 5000",
+    "Log response size exceeded.",
+    "eth_getLogs is limited to a 10,000 blocks range",
+])
+def test_range_errors(message):
+    assert _is_log_range_error(RPCError(-32000, message))
+
+
+def test_splits_oversized_ranges_and_returns_web3_logs(client):
+    provider = FakeProvider()
+    client.rpc = provider.rpc
+    logs = client.get_logs(CONTRACT, 0, 9_999)
+
+    assert [log.blockNumber for log in logs] == list(range(0, 10_000, 7))
+    assert logs[0].address == analyze_market_maker_fees.to_checksum_address(CONTRACT)
+    assert logs[0].topics[0].hex().removeprefix("0x") == "ab" * 32
+    assert bytes(logs[0].transactionHash) == bytes(32)
+    # The chunks the provider accepted cover the range exactly once
+    accepted = sorted((start, end) for start, end in provider.ranges if end - start + 1 <= MAX_RANGE)
+    assert accepted[0][0] == 0 and accepted[-1][1] == 9_999
+    assert all(previous[1] + 1 == start for previous, (start, _) in zip(accepted, accepted[1:]))
+
+
+def test_rate_limits_back_off_without_shrinking_the_chunk(client):
+    provider = FakeProvider(throttle_first=3)
+    client.rpc = provider.rpc
+    logs = client.get_logs(CONTRACT, 0, 399)
+
+    assert [log.blockNumber for log in logs] == list(range(0, 400, 7))
+    assert provider.ranges == [(0, 399)] * 4
+
+
+def test_persistent_rate_limit_raises_instead_of_bisecting(client):
+    provider = FakeProvider(throttle_first=10**6)
+    client.rpc = provider.rpc
+    with pytest.raises(RPCError):
+        client.get_logs(CONTRACT, 0, 399)
+    assert set(provider.ranges) == {(0, 399)}
@@ -0,0 +1,122 @@
+"""The library API: iter_analyses() streams the same records analyze_date_range() returns."""
+
+from datetime import datetime, timezone
+
+from abi_codec import encode_call
+from analyze_market_maker_fees import MarketMakerAnalyzer, TxRecord, aggregate, method_name
+
+CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+A, B = "0x" + "aa" * 20, "0x" + "bb" * 20
+T0 = 1_767_225_600
+START, END = datetime.fromtimestamp(T0, tz=timezone.utc), datetime.fromtimestamp(T0 + 86_399, tz=timezone.utc)
+BLOCKS = (100, 200)
+TRANSFER = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+def row(n: int, sender: str, method: str, *args) -> dict:
+    signature = {"addMargin": "addMargin(uint256)", "closeOrder": "closeOrder(bytes32)"}[method]
+    return {
+        "blockNumber": str(110 + n), "timeStamp": str(T0 + 600 * n), "transactionIndex": "0",
+        "hash": f"0x{n:064x}", "from": sender, "to": CONTRACT, "input": "0x" + encode_call(signature, *args).hex(),
+        "gasUsed": str(200_000 + n), "gasPrice": "10000000", "isError": "0", "txreceipt_status": "1",
+    }
+
+
+TXLIST = [
+    row(1, A, "addMargin", 5 * 10**6),
+    row(2, B, "closeOrder", int.from_bytes(b"\x07" * 32, "big")),
+    row(3, A, "addMargin", 10**6),
+    row(4, B, "addMargin", 2 * 10**6),
+]
+
+
+def receipt(tx: dict) -> dict:
+    """A receipt whose only log is the sender's wUSDC transfer to the contract."""
+    value = int(tx["input"][10:], 16) if tx["input"].startswith("0xa43be948") else 0
+    return {
+        "blockNumber": tx["blockNumber"],
+        "transactionIndex": 0,
+        "gasUsed": tx["gasUsed"],
+        "status": 1,
+        "logs": [{
+            "address": CONTRACT,
+            "logIndex": 0,
+            "topics": [TRANSFER, "0x" + tx["from"][2:].rjust(64, "0"), "0x" + CONTRACT[2:].rjust(64, "0")],
+            "data": f"0x{value:064x}",
+        }],
+    }
+
+
+class FakeArbiscan:
+    def get_transactions_to_contract(self, contract, start_block, end_block, page, offset):
+        return TXLIST if page == 1 else []
+
+    def get_eth_price(self):
+        return 3000.0
+
+
+class FakeAlchemy:
+    def __init__(self):
+        self.receipts = 0
+
+    def get_transaction_receipt(self, tx_hash: str) -> dict:
+        self.receipts += 1
+        return receipt(next(tx for tx in TXLIST if tx["hash"] == tx_hash))
+
+
+def analyzer() -> MarketMakerAnalyzer:
+    return MarketMakerAnalyzer(
+        futures_contract=CONTRACT, analyze_all_wallets=True, arbiscan=FakeArbiscan(), alchemy=FakeAlchemy()
+    )
+
+
+def test_iter_analyses_is_lazy_and_matches_analyze_date_range():
+    streamed = analyzer()
+    records = streamed.iter_analyses(START, END, block_range=BLOCKS)
+    first = next(records)
+    assert streamed.alchemy.receipts == 1
+    results = [first, *records]
+
+    assert [r.method for r in results] == ["addMargin", "closeOrder", "addMargin", "addMargin"]
+    assert [r.usdc_deposit for r in results] == [5.0, 0.0, 1.0, 2.0]
+    assert results == analyzer().analyze_date_range(START, END, verbose=False, block_range=BLOCKS)
+
+
+def test_filters_run_before_receipts_are_fetched():
+    filtered = analyzer()
+    results = list(filtered.iter_analyses(
+        START, END, filters=lambda tx: method_name(tx.method_id) == "addMargin", block_range=BLOCKS
+    ))
+    assert len(results) == 3
+    assert (filtered.filtered_out, filtered.alchemy.receipts) == (1, 3)
+
+
+def test_prefetched_receipts_are_dropped_when_iteration_ends():
+    scanned = analyzer()
+
+    def prefetching_scan(start_block, end_block):
+        # Like the bloom scan: receipts arrive with the transactions, in scope or not
+        for tx in TXLIST:
+            record = TxRecord.from_txlist(tx, scanned.addresses)
+            scanned.prefetched_receipts[record.tx_hash] = receipt(tx)
+            yield record
+
+    scanned.iter_transactions = prefetching_scan
+    only_a = scanned.addresses.intern(A)
+    results = list(scanned.iter_analyses(START, END, filters=lambda tx: tx.sender == only_a, block_range=BLOCKS))
+    assert len(results) == 2
+    assert scanned.alchemy.receipts == 0
+    assert scanned.prefetched_receipts == {}
+
+    # Abandoning the iterator early drops them too
+    records = scanned.iter_analyses(START, END, block_range=BLOCKS)
+    next(records)
+    records.close()
+    assert scanned.prefetched_receipts == {}
+
+
+def test_aggregate_consumes_the_iterator():
+    report = aggregate(analyzer().iter_analyses(START, END, block_range=BLOCKS), START, END)
+    assert report.totals.transactions == 4
+    assert report.totals.usdc_deposits == 8.0
+    assert report.methods["addMargin"].count == 3
@@ -0,0 +1,112 @@
+"""EMF documents and PutLogEvents batches stay inside CloudWatch's limits."""
+
+import json
+
+import pytest
+
+from metrics_sink import (
+    EMF_MAX_DIMENSIONS,
+    EMF_MAX_METRICS,
+    PUT_LOG_EVENTS_EVENT_OVERHEAD,
+    PUT_LOG_EVENTS_MAX_BYTES,
+    PUT_LOG_EVENTS_MAX_EVENTS,
+    PUT_LOG_EVENTS_MAX_SPAN,
+    MetricPoint,
+    emf_events,
+    put_log_events_batches,
+    statsd_datagrams,
+)
+
+HOUR = 1_767_225_600
+NAMESPACE = "FuturesMarketplace/test"
+
+
+def batch_bytes(batch: list[dict]) -> int:
+    return sum(len(event["message"].encode()) + PUT_LOG_EVENTS_EVENT_OVERHEAD for event in batch)
+
+
+def test_emf_splits_documents_at_the_metric_limit():
+    count = 2 * EMF_MAX_METRICS + 7
+    points = [MetricPoint(f"Metric{i}", i, HOUR, {"Method": "multicall"}) for i in range(count)]
+    documents = [json.loads(message) for _, message in emf_events(points, NAMESPACE)]
+
+    assert [len(d["_aws"]["CloudWatchMetrics"][0]["Metrics"]) for d in documents] == [100, 100, 7]
+    names = [m["Name"] for d in documents for m in d["_aws"]["CloudWatchMetrics"][0]["Metrics"]]
+    assert names == [f"Metric{i}" for i in range(count)]
+    for document in documents:
+        assert document["Method"] == "multicall"
+        assert document["_aws"]["Timestamp"] == HOUR * 1000
+        assert document["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Method"]]
+        for metric in document["_aws"]["CloudWatchMetrics"][0]["Metrics"]:
+            assert document[metric["Name"]] == int(metric["Name"][len("Metric"):])
+
+
+def test_emf_groups_by_hour_and_dimensions_in_time_order():
+    points = [
+        MetricPoint("GasFeeUsd", 2.0, HOUR + 3600, {"Method": "multicall"}),
+        MetricPoint("GasFeeUsd", 1.0, HOUR, {"Method": "multicall"}),
+        MetricPoint("Transactions", 4, HOUR, {"Method": "multicall"}),
+        MetricPoint("GasFeeUsd", 0.5, HOUR, {"Method": "addMargin"}),
+    ]
+    events = list(emf_events(points, NAMESPACE))
+    assert [timestamp for timestamp, _ in events] == [HOUR * 1000, HOUR * 1000, (HOUR + 3600) * 1000]
+    first = json.loads(events[0][1])
+    assert (first["GasFeeUsd"], first["Transactions"]) == (1.0, 4)
+
+
+def test_emf_rejects_too_many_dimensions():
+    dimensions = {f"D{i}": "x" for i in range(EMF_MAX_DIMENSIONS + 1)}
+    with pytest.raises(ValueError):
+        list(emf_events([MetricPoint("GasFeeUsd", 1.0, HOUR, dimensions)], NAMESPACE))
+
+
+def test_batches_respect_the_event_count_limit():
+    events = [(HOUR * 1000, "{}")] * (2 * PUT_LOG_EVENTS_MAX_EVENTS + 1)
+    assert [len(b) for b in put_log_events_batches(events)] == [10_000, 10_000, 1]
+
+
+def test_batches_respect_the_byte_limit():
+    message = "x" * 100_000
+    events = [(HOUR * 1000 + i, message) for i in range(25)]
+    batches = list(put_log_events_batches(events))
+
+    assert all(batch_bytes(batch) <= PUT_LOG_EVENTS_MAX_BYTES for batch in batches)
+    assert [len(b) for b in batches] == [10, 10, 5]
+    assert [e["timestamp"] for b in batches for e in b] == [t for t, _ in events]
+
+
+def test_batches_span_at_most_24_hours():
+    events = [(HOUR * 1000 + i * 3_600_000, "{}") for i in range(72)]
+    batches = list(put_log_events_batches(events))
+
+    for batch in batches:
+        assert batch[-1]["timestamp"] - batch[0]["timestamp"] <= PUT_LOG_EVENTS_MAX_SPAN * 1000
+    assert sum(len(b) for b in batches) == 72
+    assert len(batches) == 3
+
+
+def test_emf_run_batches_within_all_limits():
+    # A week of hourly documents for 60 wallets
+    points = [
+        MetricPoint(name, float(h * w), HOUR + h * 3600, {"Wallet": f"0x{w:040x}"})
+        for h in range(168)
+        for w in range(60)
+        for name in ("GasFeeUsd", "UsdcFees", "Transactions")
+    ]
+    batches = list(put_log_events_batches(emf_events(points, NAMESPACE)))
+
+    assert sum(len(b) for b in batches) == 168 * 60
+    for batch in batches:
+        assert len(batch) <= PUT_LOG_EVENTS_MAX_EVENTS
+        assert batch_bytes(batch) <= PUT_LOG_EVENTS_MAX_BYTES
+        assert batch[-1]["timestamp"] - batch[0]["timestamp"] <= PUT_LOG_EVENTS_MAX_SPAN * 1000
+        timestamps = [event["timestamp"] for event in batch]
+        assert timestamps == sorted(timestamps)
+
+
+def test_statsd_datagrams_stay_under_the_limit():
+    lines = [f"futures.gas_fee_usd:{i}|g|#wallet:0x{i:040x}|T{HOUR}" for i in range(500)]
+    datagrams = list(statsd_datagrams(lines, max_bytes=1432))
+
+    assert all(len(d) <= 1432 for d in datagrams)
+    assert [line for d in datagrams for line in d.split("\n")] == lines
@@ -0,0 +1,113 @@
+"""ResponseCache storage and snapshots."""
+
+import gzip
+import io
+import json
+
+import pytest
+
+from response_cache import ResponseCache, SnapshotError
+
+
+def test_put_get_and_persistence(tmp_path):
+    cache = ResponseCache(tmp_path)
+    assert cache.get("receipt", "0x01") is None
+    cache.put("receipt", "0x01", {"logs": [1, 2]}, block=10)
+    cache.put("receipt", "0x01", {"logs": [3]}, block=10)
+    assert cache.get("receipt", "0x01") == {"logs": [3]}
+    assert cache.get("tx", "0x01") is None
+    cache.close()
+
+    reopened = ResponseCache(tmp_path)
+    assert reopened.get("receipt", "0x01") == {"logs": [3]}
+    reopened.close()
+
+
+def test_max_age(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path)
+    cache.put("eth_price", "current", 3300.0)
+    assert cache.get("eth_price", "current", max_age=900) == 3300.0
+    monkeypatch.setattr("response_cache.time.time", lambda: 2**40)
+    assert cache.get("eth_price", "current", max_age=900) is None
+    assert cache.get("eth_price", "current") == 3300.0
+    cache.close()
+
+
+def filled_cache(directory, blocks) -> ResponseCache:
+    cache = ResponseCache(directory)
+    for block in blocks:
+        cache.put("receipt", f"0x{block:x}", {"block": block}, block=block)
+        cache.put("block", str(block), {"timestamp": 1_767_225_600 + block}, block=block)
+    cache.put("eth_price", "current", 3300.0)
+    return cache
+
+
+def export(cache, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    cache.export_snapshot(buffer, **kwargs)
+    return buffer.getvalue()
+
+
+def entries(cache) -> list:
+    """Snapshot rows without their stored_at time."""
+    lines = gzip.decompress(export(cache)).splitlines()[1:-1]
+    return [(namespace, key, block, value) for namespace, key, block, _, value in map(json.loads, lines)]
+
+
+def test_snapshot_round_trip_skips_short_lived_values(tmp_path):
+    source = filled_cache(tmp_path / "a", range(10))
+    artifact = export(source)
+    target = ResponseCache(tmp_path / "b")
+
+    assert target.import_snapshot(io.BytesIO(artifact)) == (20, 20)
+    assert target.get("receipt", "0x9") == {"block": 9}
+    assert target.get("block", "3") == {"timestamp": 1_767_225_603}
+    assert target.get("eth_price", "current") is None
+    assert entries(target) == entries(source)
+    assert export(source) == artifact  # no name or mtime in the gzip header
+    source.close()
+    target.close()
+
+
+def test_snapshot_import_deduplicates_and_keeps_existing_entries(tmp_path):
+    first = filled_cache(tmp_path / "a", range(0, 6))
+    second = filled_cache(tmp_path / "b", range(4, 10))
+    target = ResponseCache(tmp_path / "c")
+    target.put("receipt", "0x4", {"block": 4, "local": True}, block=4)
+
+    assert target.import_snapshot(io.BytesIO(export(first))) == (12, 11)
+    assert target.import_snapshot(io.BytesIO(export(second))) == (12, 8)
+    assert target.import_snapshot(io.BytesIO(export(second))) == (12, 0)
+    assert target.get("receipt", "0x4") == {"block": 4, "local": True}
+
+    merged = filled_cache(tmp_path / "d", range(10))
+    merged.put("receipt", "0x4", {"block": 4, "local": True}, block=4)
+    assert entries(target) == entries(merged)
+    for cache in (first, second, target, merged):
+        cache.close()
+
+
+def test_snapshot_block_range(tmp_path):
+    cache = filled_cache(tmp_path / "a", range(10))
+    target = ResponseCache(tmp_path / "b")
+    assert target.import_snapshot(io.BytesIO(export(cache, from_block=3, to_block=5))) == (6, 6)
+    assert target.get("receipt", "0x2") is None
+    assert target.get("receipt", "0x5") == {"block": 5}
+    cache.close()
+    target.close()
+
+
+def test_corrupt_or_truncated_snapshot_changes_nothing(tmp_path):
+    cache = filled_cache(tmp_path / "a", range(10))
+    lines = gzip.decompress(export(cache)).splitlines(keepends=True)
+    tampered = lines[:3] + [lines[3].replace(b"timestamp", b"timestamq")] + lines[4:]
+    target = ResponseCache(tmp_path / "b")
+
+    for body in (lines[:-1], tampered, [b"not json\n"]):
+        with pytest.raises(SnapshotError):
+            target.import_snapshot(io.BytesIO(gzip.compress(b"".join(body))))
+    with pytest.raises(SnapshotError):
+        target.import_snapshot(io.BytesIO(export(cache)[:-40]))
+    assert entries(target) == []
+    cache.close()
+    target.close()
@@ -0,0 +1,89 @@
+"""--rolling: trailing windows per hour, partial until they span back to the start of the data."""
+
+import csv
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from analyze_market_maker_fees import Aggregator, RollingWindow, TransactionAnalysis, aggregate, write_hourly_csv
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def analysis(hours: float, gas_usd: float = 1.0, method: str = "multicall") -> TransactionAnalysis:
+    return TransactionAnalysis(
+        timestamp=START + timedelta(hours=hours),
+        tx_hash=f"0x{int(hours * 60):064x}",
+        wallet="0x" + "aa" * 20,
+        action="",
+        method=method,
+        usdc_fees=0.5,
+        usdc_deposit=0.0,
+        usdc_withdrawal=0.0,
+        gas_fee_eth=gas_usd / 3000,
+        gas_fee_usd=gas_usd,
+        eth_price_usd=3000.0,
+        orders_created=1,
+        orders_closed=0,
+        buy_orders=1,
+        sell_orders=0,
+    )
+
+
+def test_window_expires_slots_and_is_partial_until_it_spans_its_width():
+    window = RollingWindow(slots=3, slot_seconds=10, width=1)
+    window.add(0, (1.0,))
+    window.add(15, (2.0,))
+    assert window.sums() == [3.0] and window.partial
+    window.add(25, (4.0,))
+    assert window.sums() == [7.0] and not window.partial
+    window.advance(35)
+    assert window.sums() == [6.0]
+    window.add(5, (8.0,))  # Older than the window: dropped
+    window.advance(1000)
+    assert window.sums() == [0.0]
+
+
+def test_hourly_windows_are_partial_until_they_reach_back_to_the_start_date():
+    records = [analysis(h + 0.5, gas_usd=h + 1) for h in range(30)]
+    report = aggregate(records, START, START + timedelta(hours=29, minutes=59), rolling=True)
+    hours = report.hourly()
+
+    assert hours[0].rolling["1h"]["gas_usd"] == 1.0
+    assert hours[0].rolling_partial == ("24h", "7d")
+    assert hours[22].rolling_partial == ("24h", "7d")
+    assert hours[23].rolling_partial == ("7d",)
+    # Hour 29 holds gas 30; its 24h window the hours 6..29
+    assert hours[29].rolling["24h"]["gas_usd"] == sum(range(7, 31))
+    assert hours[29].rolling["7d"]["gas_usd"] == sum(range(1, 31))
+
+
+def test_windows_start_at_the_start_date_not_the_first_analysis():
+    # Nothing happened in the first day of the range: the 24h window is full once it has passed
+    report = aggregate([analysis(30)], START, START + timedelta(hours=30, minutes=59), rolling=True)
+    assert report.hourly()[-1].rolling_partial == ("7d",)
+
+
+def test_out_of_order_lists_are_sorted_and_iterators_are_rejected():
+    records = [analysis(5), analysis(1), analysis(3)]
+    report = aggregate(records, START, START + timedelta(hours=5, minutes=59), rolling=True)
+    assert [bucket.rolling["24h"]["transactions"] for bucket in report.hourly()] == [0, 1, 1, 2, 2, 3]
+
+    aggregator = Aggregator(START, START + timedelta(hours=5, minutes=59), rolling=True)
+    aggregator.add(analysis(5))
+    with pytest.raises(ValueError, match="time order"):
+        aggregator.add(analysis(1))
+    # Earlier in the same hour is still fine: the hour is not reported yet
+    aggregator.add(analysis(5.1))
+    aggregator.add(analysis(5))
+
+
+def test_hourly_csv_lists_the_partial_windows(tmp_path):
+    output = tmp_path / "hourly.csv"
+    end = START + timedelta(hours=23, minutes=59)
+    write_hourly_csv([analysis(h) for h in range(24)], str(output), START, end, rolling=True)
+    rows = list(csv.DictReader(output.open()))
+
+    assert rows[0]["Partial Windows"] == "24h 7d"
+    assert rows[-1]["Partial Windows"] == "7d"
+    assert rows[-1]["Gas USD 24h"] == "24.00"
@@ -0,0 +1,137 @@
+"""RunJournal crash recovery, and resumed runs writing the same output as uninterrupted ones."""
+
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from analyze_market_maker_fees import MarketMakerAnalyzer, TransactionAnalysis, write_csv
+from run_journal import JOURNAL_VERSION, JournalMismatch, RunJournal
+
+PARAMS = {"contract": "0xabc", "start": "2026-01-01", "end": "2026-01-02"}
+CONTRACT = bytes.fromhex("11" * 20)
+
+
+def analysis(i: int) -> TransactionAnalysis:
+    # Fee and gas values that need every digit to round-trip
+    return TransactionAnalysis(
+        timestamp=datetime(2026, 1, 1, i % 24, i % 60, tzinfo=timezone.utc),
+        tx_hash=f"0x{i:064x}",
+        wallet="0x" + "22" * 20,
+        action=f"Create {i % 3} orders",
+        method="multicall",
+        usdc_fees=i / 7,
+        usdc_deposit=0.0,
+        usdc_withdrawal=0.1 * i,
+        gas_fee_eth=1.23456789e-6 * (i + 1) / 3,
+        gas_fee_usd=0.0041 * i / 9,
+        eth_price_usd=3123.456789,
+        orders_created=i % 3,
+        orders_closed=i % 2,
+        buy_orders=i % 3,
+        sell_orders=0,
+        cohorts=[[1_767_312_000 + i, 500_000 + i, True, 1 / (i + 1)]],
+    )
+
+
+def tx(i: int) -> SimpleNamespace:
+    return SimpleNamespace(tx_hash=i.to_bytes(32, "big"))
+
+
+def journaled_analyzer(journal: RunJournal, analyzed: list) -> MarketMakerAnalyzer:
+    """An analyzer whose analyze_transaction is local and records each call."""
+    analyzer = MarketMakerAnalyzer.__new__(MarketMakerAnalyzer)
+    analyzer._contract = CONTRACT
+    analyzer.journal = journal
+
+    def analyze_transaction(record):
+        i = int.from_bytes(record.tx_hash, "big")
+        analyzed.append(i)
+        return analysis(i) if i % 5 else None  # every fifth transaction is skipped
+
+    analyzer.analyze_transaction = analyze_transaction
+    return analyzer
+
+
+def run(journal: RunJournal, count: int, analyzed: list) -> list:
+    analyzer = journaled_analyzer(journal, analyzed)
+    results = [analyzer.analyze_journaled(tx(i)) for i in range(count)]
+    return [r for r in results if r is not None]
+
+
+def test_resume_drops_torn_line_and_matches_uninterrupted_journal(tmp_path):
+    whole = tmp_path / "whole.journal"
+    journal = RunJournal(str(whole), PARAMS)
+    journal.set_value("eth_price", 3123.45)
+    for i in range(50):
+        journal.record(f"k{i}", {"n": i, "x": i / 3})
+    journal.close()
+
+    crashed = tmp_path / "crashed.journal"
+    journal = RunJournal(str(crashed), PARAMS, batch_size=10)
+    journal.set_value("eth_price", 3123.45)
+    for i in range(30):
+        journal.record(f"k{i}", {"n": i, "x": i / 3})
+    journal.flush()
+    journal._file.write(b'{"type":"entry","key":"k30","va')  # killed mid-write
+    journal._file.close()
+
+    resumed = RunJournal(str(crashed), PARAMS, resume=True)
+    assert len(resumed) == 30
+    assert resumed.values == {"eth_price": 3123.45}
+    for i in range(30, 50):
+        resumed.record(f"k{i}", {"n": i, "x": i / 3})
+    resumed.close()
+
+    assert crashed.read_bytes() == whole.read_bytes()
+
+
+def test_resume_rejects_other_parameters(tmp_path):
+    path = tmp_path / "run.journal"
+    RunJournal(str(path), PARAMS).close()
+    with pytest.raises(JournalMismatch):
+        RunJournal(str(path), {**PARAMS, "end": "2026-01-03"}, resume=True)
+
+
+def test_resume_rejects_other_journal_versions(tmp_path):
+    path = tmp_path / "run.journal"
+    path.write_text(json.dumps({"type": "run", "version": JOURNAL_VERSION - 1, "params": PARAMS}) + "\n")
+    with pytest.raises(JournalMismatch, match="version"):
+        RunJournal(str(path), PARAMS, resume=True)
+
+
+def test_without_resume_an_existing_journal_is_replaced(tmp_path):
+    path = tmp_path / "run.journal"
+    journal = RunJournal(str(path), PARAMS)
+    journal.record("k0", 1)
+    journal.close()
+    journal = RunJournal(str(path), PARAMS)
+    assert len(journal) == 0
+    journal.close()
+
+
+def test_resumed_run_writes_identical_csv(tmp_path):
+    journal = RunJournal(str(tmp_path / "whole.journal"), PARAMS)
+    write_csv(run(journal, 40, []), str(tmp_path / "whole.csv"))
+    journal.close()
+
+    # First attempt dies after 25 transactions; the resume only analyzes the rest
+    path = str(tmp_path / "resumed.journal")
+    journal = RunJournal(path, PARAMS)
+    run(journal, 25, [])
+    journal.close()
+    analyzed = []
+    journal = RunJournal(path, PARAMS, resume=True)
+    write_csv(run(journal, 40, analyzed), str(tmp_path / "resumed.csv"))
+    journal.close()
+
+    assert analyzed == list(range(25, 40))
+    assert (tmp_path / "resumed.csv").read_bytes() == (tmp_path / "whole.csv").read_bytes()
+
+
+def test_journal_round_trips_every_analysis_field():
+    for i in (1, 7, 39):
+        original = analysis(i)
+        replayed = TransactionAnalysis.from_journal(json.loads(json.dumps(original.to_journal())))
+        assert replayed == original
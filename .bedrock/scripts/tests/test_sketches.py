@@ -0,0 +1,153 @@
+import json
+import random
+
+import pytest
+
+from sketches import HyperLogLog, TDigest
+
+
+def _exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _rank(values, value):
+    return sum(v <= value for v in values) / len(values)
+
+
+def test_tdigest_quantiles_track_exact_ranks():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 1.5) for _ in range(20_000)]
+    digest = TDigest()
+    for value in values:
+        digest.add(value)
+
+    assert len(digest) == len(values)
+    assert digest.quantile(0.0) == min(values)
+    assert digest.quantile(1.0) == max(values)
+    for q in (0.01, 0.25, 0.5, 0.75, 0.95, 0.99):
+        # Rank error is what a t-digest bounds; tighter in the tails
+        tolerance = 0.005 if q in (0.01, 0.99) else 0.02
+        assert abs(_rank(values, digest.quantile(q)) - q) <= tolerance
+
+
+def test_tdigest_stays_bounded():
+    digest = TDigest(compression=50)
+    for i in range(50_000):
+        digest.add(i)
+    digest.quantile(0.5)
+    assert len(digest._means) <= 50
+    assert sum(digest._weights) == 50_000
+
+
+def test_tdigest_merge_matches_single_digest():
+    rng = random.Random(11)
+    values = [rng.gauss(100, 15) for _ in range(12_000)]
+    whole = TDigest()
+    parts = [TDigest() for _ in range(4)]
+    for i, value in enumerate(values):
+        whole.add(value)
+        parts[i % 4].add(value)
+
+    merged = TDigest()
+    for part in parts:
+        merged.merge(part)
+
+    assert merged.count == whole.count
+    assert (merged.min, merged.max) == (whole.min, whole.max)
+    for q in (0.05, 0.5, 0.95):
+        assert abs(_rank(values, merged.quantile(q)) - q) <= 0.01
+        assert abs(merged.quantile(q) - _exact_quantile(values, q)) <= 1.0
+
+
+def test_tdigest_merge_ignores_empty():
+    digest = TDigest()
+    digest.add(3.0)
+    digest.merge(TDigest())
+    assert digest.count == 1
+    assert digest.quantile(0.5) == 3.0
+
+
+def test_tdigest_round_trips_through_json():
+    rng = random.Random(3)
+    digest = TDigest()
+    for _ in range(5_000):
+        digest.add(rng.expovariate(0.1))
+
+    restored = TDigest.from_dict(json.loads(json.dumps(digest.to_dict())))
+
+    assert restored.count == digest.count
+    assert (restored.min, restored.max) == (digest.min, digest.max)
+    for q in (0.01, 0.5, 0.99):
+        assert restored.quantile(q) == digest.quantile(q)
+    assert restored.to_dict() == digest.to_dict()
+
+
+def test_tdigest_empty_round_trip():
+    restored = TDigest.from_dict(json.loads(json.dumps(TDigest().to_dict())))
+    assert restored.count == 0
+    assert restored.quantile(0.5) is None
+
+
+def _wallet(i):
+    return f"0x{i:040x}"
+
+
+def test_hll_estimate_within_error_bound():
+    for n in (0, 1, 10, 300, 5_000, 100_000):
+        hll = HyperLogLog()
+        for i in range(n):
+            hll.add(_wallet(i))
+        # 3 standard errors, with an absolute floor for tiny sets
+        assert abs(hll.estimate() - n) <= max(3 * hll.relative_error * n, 1.0)
+
+
+def test_hll_ignores_duplicates():
+    hll = HyperLogLog()
+    for _ in range(5):
+        for i in range(2_000):
+            hll.add(_wallet(i))
+    assert abs(hll.estimate() - 2_000) <= 3 * hll.relative_error * 2_000
+
+
+def test_hll_sparse_and_dense_agree():
+    sparse = HyperLogLog()
+    for i in range(200):
+        sparse.add(_wallet(i))
+    assert sparse._registers is None
+
+    dense = HyperLogLog()
+    for i in range(200):
+        dense.add(_wallet(i))
+    dense._densify()
+    assert dense.estimate() == sparse.estimate()
+
+
+def test_hll_merge_equals_union():
+    whole = HyperLogLog()
+    hours = [HyperLogLog() for _ in range(24)]
+    for i in range(30_000):
+        # Overlapping hourly sets: every wallet shows up in two hours
+        whole.add(_wallet(i))
+        hours[i % 24].add(_wallet(i))
+        hours[(i + 1) % 24].add(_wallet(i))
+
+    day = HyperLogLog()
+    for hour in hours:
+        day.merge(hour)
+    assert day.estimate() == whole.estimate()
+
+
+def test_hll_merge_rejects_mixed_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+
+
+def test_hll_round_trips_through_json():
+    for n in (50, 20_000):
+        hll = HyperLogLog()
+        for i in range(n):
+            hll.add(_wallet(i))
+        restored = HyperLogLog.from_dict(json.loads(json.dumps(hll.to_dict())))
+        assert restored.estimate() == hll.estimate()
+        assert restored.to_dict() == hll.to_dict()
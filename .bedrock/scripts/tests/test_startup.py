@@ -0,0 +1,24 @@
+"""Startup stays cheap: importing the analyzer loads no feature modules (timings: bench_startup.py)."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent
+
+# Modules only the features that need them may import
+FEATURE_MODULES = (
+    "web3", "requests", "numpy", "boto3",
+    "metrics_sink", "sketches", "run_journal", "response_cache",
+    "concurrent.futures", "hashlib", "array", "socket", "sqlite3",
+)
+
+
+def test_import_loads_no_feature_modules():
+    code = (
+        "import sys, analyze_market_maker_fees; "
+        f"print(' '.join(name for name in {FEATURE_MODULES!r} if name in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == []
+
@@ -0,0 +1,98 @@
+"""--state-snapshots: one Multicall3 aggregate3 eth_call per hour-end block, batched and cached."""
+
+from datetime import datetime, timedelta, timezone
+
+from abi_codec import decode_uint, to_checksum_address
+from analyze_market_maker_fees import MULTICALL3_ADDRESS, AlchemyClient, MarketMakerAnalyzer
+from response_cache import ResponseCache
+
+CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+A, B = "0x" + "aa" * 20, "0x" + "bb" * 20
+T0 = 1_767_225_600
+HOURS = [datetime.fromtimestamp(T0, tz=timezone.utc) + timedelta(hours=h) for h in range(3)]
+
+
+def word(value: int) -> bytes:
+    return (value % 2**256).to_bytes(32, "big")
+
+
+def aggregate3_result(results: list[tuple[bool, bytes]]) -> bytes:
+    """ABI-encode aggregate3's (bool success, bytes returnData)[] return value."""
+    tails = [word(int(ok)) + word(64) + word(len(data)) + data + b"\x00" * (-len(data) % 32) for ok, data in results]
+    offsets, position = [], len(results) * 32
+    for tail in tails:
+        offsets.append(word(position))
+        position += len(tail)
+    return word(32) + word(len(results)) + b"".join(offsets) + b"".join(tails)
+
+
+class FakeSession:
+    """Four blocks a second from T0; state read at a block depends on the block, B's min margin reverts."""
+
+    def __init__(self):
+        self.eth_calls: list[list[int]] = []
+
+    def post(self, url, json, timeout):
+        calls = [call for call in json if call["method"] == "eth_call"]
+        if calls:
+            self.eth_calls.append([int(call["params"][1], 16) for call in calls])
+        return FakeResponse([{"jsonrpc": "2.0", "id": call["id"], "result": self.result(call)} for call in json])
+
+    def result(self, call: dict):
+        block = int(call["params"][-1] if call["method"] == "eth_call" else call["params"][0], 16)
+        if call["method"] == "eth_getBlockByNumber":
+            return {"number": hex(block), "timestamp": hex(T0 + block // 4)}
+        target, data = call["params"][0]["to"], bytes.fromhex(call["params"][0]["data"][2:])
+        assert target == MULTICALL3_ADDRESS and data[:4].hex() == "82ad56cb"
+        assert decode_uint(data, 4 + 32) == 7  # The market price, then three calls per wallet
+        results = [
+            (True, word(5_000_000 + block)),
+            (True, word(100 * 10**6)), (True, word(20 * 10**6)), (True, word(-3 * 10**6)),
+            (True, word(50 * 10**6)), (False, b""), (True, word(0)),
+        ]
+        return "0x" + aggregate3_result(results).hex()
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+def analyzer(cache=None) -> tuple[MarketMakerAnalyzer, FakeSession]:
+    alchemy = AlchemyClient("http://127.0.0.1:9", cache=cache)
+    alchemy._session = session = FakeSession()
+    return MarketMakerAnalyzer(futures_contract=CONTRACT, alchemy=alchemy, arbiscan=object(), cache=cache), session
+
+
+def test_one_aggregate3_call_per_hour_end_block_in_one_batch():
+    snapshots_analyzer, session = analyzer()
+    snapshots = snapshots_analyzer.state_snapshots(HOURS, (0, 100_000), [A, B])
+
+    # The last block of each hour (4 blocks a second), all read in one JSON-RPC batch
+    assert [snapshots[hour].block for hour in HOURS] == [14_399, 28_799, 43_199]
+    assert session.eth_calls == [[14_399, 28_799, 43_199]]
+
+    first = snapshots[HOURS[0]]
+    assert first.market_price == 5.0 + 14_399 / 10**6
+    assert list(first.wallets) == [to_checksum_address(A), to_checksum_address(B)]
+    a, b = first.wallets.values()
+    assert (a.margin_balance, a.min_margin, a.collateral_deficit) == (100.0, 20.0, -3.0)
+    assert (b.margin_balance, b.min_margin, b.collateral_deficit) == (50.0, None, 0.0)
+    # Totals skip the wallets whose call reverted
+    assert (first.total("margin_balance"), first.total("min_margin")) == (150.0, 20.0)
+
+
+def test_snapshots_are_cached_per_block(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    first, session = analyzer(cache)
+    expected = first.state_snapshots(HOURS, (0, 100_000), [A, B])
+
+    again, session = analyzer(cache)
+    assert again.state_snapshots(HOURS, (0, 100_000), [A, B]) == expected
+    assert session.eth_calls == []
@@ -0,0 +1,174 @@
+"""--source subgraph: cursor paging over a recorded page set, and placing closures in transactions."""
+
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from abi_codec import encode_call, encode_uint
+from analyze_market_maker_fees import METHOD_IDS, MarketMakerAnalyzer, SubgraphClient, SubgraphError, _order_calls
+
+PAGES = Path(__file__).parent / "fixtures" / "subgraph_pages.json"
+
+CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+A, B = "0x" + "aa" * 20, "0x" + "bb" * 20
+T0 = 1_767_225_600
+D, D_OLD = 1_767_830_400, 1_767_139_200
+P, P2, P3 = 5_000_000, 5_100_000, 4_900_000
+TX = {i: "0x" + f"{0xf0 + i:02x}" * 32 for i in range(1, 7)}
+
+
+class RecordedTransport:
+    """Replays recorded (request variables, response) exchanges in order, checking each request."""
+
+    def __init__(self, path: Path):
+        self.exchanges = json.loads(path.read_text())
+        self.requests = 0
+
+    def __call__(self, url: str, payload: dict) -> dict:
+        exchange = self.exchanges[self.requests]
+        self.requests += 1
+        assert f"{exchange['collection']}(" in payload["query"]
+        assert payload["variables"] == exchange["variables"]
+        return exchange["response"]
+
+
+def create_order(price: int, delivery_at: int, qty: int) -> bytes:
+    """createOrder(uint256,uint256,string,int8) calldata."""
+    url = b"stratum+tcp://pool.example:3333"
+    return (
+        bytes.fromhex(METHOD_IDS["createOrder"][2:])
+        + encode_uint(price) + encode_uint(delivery_at) + encode_uint(4 * 32) + (qty % 2**256).to_bytes(32, "big")
+        + encode_uint(len(url)) + url.ljust(64, b"\x00")
+    )
+
+
+def multicall(*calls: bytes) -> bytes:
+    """multicall(bytes[]) calldata."""
+    tails = [encode_uint(len(call)) + call + b"\x00" * (-len(call) % 32) for call in calls]
+    offsets, position = [], 32 * len(calls)
+    for tail in tails:
+        offsets.append(encode_uint(position))
+        position += len(tail)
+    return (
+        bytes.fromhex(METHOD_IDS["multicall"][2:])
+        + encode_uint(32) + encode_uint(len(calls)) + b"".join(offsets) + b"".join(tails)
+    )
+
+
+def txlist_row(n: int, sender: str, block: int, timestamp: int, calldata: bytes, index: int = 0) -> dict:
+    return {
+        "blockNumber": str(block), "timeStamp": str(timestamp), "transactionIndex": str(index),
+        "hash": TX[n], "from": sender, "to": CONTRACT, "input": "0x" + calldata.hex(),
+        "gasUsed": "400000", "gasPrice": "10000000", "isError": "0", "txreceipt_status": "1",
+    }
+
+
+TXLIST = [
+    # A places two buys and a sell
+    txlist_row(1, A, 110, T0, multicall(create_order(P, D, 1), create_order(P, D, 1), create_order(P2, D, -1))),
+    # B sells into A's first buy
+    txlist_row(2, B, 120, T0 + 600, create_order(P, D, -1)),
+    # Two transactions from A in the same second: an explicit close, and a buy offsetting A's own sell
+    txlist_row(3, A, 130, T0 + 1200, bytes.fromhex(METHOD_IDS["closeOrder"][2:]) + encode_uint(2)),
+    txlist_row(4, A, 131, T0 + 1200, create_order(P2, D, 1)),
+    # Again in one second: a deposit, and a new order (the closure of A's outdated order has no calldata evidence)
+    txlist_row(6, A, 140, T0 + 1800, encode_call("addMargin(uint256)", 10**6), index=0),
+    txlist_row(5, A, 140, T0 + 1800, multicall(create_order(P3, D, 1)), index=1),
+]
+
+
+class FakeArbiscan:
+    def get_transactions_to_contract(self, contract, start_block, end_block, page, offset):
+        return TXLIST if page == 1 else []
+
+    def get_transactions(self, address, start_block, end_block, page, offset):
+        return [tx for tx in TXLIST if tx["from"] == address.lower()] if page == 1 else []
+
+    def get_token_transfers(self, contract, start_block, end_block):
+        return []
+
+    def get_eth_price(self):
+        return 3000.0
+
+
+def test_iter_entities_pages_by_id_cursor():
+    transport = RecordedTransport(PAGES)
+    client = SubgraphClient("http://subgraph.test", transport=transport, page_size=2)
+    where = {"blockNumber_gte": "100", "blockNumber_lte": "200"}
+
+    orders = list(client.iter_entities("orders", "Order_filter", "id", where))
+
+    assert [int(order["id"], 16) for order in orders] == [1, 2, 3, 5]
+    assert transport.requests == 3  # two full pages, then an empty one
+
+
+def test_subgraph_errors_raise():
+    client = SubgraphClient("http://subgraph.test", transport=lambda url, payload: {"errors": [{"message": "boom"}]})
+    with pytest.raises(SubgraphError, match="boom"):
+        client.query("{ orders { id } }")
+
+
+def test_order_calls_from_calldata():
+    assert _order_calls("0x" + multicall(create_order(P, D, 2), create_order(P2, D, -1)).hex()) == (
+        (P, D, True), (P2, D, False),
+    )
+    close = bytes.fromhex(METHOD_IDS["closeOrder"][2:]) + encode_uint(7)
+    assert _order_calls("0x" + close.hex()) == (encode_uint(7),)
+    assert _order_calls("0x" + multicall(create_order(P, D, 1)).hex()[:-64]) == ()
+    assert _order_calls("0xzz") == ()
+
+
+def run(transport: RecordedTransport, verbose: bool = False, **scope) -> tuple[MarketMakerAnalyzer, list]:
+    analyzer = MarketMakerAnalyzer(
+        futures_contract=CONTRACT,
+        arbiscan=FakeArbiscan(),
+        alchemy=object(),
+        subgraph=SubgraphClient("http://subgraph.test", transport=transport, page_size=2),
+        **scope,
+    )
+    results = analyzer.analyze_date_range(
+        datetime.fromtimestamp(T0, tz=timezone.utc),
+        datetime.fromtimestamp(T0 + 86_400, tz=timezone.utc),
+        verbose=verbose,
+        block_range=(100, 200),
+    )
+    return analyzer, results
+
+
+def leftover(analyzer: MarketMakerAnalyzer) -> list[int]:
+    pending = [event for closures in analyzer.subgraph_closures.values() for _, event in closures]
+    return sorted(int(event.args["order_id"], 16) for event in pending)
+
+
+def test_closures_are_placed_by_calldata():
+    transport = RecordedTransport(PAGES)
+    analyzer, results = run(transport, analyze_all_wallets=True)
+
+    by_tx = {r.tx_hash: r for r in results}
+    created_closed = {n: (by_tx[TX[n]].orders_created, by_tx[TX[n]].orders_closed) for n in TX}
+    assert created_closed == {
+        1: (3, 0),
+        2: (0, 1),  # the buy it matched, placed through the PositionCreated
+        3: (0, 1),  # closeOrder names its order...
+        4: (0, 1),  # ...and the offset goes to the createOrder sent in the same second
+        5: (1, 0),  # nothing in either calldata names the outdated order
+        6: (0, 0),
+    }
+    assert by_tx[TX[2]].cohorts == [(D, P, True, 1.0)]
+    assert analyzer.receipts_fetched == 0
+    assert transport.requests == len(transport.exchanges)
+    # Left over: the outdated order, and the closure with no transaction from its participant
+    assert leftover(analyzer) == [4, 6]
+
+
+def test_unplaced_closures_are_reported_for_the_wallet_in_scope(capsys):
+    analyzer, _ = run(RecordedTransport(PAGES), verbose=True, market_maker_wallet=A)
+    # C's closure is out of scope; A's outdated order is not
+    assert leftover(analyzer) == [4]
+    assert "[Warning] 1 order closures could not be placed" in capsys.readouterr().out
+
+    analyzer, _ = run(RecordedTransport(PAGES), verbose=True, analyze_all_wallets=True, exclude_wallet=A)
+    assert leftover(analyzer) == [6]
+    assert "[Warning] 1 order closures could not be placed" in capsys.readouterr().out
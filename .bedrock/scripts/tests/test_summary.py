@@ -0,0 +1,66 @@
+"""print_summary count formatting in full and sampled runs."""
+
+from datetime import datetime, timezone
+
+from analyze_market_maker_fees import SampleEstimate, TransactionAnalysis, print_summary
+
+
+def analyses(weight: float = 1.0) -> list[TransactionAnalysis]:
+    return [
+        TransactionAnalysis(
+            timestamp=datetime(2026, 1, 1, i % 24, tzinfo=timezone.utc),
+            tx_hash=f"0x{i:064x}",
+            wallet=f"0x{i % 3:040x}",
+            action="",
+            method="multicall" if i % 2 else "addMargin",
+            usdc_fees=0.5,
+            usdc_deposit=0.0,
+            usdc_withdrawal=0.0,
+            gas_fee_eth=1e-6,
+            gas_fee_usd=0.003,
+            eth_price_usd=3000.0,
+            orders_created=i % 3,
+            orders_closed=i % 2,
+            buy_orders=i % 3,
+            sell_orders=0,
+            weight=weight,
+        )
+        for i in range(1200)
+    ]
+
+
+def test_full_run_prints_exact_counts(capsys):
+    print_summary(analyses(), show_wallet_breakdown=True)
+    out = capsys.readouterr().out
+
+    assert "📈 TRADING ACTIVITY: 1,200 created | 600 closed" in out
+    assert "  Buy Orders:    1,200" in out
+    assert "📊 TRANSACTIONS BY TYPE: 1200 txs" in out
+    assert "~" not in out and "±" not in out
+
+
+def test_sampled_run_labels_estimates_with_their_intervals(capsys):
+    sample = SampleEstimate(
+        rate=0.4,
+        population=3000,
+        sampled=1200,
+        strata=48,
+        totals={
+            "usdc_fees": (750.0, 12.5),
+            "gas_fee_usd": (9.0, 0.2),
+            "usdc_deposit": (0.0, 0.0),
+            "usdc_withdrawal": (0.0, 0.0),
+            "orders_created": (3000.0, 41.3),
+            "orders_closed": (1500.0, 22.7),
+        },
+        hours={},
+    )
+    print_summary(analyses(weight=2.5), show_wallet_breakdown=True, sample=sample)
+    out = capsys.readouterr().out
+
+    assert "📈 TRADING ACTIVITY: ~3,000 ± 41 created | ~1,500 ± 23 closed" in out
+    assert "  Buy Orders:    ~3,000" in out
+    assert "TOP WALLETS BY TRANSACTIONS (estimated from the sample):" in out
+    # The strata are per method, so transaction counts scale back exactly
+    assert "📊 TRANSACTIONS BY TYPE: 3000 txs" in out
+    assert "  multicall               1500 txs" in out
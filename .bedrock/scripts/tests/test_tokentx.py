@@ -0,0 +1,125 @@
+"""--transfers tokentx: paging the bulk transfer list, and analyzing margin moves without receipts."""
+
+from datetime import datetime, timezone
+
+import analyze_market_maker_fees
+from abi_codec import encode_call
+from analyze_market_maker_fees import ArbiscanClient, MarketMakerAnalyzer
+
+CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+TOKEN = "0x" + "5c" * 20
+A = "0x" + "aa" * 20
+T0 = 1_767_225_600
+TRANSFER = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+class Session:
+    """tokentx over one transfer per (block, log index), answering from the request's start block."""
+
+    def __init__(self, blocks: list[int]):
+        self.rows = [
+            {"blockNumber": str(block), "hash": f"0x{i:064x}", "logIndex": str(i), "value": str(i)}
+            for i, block in enumerate(blocks)
+        ]
+        self.start_blocks: list[int] = []
+
+    def get(self, url, params, timeout):
+        self.start_blocks.append(params["startblock"])
+        rows = [row for row in self.rows if int(row["blockNumber"]) >= params["startblock"]]
+        return Response({"status": "1", "message": "OK", "result": rows[:params["offset"]]})
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, data: dict):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self) -> dict:
+        return self.data
+
+
+def test_pages_slide_by_block_and_skip_rows_already_seen(monkeypatch):
+    monkeypatch.setattr(analyze_market_maker_fees, "TOKENTX_PAGE_SIZE", 3)
+    monkeypatch.setattr(analyze_market_maker_fees.time, "sleep", lambda seconds: None)
+    arbiscan = ArbiscanClient("key")
+    arbiscan._session = session = Session([10, 11, 11, 12, 12, 12, 13])
+
+    rows = list(arbiscan.get_token_transfers(CONTRACT, 10, 20))
+
+    assert [int(row["value"]) for row in rows] == list(range(7))
+    # A full page restarts at its last block; a full page of one block moves past it
+    assert session.start_blocks == [10, 11, 12, 13]
+
+
+def row(n: int, method: str, amount: int) -> dict:
+    signature = f"{method}(bytes32)" if method == "closeOrder" else f"{method}(uint256)"
+    return {
+        "blockNumber": str(100 + n), "timeStamp": str(T0 + 60 * n), "transactionIndex": "0",
+        "hash": f"0x{n:064x}", "from": A, "to": CONTRACT,
+        "input": "0x" + encode_call(signature, amount).hex(),
+        "gasUsed": "100000", "gasPrice": "10000000", "isError": "0", "txreceipt_status": "1",
+    }
+
+
+def transfer(n: int, sender: str, recipient: str, amount: int) -> dict:
+    return {"hash": f"0x{n:064x}", "logIndex": "0", "contractAddress": TOKEN, "from": sender, "to": recipient,
+            "value": str(amount)}
+
+
+class FakeArbiscan:
+    def get_transactions_to_contract(self, contract, start_block, end_block, page, offset):
+        txs = [row(1, "addMargin", 5 * 10**6), row(2, "removeMargin", 2 * 10**6), row(3, "closeOrder", 7)]
+        return txs if page == 1 else []
+
+    def get_token_transfers(self, contract, start_block, end_block):
+        return [transfer(1, A, CONTRACT, 5 * 10**6), transfer(2, CONTRACT, A, 2 * 10**6)]
+
+    def get_eth_price(self):
+        return 3000.0
+
+
+class FakeAlchemy:
+    def __init__(self):
+        self.receipts: list[str] = []
+
+    def get_transaction_receipt(self, tx_hash: str) -> dict:
+        self.receipts.append(tx_hash)
+        return {"blockNumber": 103, "transactionIndex": 0, "gasUsed": 100_000, "status": 1, "logs": [{
+            "address": TOKEN, "logIndex": 0,
+            "topics": [TRANSFER, "0x" + A[2:].rjust(64, "0"), "0x" + CONTRACT[2:].rjust(64, "0")],
+            "data": f"0x{10**6:064x}",
+        }]}
+
+
+def run(transfers: str) -> tuple[MarketMakerAnalyzer, list]:
+    analyzer = MarketMakerAnalyzer(
+        futures_contract=CONTRACT, analyze_all_wallets=True, arbiscan=FakeArbiscan(), alchemy=FakeAlchemy(),
+        transfer_source=transfers,
+    )
+    results = analyzer.analyze_date_range(
+        datetime.fromtimestamp(T0, tz=timezone.utc), datetime.fromtimestamp(T0 + 3600, tz=timezone.utc),
+        verbose=False, block_range=(100, 200),
+    )
+    return analyzer, results
+
+
+def test_margin_moves_come_from_bulk_transfers_instead_of_receipts():
+    analyzer, results = run("tokentx")
+
+    assert [(r.method, r.usdc_deposit, r.usdc_withdrawal) for r in results[:2]] == [
+        ("addMargin", 5.0, 0.0), ("removeMargin", 0.0, 2.0),
+    ]
+    # Only the order method still needs its receipt (for the order events)
+    assert analyzer.alchemy.receipts == [f"0x{3:064x}"]
+    assert (analyzer.receipts_fetched, analyzer.receipts_saved) == (1, 2)
+    assert (results[2].method, results[2].usdc_fees) == ("closeOrder", 1.0)
+
+
+def test_receipts_mode_fetches_every_receipt():
+    analyzer, results = run("receipts")
+    assert len(analyzer.alchemy.receipts) == 3 and analyzer.receipts_saved == 0
+    assert analyzer.token_transfers is None
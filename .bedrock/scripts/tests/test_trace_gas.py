@@ -0,0 +1,83 @@
+"""Per-subcall gas attribution on recorded callTracer traces that go through the proxy."""
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from analyze_market_maker_fees import (
+    OVERHEAD_SUBCALL,
+    SubcallGas,
+    TransactionAnalysis,
+    attribute_trace,
+    read_recorded_traces,
+    trace_gas,
+)
+
+TRACES = Path(__file__).parent / "fixtures" / "call_traces.jsonl"
+MULTICALL = "0x" + "a1" * 32  # fill + new order + close, via Multicall's delegatecall into the proxy
+CREATE = "0x" + "a2" * 32  # a createOrder sent straight to the proxy
+UNTRACED = "0x" + "a3" * 32
+
+
+def analysis(tx_hash: str, method: str, gas_fee_usd: float) -> TransactionAnalysis:
+    return TransactionAnalysis(
+        timestamp=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        tx_hash=tx_hash,
+        wallet="0x" + "aa" * 20,
+        action="",
+        method=method,
+        usdc_fees=0.0,
+        usdc_deposit=0.0,
+        usdc_withdrawal=0.0,
+        gas_fee_eth=1e-6,
+        gas_fee_usd=gas_fee_usd,
+        eth_price_usd=3000.0,
+        orders_created=1,
+        orders_closed=1,
+        buy_orders=1,
+        sell_orders=1,
+    )
+
+
+def test_multicall_gas_is_split_per_subcall_through_the_proxy():
+    trace = read_recorded_traces(str(TRACES))[MULTICALL]
+    subcalls = attribute_trace(trace)
+
+    # Outer subcall frames (the proxy hop included), not the implementation frames inside them
+    assert subcalls == [
+        SubcallGas("createOrder", 151_020, positions=1),
+        SubcallGas("createOrder", 120_400, positions=0),
+        SubcallGas("closeOrder", 45_233, positions=0),
+        SubcallGas(OVERHEAD_SUBCALL, 412_345 - 151_020 - 120_400 - 45_233),
+    ]
+    assert sum(s.gas_used for s in subcalls) == int(trace["gasUsed"], 16)
+
+
+def test_single_call_through_the_proxy_is_one_subcall():
+    trace = read_recorded_traces(str(TRACES))[CREATE]
+    assert attribute_trace(trace) == [SubcallGas("createOrder", 180_500, positions=1)]
+
+
+def test_trace_gas_splits_fees_in_proportion_to_gas():
+    results = [
+        analysis(MULTICALL, "multicall", 0.412345),
+        analysis(CREATE, "createOrder", 0.18),  # not a multicall: left out
+        analysis(UNTRACED, "multicall", 0.3),
+    ]
+    attribution = trace_gas(results, traces_path=str(TRACES), verbose=False)
+
+    assert (attribution.transactions, attribution.untraced) == (1, 1)
+    assert attribution.gas_used == 412_345
+    create = attribution.subcalls["createOrder"]
+    assert (create.count, create.gas_used, create.positions) == (2, 271_420, 1)
+    assert create.gas_usd == pytest.approx(0.271420)
+    assert attribution.subcalls["closeOrder"].gas_usd == pytest.approx(0.045233)
+    assert attribution.subcalls[OVERHEAD_SUBCALL].gas_usd == pytest.approx(0.095692)
+    assert sum(s.gas_usd for s in attribution.subcalls.values()) == pytest.approx(0.412345)
+
+    matched, unmatched = attribution.matched[("createOrder", True)], attribution.matched[("createOrder", False)]
+    assert (matched.gas_used, matched.positions) == (151_020, 1)
+    assert (unmatched.gas_used, unmatched.positions) == (120_400, 0)
+    assert matched.gas_usd == pytest.approx(0.151020)
+    assert not any(method == OVERHEAD_SUBCALL for method, _ in attribution.matched)
@@ -0,0 +1,108 @@
+"""--tx-file: reading hashes, and fetching transactions, receipts and blocks in combined batches."""
+
+import io
+
+from abi_codec import encode_call
+from analyze_market_maker_fees import AlchemyClient, MarketMakerAnalyzer, read_tx_hashes
+
+CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+WALLET = "0x" + "aa" * 20
+TRANSFER = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+T0 = 1_767_225_600
+HASH = {n: "0x" + f"{n:02x}" * 32 for n in range(1, 5)}
+# hash number -> (block, index in block); 4 is not on chain
+MINED = {1: (120, 3), 2: (110, 0), 3: (120, 1)}
+
+
+def transaction(n: int) -> dict:
+    block, index = MINED[n]
+    return {
+        "hash": HASH[n], "blockNumber": hex(block), "transactionIndex": hex(index), "from": WALLET, "to": CONTRACT,
+        "gasPrice": hex(10**7), "input": "0x" + encode_call("addMargin(uint256)", n * 10**6).hex(),
+    }
+
+
+def receipt(n: int) -> dict:
+    block, index = MINED[n]
+    return {
+        "blockNumber": hex(block), "transactionIndex": hex(index), "gasUsed": hex(100_000), "status": "0x1",
+        "logs": [{
+            "address": CONTRACT, "logIndex": "0x0",
+            "topics": [TRANSFER, "0x" + WALLET[2:].rjust(64, "0"), "0x" + CONTRACT[2:].rjust(64, "0")],
+            "data": f"0x{n * 10**6:064x}",
+        }],
+    }
+
+
+class FakeSession:
+    """JSON-RPC batches over MINED, recording the methods of each batch."""
+
+    def __init__(self):
+        self.batches: list[list[str]] = []
+
+    def post(self, url, json, timeout):
+        self.batches.append([call["method"] for call in json])
+        return FakeResponse([{"jsonrpc": "2.0", "id": call["id"], "result": self.result(call)} for call in json])
+
+    def result(self, call: dict):
+        if call["method"] == "eth_getBlockByNumber":
+            block = int(call["params"][0], 16)
+            return {"number": hex(block), "timestamp": hex(T0 + block)}
+        n = next((n for n, tx_hash in HASH.items() if tx_hash == call["params"][0]), None)
+        if n not in MINED:
+            return None
+        return transaction(n) if call["method"] == "eth_getTransactionByHash" else receipt(n)
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class FakeArbiscan:
+    def get_eth_price(self):
+        return 3000.0
+
+
+def test_read_tx_hashes_skips_comments_and_invalid_lines(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "hashes.txt"
+    path.write_text(f"# backfill\n{HASH[1]}\n\n{HASH[2]}  # second\n0x1234\n")
+    assert read_tx_hashes(str(path)) == [HASH[1], HASH[2]]
+    assert "Skipping invalid transaction hash: 0x1234" in capsys.readouterr().out
+
+    monkeypatch.setattr("sys.stdin", io.StringIO(f"{HASH[3]}\n"))
+    assert read_tx_hashes("-") == [HASH[3]]
+
+
+def test_hashes_are_fetched_in_combined_batches_and_analyzed_in_block_order():
+    alchemy = AlchemyClient("http://127.0.0.1:9")
+    alchemy._session = session = FakeSession()
+    analyzer = MarketMakerAnalyzer(
+        futures_contract=CONTRACT, analyze_all_wallets=True, arbiscan=FakeArbiscan(), alchemy=alchemy
+    )
+
+    hashes = [HASH[1], HASH[2], HASH[1], HASH[4], HASH[3]]
+    results = analyzer.analyze_transaction_hashes(hashes, verbose=False)
+
+    # One batch for the four distinct hashes (transaction + receipt each), one for the two distinct blocks
+    assert session.batches == [
+        ["eth_getTransactionByHash", "eth_getTransactionReceipt"] * 4,
+        ["eth_getBlockByNumber"] * 2,
+    ]
+    assert [r.tx_hash for r in results] == [HASH[2], HASH[3], HASH[1]]
+    assert [r.usdc_deposit for r in results] == [2.0, 3.0, 1.0]
+    assert results[0].timestamp.timestamp() == T0 + 110
+
+
+def test_rpc_batches_are_split_by_batch_size():
+    alchemy = AlchemyClient("http://127.0.0.1:9")
+    alchemy._session = session = FakeSession()
+    blocks = alchemy.rpc_batch([("eth_getBlockByNumber", [hex(block), False]) for block in range(5)], batch_size=2)
+    assert [len(batch) for batch in session.batches] == [2, 2, 1]
+    assert [int(block["number"], 16) for block in blocks] == [0, 1, 2, 3, 4]
@@ -0,0 +1,92 @@
+"""Filter pushdown: build_tx_filter predicates over TxRecords, applied before any receipt fetch."""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from abi_codec import encode_call
+from analyze_market_maker_fees import METHOD_IDS, AddressTable, MarketMakerAnalyzer, TxRecord, build_tx_filter
+
+CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+A, B = "0x" + "aa" * 20, "0x" + "bb" * 20
+T0 = 1_767_225_600
+
+
+def row(n: int, sender: str, method: str, amount: int = 0, gas: int = 100_000) -> dict:
+    signature = f"{method}(bytes32)" if method == "closeOrder" else f"{method}(uint256)"
+    return {
+        "blockNumber": str(100 + n), "timeStamp": str(T0 + 60 * n), "transactionIndex": "0",
+        "hash": f"0x{n:064x}", "from": sender, "to": CONTRACT,
+        "input": "0x" + encode_call(signature, amount).hex(),
+        "gasUsed": str(gas), "gasPrice": "10000000", "isError": "0", "txreceipt_status": "1",
+    }
+
+
+TXLIST = [
+    row(1, A, "addMargin", 50 * 10**6),
+    row(2, A, "removeMargin", 5 * 10**6, gas=300_000),
+    row(3, B, "closeOrder", 7, gas=400_000),
+    row(4, B, "addMargin", 500 * 10**6),
+]
+
+
+def kept(predicate) -> list[int]:
+    addresses = AddressTable()
+    return [n for n, tx in enumerate(TXLIST, 1) if predicate(TxRecord.from_txlist(tx, addresses))]
+
+
+def test_no_options_means_no_filter():
+    assert build_tx_filter() is None
+    assert build_tx_filter(methods=[], include_wallets=[], min_gas=0) is None
+
+
+def test_each_option():
+    assert kept(build_tx_filter(methods=["addMargin", METHOD_IDS["removeMargin"]])) == [1, 2, 4]
+    # Wallets in any case; the predicate compares interned bytes
+    assert kept(build_tx_filter(include_wallets=[B.upper().replace("0X", "0x")])) == [3, 4]
+    assert kept(build_tx_filter(exclude_wallets=[B])) == [1, 2]
+    assert kept(build_tx_filter(min_gas=300_000)) == [2, 3]
+    # USD margin amount: only addMargin / removeMargin carry one
+    assert kept(build_tx_filter(min_value=10)) == [1, 4]
+
+
+def test_options_combine_as_and():
+    assert kept(build_tx_filter(methods=["addMargin"], exclude_wallets=[A], min_value=100)) == [4]
+
+
+def test_bad_options_fail_up_front():
+    with pytest.raises(ValueError, match="Unknown method"):
+        build_tx_filter(methods=["deposit"])
+    with pytest.raises(ValueError):
+        build_tx_filter(include_wallets=["0x1234"])
+
+
+class FakeArbiscan:
+    def get_transactions_to_contract(self, contract, start_block, end_block, page, offset):
+        return TXLIST if page == 1 else []
+
+    def get_eth_price(self):
+        return 3000.0
+
+
+class FakeAlchemy:
+    def __init__(self):
+        self.receipts = 0
+
+    def get_transaction_receipt(self, tx_hash: str) -> dict:
+        self.receipts += 1
+        return {"blockNumber": 100, "transactionIndex": 0, "gasUsed": 100_000, "status": 1, "logs": []}
+
+
+def test_run_reports_the_receipts_the_filter_saved(capsys):
+    analyzer = MarketMakerAnalyzer(
+        futures_contract=CONTRACT, analyze_all_wallets=True, arbiscan=FakeArbiscan(), alchemy=FakeAlchemy()
+    )
+    results = analyzer.analyze_date_range(
+        datetime.fromtimestamp(T0, tz=timezone.utc), datetime.fromtimestamp(T0 + 3600, tz=timezone.utc),
+        block_range=(100, 200), filters=build_tx_filter(methods=["closeOrder"]),
+    )
+
+    assert [r.method for r in results] == ["closeOrder"]
+    assert (analyzer.filtered_out, analyzer.alchemy.receipts) == (3, 1)
+    assert "3 transactions filtered out before fetching receipts" in capsys.readouterr().out
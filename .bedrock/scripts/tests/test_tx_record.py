@@ -0,0 +1,59 @@
+"""TxRecord: the compact projection of txlist rows, with interned addresses."""
+
+import pytest
+
+from abi_codec import encode_call, encode_uint
+from analyze_market_maker_fees import METHOD_IDS, AddressTable, TxRecord
+from event_archive import ZERO_ADDRESS
+
+CONTRACT = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+WALLET = "0x" + "ab" * 20
+
+
+def row(calldata: bytes, **fields) -> dict:
+    return {
+        "blockNumber": "420000123", "timeStamp": "1767225600", "transactionIndex": "7",
+        "hash": "0x" + "12" * 32, "from": WALLET, "to": CONTRACT, "input": "0x" + calldata.hex(),
+        "gasUsed": "250000", "gasPrice": "10000000", "isError": "0", "txreceipt_status": "1",
+        "confirmations": "12", "cumulativeGasUsed": "9000000", "nonce": "5",
+        **fields,
+    }
+
+
+def test_row_is_projected_to_ints_and_interned_bytes():
+    addresses = AddressTable()
+    tx = TxRecord.from_txlist(row(encode_call("addMargin(uint256)", 5 * 10**6)), addresses)
+
+    assert (tx.block, tx.timestamp, tx.tx_index) == (420_000_123, 1_767_225_600, 7)
+    assert (tx.gas_used, tx.gas_price) == (250_000, 10**7)
+    assert tx.method_id == int(METHOD_IDS["addMargin"], 16)
+    assert (tx.hash, tx.wallet) == ("0x" + "12" * 32, WALLET)
+    assert tx.amount == 5 * 10**6 and not tx.failed
+    # Only the slots: none of the other txlist fields (or the calldata) are kept
+    assert not hasattr(tx, "__dict__")
+
+
+def test_addresses_are_shared_across_rows_and_spellings():
+    addresses = AddressTable()
+    first = TxRecord.from_txlist(row(b""), addresses)
+    second = TxRecord.from_txlist(row(b"", **{"from": WALLET.upper().replace("0X", "0x")}), addresses)
+
+    assert first.sender is second.sender and first.to is second.to
+    assert len(addresses) == 2
+    assert addresses.intern("") is addresses.intern("0xnothex") == ZERO_ADDRESS
+
+
+@pytest.mark.parametrize("fields", [{"isError": "1"}, {"txreceipt_status": "0"}])
+def test_failed_transactions(fields):
+    assert TxRecord.from_txlist(row(b"", **fields), AddressTable()).failed
+
+
+def test_amount_and_order_calls_only_for_the_methods_that_carry_them():
+    addresses = AddressTable()
+    close = bytes.fromhex(METHOD_IDS["closeOrder"][2:]) + encode_uint(9)
+
+    assert TxRecord.from_txlist(row(close), addresses).amount == 0
+    assert TxRecord.from_txlist(row(close), addresses).order_calls == ()
+    assert TxRecord.from_txlist(row(close), addresses, order_calls=True).order_calls == (encode_uint(9),)
+    margin = row(encode_call("addMargin(uint256)", 10**6))
+    assert TxRecord.from_txlist(margin, addresses, order_calls=True).order_calls == ()
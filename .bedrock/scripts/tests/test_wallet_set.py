@@ -0,0 +1,53 @@
+"""--wallets parsing, per-wallet file names and conflicting options."""
+
+import pytest
+
+import analyze_market_maker_fees
+from analyze_market_maker_fees import read_wallet_set, wallet_file_labels
+
+MM = "0x8464dc5ab80e76e497fad318fe6d444408e5ccda"
+HEDGE = "0x" + "11" * 20
+OTHER = "0x" + "22" * 20
+
+
+def test_read_wallet_set_from_arguments_and_files(tmp_path):
+    listing = tmp_path / "wallets.txt"
+    hedge = analyze_market_maker_fees.to_checksum_address(HEDGE)
+    listing.write_text(f"# desk wallets\nhedge = {hedge}\n\n{MM}  # repeated\n")
+
+    wallets = read_wallet_set([f"mm={MM}", str(listing), OTHER])
+    assert wallets == {"mm": MM, "hedge": HEDGE, OTHER: OTHER}
+
+
+def test_duplicate_labels_are_rejected():
+    with pytest.raises(ValueError):
+        read_wallet_set([f"mm={MM}", f"mm={HEDGE}"])
+
+
+def test_file_labels_are_safe_and_unique():
+    wallets = {
+        "mm": MM,
+        "../../etc/passwd": HEDGE,
+        "desk a/b": OTHER,
+        "desk a:b": "0x" + "33" * 20,
+        "/": "0x" + "44" * 20,
+    }
+    assert wallet_file_labels(wallets) == {
+        "mm": "mm",
+        "../../etc/passwd": "etc_passwd",
+        "desk a/b": "desk_a_b",
+        "desk a:b": "0x" + "33" * 20,
+        "/": "0x" + "44" * 20,
+    }
+
+
+@pytest.mark.parametrize("option", [["--nomm"], ["--include-wallets", HEDGE]])
+def test_wallets_rejects_conflicting_options(option, monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", [
+        "analyze_market_maker_fees.py", "--arbiscan-api-key", "test", "--alchemy-url", "http://127.0.0.1:9",
+        "--wallets", MM, *option,
+    ])
+    with pytest.raises(SystemExit) as exit_info:
+        analyze_market_maker_fees.main()
+    assert exit_info.value.code == 1
+    assert "can't be combined" in capsys.readouterr().out